@@ -0,0 +1,308 @@
+import bisect
+import errno
+import fcntl
+import glob
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from collections import OrderedDict
+from persistance.ondisk_journal_hdr import DATA_STREAM, OnDiskJournalHdr
+from persistance.pos_array import decode_pos_columns
+from persistance.strm_checksum import CHECKSUM_SUFFIX
+from persistance.vec_columns import VecColumns
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+ARCHIVE_SUFFIX = ".arc"
+ARCHIVE_MAGIC = struct.unpack("<Q", b"RUPARC01")[0]
+BLOCK_SIZE = 256 << 10
+
+
+class Codec:
+    ZLIB = 0
+    ZSTD = 1
+    LZ4 = 2
+
+CodecName = [
+    "zlib",
+    "zstd",
+    "lz4"
+]
+
+
+def get_best_codec() -> int:
+    if zstandard is not None:
+        return Codec.ZSTD
+    if lz4 is not None:
+        return Codec.LZ4
+    return Codec.ZLIB
+
+
+def compress_block(codec: int, data) -> bytes:
+    if codec == Codec.ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == Codec.LZ4:
+        return lz4.frame.compress(data)
+    return zlib.compress(data, 6)
+
+
+def decompress_block(codec: int, data) -> bytes:
+    if codec == Codec.ZSTD:
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == Codec.LZ4:
+        return lz4.frame.decompress(data)
+    if codec == Codec.ZLIB:
+        return zlib.decompress(data)
+    raise Exception(f"archive codec is not supported; codec={codec}")
+
+
+class ArchiveReader:
+    """
+    Reads a stream archived by compact_strm().
+
+    Archive layout (little endian):
+        0   magic, codec, num_blocks, strm_len, index_off   (5 x uint64)
+        40  compressed blocks, back to back
+        index_off  block_strm_offs[num_blocks + 1], block_file_offs[num_blocks + 1]  (uint64)
+
+    Block k holds stream bytes [block_strm_offs[k], block_strm_offs[k + 1]). Blocks
+    are cut at message starts, so a message normally lives in a single block; the
+    last few decompressed blocks are cached.
+    """
+    HDR_FORMAT = "<5Q"
+    HDR_SIZE = struct.calcsize(HDR_FORMAT)
+
+    def __init__(self, path: str, num_cached_blocks: int = 16):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        self.data = mmap.mmap(self.fd, 0, mmap.MAP_SHARED, mmap.PROT_READ)
+        magic, self.codec, self.num_blocks, self.strm_len, index_off = struct.unpack_from(self.HDR_FORMAT, self.data, 0)
+        if magic != ARCHIVE_MAGIC:
+            raise Exception(f"not a strm archive; path={path}")
+
+        num_offs = self.num_blocks + 1
+        self.block_strm_offs = array('Q', self.data[index_off:index_off + num_offs * 8])
+        self.block_file_offs = array('Q', self.data[index_off + num_offs * 8:index_off + 2 * num_offs * 8])
+        self.num_cached_blocks = num_cached_blocks
+        self.cached_blocks = OrderedDict()
+
+    def get_block(self, block_idx: int) -> bytes:
+        block = self.cached_blocks.get(block_idx)
+        if block is not None:
+            self.cached_blocks.move_to_end(block_idx)
+            return block
+
+        begin = self.block_file_offs[block_idx]
+        end = self.block_file_offs[block_idx + 1]
+        block = decompress_block(self.codec, self.data[begin:end])
+        self.cached_blocks[block_idx] = block
+        if len(self.cached_blocks) > self.num_cached_blocks:
+            self.cached_blocks.popitem(last=False)
+        return block
+
+    def locate_data(self, strm_off: int, length: int) -> memoryview:
+        """
+        :return: A view of stream bytes [strm_off, strm_off + length).
+        """
+        if strm_off + length > self.strm_len:
+            raise Exception(f"data is beyond the archived strm; strm_off={strm_off}, length={length}, strm_len={self.strm_len}, path={self.path}")
+
+        block_idx = bisect.bisect_right(self.block_strm_offs, strm_off, 0, self.num_blocks) - 1
+        block_off = strm_off - self.block_strm_offs[block_idx]
+        block = self.get_block(block_idx)
+        if block_off + length <= len(block):
+            return memoryview(block)[block_off:block_off + length]
+
+        # a message cut by a forced block boundary (see compact_strm)
+        buf = bytearray()
+        while len(buf) < length:
+            block = self.get_block(block_idx)
+            buf += block[block_off:block_off + length - len(buf)]
+            block_idx += 1
+            block_off = 0
+        return memoryview(buf)
+
+    def close(self):
+        self.cached_blocks.clear()
+        self.data.close()
+        os.close(self.fd)
+
+
+def get_block_ends(strm_len: int, msg_offs, block_size: int):
+    """
+    Cuts [0, strm_len) into blocks of about block_size ending on message starts; a
+    block is cut at block_size when no message starts within 4 * block_size.
+    """
+    block_ends = []
+    begin = 0
+    while begin < strm_len:
+        i = bisect.bisect_left(msg_offs, begin + block_size)
+        end = msg_offs[i] if i < len(msg_offs) else strm_len
+        if end - begin > 4 * block_size:
+            end = begin + block_size
+        end = min(end, strm_len)
+        block_ends.append(end)
+        begin = end
+    return block_ends
+
+
+def compact_strm(strm_path: str, strm_len: int, msg_offs=(), codec: int = None, block_size: int = BLOCK_SIZE) -> str:
+    """
+    Writes bytes [0, strm_len) of a stream file into a block-compressed archive next
+    to it (strm_path + ARCHIVE_SUFFIX).
+    :param msg_offs: Sorted stream offsets where messages start, used to align blocks.
+    :return: The archive path.
+    """
+    codec = get_best_codec() if codec is None else codec
+    archive_path = strm_path + ARCHIVE_SUFFIX
+    tmp_path = archive_path + ".tmp"
+    block_strm_offs = array('Q', [0])
+    block_file_offs = array('Q', [ArchiveReader.HDR_SIZE])
+
+    fd = os.open(strm_path, os.O_RDONLY)
+    try:
+        with open(tmp_path, "wb") as archive_file:
+            archive_file.write(bytes(ArchiveReader.HDR_SIZE))
+            if strm_len > 0:
+                strm_data = mmap.mmap(fd, strm_len, mmap.MAP_SHARED, mmap.PROT_READ)
+                strm_view = memoryview(strm_data)
+                try:
+                    for end in get_block_ends(strm_len, msg_offs, block_size):
+                        block = compress_block(codec, strm_view[block_strm_offs[-1]:end])
+                        archive_file.write(block)
+                        block_strm_offs.append(end)
+                        block_file_offs.append(block_file_offs[-1] + len(block))
+                finally:
+                    strm_view.release()
+                    strm_data.close()
+
+            index_off = block_file_offs[-1]
+            archive_file.write(block_strm_offs.tobytes())
+            archive_file.write(block_file_offs.tobytes())
+            archive_file.seek(0)
+            archive_file.write(struct.pack(ArchiveReader.HDR_FORMAT, ARCHIVE_MAGIC, codec, len(block_strm_offs) - 1, strm_len, index_off))
+            archive_file.flush()
+            os.fsync(archive_file.fileno())
+    finally:
+        os.close(fd)
+
+    os.rename(tmp_path, archive_path)
+    return archive_path
+
+
+def collect_msg_offs(lfj_name: str):
+    """
+    Gathers the message start offsets of every stream from the positions of every
+    vec in the journal directory.
+    :return: {strm_num: sorted list of strm offsets}
+    """
+    offs_by_strm = {}
+    for pos_path in glob.glob(os.path.join(lfj_name, "*" + VecColumns.POS_SUFFIX)):
+        columns = VecColumns(pos_path[:-len(VecColumns.POS_SUFFIX)], False, has_seq_num=False)
+        try:
+            num_items = columns.get_num_items()
+            for chunk in columns.pos.chunks(0, num_items):
+                decoded = decode_pos_columns(chunk)
+                for strm_num, strm_off in zip(decoded.strm_num, decoded.strm_off):
+                    offs_by_strm.setdefault(int(strm_num), set()).add(int(strm_off))
+                del decoded, chunk
+        finally:
+            columns.close()
+    return {strm_num: sorted(offs) for strm_num, offs in offs_by_strm.items()}
+
+
+def lock_strm_file(fd: int, strm_path: str):
+    """
+    Takes the exclusive flock a writeable LockFreeJournal.open() holds on each of its
+    stream files, failing at once if a writer has the journal open.
+    """
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError as e:
+        if e.errno in (errno.EACCES, errno.EAGAIN, errno.EWOULDBLOCK):
+            raise Exception(f"Cannot compact {strm_path}; file is currently locked by a writer")
+        raise Exception(f"Cannot lock {strm_path}; errno={e.errno} {os.strerror(e.errno)}")
+
+
+def compact_journal(lfj_name: str, remove_originals: bool = False, codec: int = None, block_size: int = BLOCK_SIZE):
+    """
+    Archives every DATA_STREAM of a closed journal. Streams already archived are
+    skipped. With remove_originals the stream files are deleted once their archive
+    is written, after which LockFreeJournal reads them from the archive (read-only).
+    The write lock of LFJ_STRM_0 and of each stream is held while it is archived,
+    so this fails rather than run against a journal a writer has open.
+    :return: [(strm_name, strm_len, archive size)]
+    """
+    strm0_path = os.path.join(lfj_name, "LFJ_STRM_0")
+    fd0 = os.open(strm0_path, os.O_RDONLY)
+    try:
+        lock_strm_file(fd0, strm0_path)
+        return compact_strms(lfj_name, fd0, remove_originals, codec, block_size)
+    finally:
+        os.close(fd0)
+
+
+def compact_strms(lfj_name: str, fd0: int, remove_originals: bool, codec: int, block_size: int):
+    hdr_data = mmap.mmap(fd0, OnDiskJournalHdr.SIZE, mmap.MAP_SHARED, mmap.PROT_READ)
+    hdr = OnDiskJournalHdr(hdr_data)
+    try:
+        if not hdr.is_formatted():
+            raise Exception(f"journal header is not formatted; lfj_name={lfj_name}")
+
+        strms = []
+        for strm_num in range(1, hdr.get_highest_committed_strm_num() + 1):
+            strm_info = hdr.strm_infos[strm_num]
+            if strm_info.strm_num_plus_1 != 0 and strm_info.strm_type == DATA_STREAM:
+                strms.append((strm_num, strm_info.name, strm_info.committed_len.get()))
+    finally:
+        hdr.release()
+        hdr_data.close()
+
+    msg_offs = collect_msg_offs(lfj_name)
+    results = []
+    for strm_num, strm_name, strm_len in strms:
+        strm_path = os.path.join(lfj_name, strm_name)
+        try:
+            fd = os.open(strm_path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            lock_strm_file(fd, strm_path)
+            archive_path = compact_strm(strm_path, strm_len, msg_offs.get(strm_num, ()), codec, block_size)
+            results.append((strm_name, strm_len, os.path.getsize(archive_path)))
+            if remove_originals:
+                os.remove(strm_path)
+                if os.path.exists(strm_path + CHECKSUM_SUFFIX):
+                    os.remove(strm_path + CHECKSUM_SUFFIX)
+        finally:
+            os.close(fd)
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archive the data streams of a closed journal into compressed, indexed files")
+    parser.add_argument("lfj_name", help="journal directory")
+    parser.add_argument("--remove-originals", action="store_true", help="delete each stream file once archived")
+    parser.add_argument("--codec", choices=CodecName, help="default: zstd, else lz4, else zlib")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    args = parser.parse_args()
+
+    codec = CodecName.index(args.codec) if args.codec else None
+    for strm_name, strm_len, archive_size in compact_journal(args.lfj_name, args.remove_originals, codec, args.block_size):
+        print(f"{strm_name}: {strm_len} -> {archive_size} bytes ({strm_len / max(archive_size, 1):.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import threading
+from persistance.doorbell import FutexDoorbell
+from persistance.pos_array import np
+from persistance.read_snapshot import ReadSnapshot
+from persistance.rup_pos import Pos
+from utils.eventfd import EventFd
+
+
+class AsyncJournalReader:
+    """
+    Follows committed vec items from asyncio code.
+
+    A futex cannot be registered with an event loop, so one bridge thread per reader
+    sleeps on the journal's doorbell (LFJ_DOORBELL) and, on each ring, posts an eventfd
+    that the loop watches with add_reader. Every follow() generator shares that single fd:
+    a ring wakes the loop once and each generator re-checks its vec's committed item
+    count, so one loop can follow hundreds of vecs without polling.
+
+    follow() yields lists of (idx, pos, timestamp_ns, memoryview) of at most
+    batch_size items and reads nothing ahead of the consumer, so a slow consumer
+    only delays its own generator.
+    """
+
+    def __init__(self, lock_free_journal, batch_size: int = 1024, timeout_secs: float = 0.05):
+        """
+        :param lock_free_journal: A journal opened (usually read-only) in this process.
+        :param timeout_secs: Bounds the bridge thread's first wait, the one that can miss a ring
+                             (see FutexDoorbell); later waits block until a ring.
+        """
+        self.lock_free_journal = lock_free_journal
+        self.read_snapshot = ReadSnapshot(lock_free_journal)
+        self.batch_size = batch_size
+        self.timeout_secs = timeout_secs
+        self.doorbell = FutexDoorbell(os.path.join(lock_free_journal.lfj_name, lock_free_journal.LFJ_DOORBELL_NAME))
+        self.event_fd = None
+        self.loop = None
+        self.changed = None
+        self.bridge_thread = None
+        self.is_closed = False
+
+    def start(self):
+        if self.loop is not None:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Event()
+        self.event_fd = EventFd(0, os.EFD_NONBLOCK)
+        self.loop.add_reader(self.event_fd.fd, self.on_event_fd_readable)
+        self.bridge_thread = threading.Thread(target=self.run_bridge, name="lfj_async_bridge", daemon=True)
+        self.bridge_thread.start()
+
+    def run_bridge(self):
+        seen_seq = self.doorbell.get_seq()
+        timeout_secs = self.timeout_secs
+        while not self.is_closed:
+            seq = self.doorbell.wait(seen_seq, timeout_secs, lambda: self.is_closed)
+            timeout_secs = None
+            if seq != seen_seq:
+                seen_seq = seq
+                self.event_fd.post()
+
+    def on_event_fd_readable(self):
+        try:
+            self.event_fd.read()
+        except BlockingIOError:
+            return
+        # waiters hold the event they saw; a fresh one is armed for the next ring
+        changed = self.changed
+        self.changed = asyncio.Event()
+        changed.set()
+
+    async def follow(self, vec_num: int, from_idx: int = 0):
+        """
+        Yields batches of committed items of vec_num, starting at from_idx, forever.
+        """
+        self.start()
+        idx = from_idx
+        while not self.is_closed:
+            changed = self.changed
+            vec = self.get_vec(vec_num)
+            num_items = vec.get_max_item_idx() if vec is not None else 0
+            if idx >= num_items:
+                await changed.wait()
+                continue
+
+            end_idx = min(num_items, idx + self.batch_size)
+            yield self.read_batch(vec, idx, end_idx)
+            idx = end_idx
+
+    def get_vec(self, vec_num):
+        vec = self.lock_free_journal.get_vec(vec_num)
+        if vec is None or vec.columns is None:
+            self.read_snapshot.do_snapshot()
+            vec = self.lock_free_journal.get_vec(vec_num)
+        return vec if vec is not None and vec.columns is not None else None
+
+    def read_batch(self, vec, begin_idx: int, end_idx: int):
+        lfj = self.lock_free_journal
+        if np is not None:
+            positions, timestamps, _ = vec.get_item_range(begin_idx, end_idx)
+            positions = positions.tolist()
+            timestamps = timestamps.tolist()
+        else:
+            positions = [vec.columns.pos.get(idx) for idx in range(begin_idx, end_idx)]
+            timestamps = [vec.columns.ts.get(idx) for idx in range(begin_idx, end_idx)]
+
+        batch = []
+        for i, value in enumerate(positions):
+            pos = Pos.from_uint64(value)
+            data_1, data_2 = lfj.locate_data_by_pos(pos)
+            if data_2 is not None:
+                buf = bytearray(len(data_1) + len(data_2))
+                buf[:len(data_1)] = data_1
+                buf[len(data_1):] = data_2
+                data_1 = memoryview(buf)
+            batch.append((begin_idx + i, pos, timestamps[i], data_1))
+        return batch
+
+    def close(self):
+        self.is_closed = True
+        if self.bridge_thread is not None:
+            # a wake can land just before the bridge thread blocks, so it is repeated
+            while self.bridge_thread.is_alive():
+                self.doorbell.wake()
+                self.bridge_thread.join(0.01)
+            self.bridge_thread = None
+        if self.loop is not None:
+            self.loop.remove_reader(self.event_fd.fd)
+            self.changed.set()
+            self.loop = None
+        if self.event_fd is not None:
+            self.event_fd.close()
+            self.event_fd = None
+        self.doorbell.close()
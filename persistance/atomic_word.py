@@ -0,0 +1,69 @@
+class AtomicUint64:
+    """
+    An aligned 8-byte counter living in a mapped region, or in a private buffer
+    when no region is given.
+
+    Counters follow a single-writer protocol: only the owning writer calls set(),
+    any thread or process that maps the same region calls get() without taking a
+    lock. An aligned 8-byte load/store is a single instruction on x86-64, so a
+    reader never observes a torn value, and because x86 does not reorder stores a
+    reader that sees a new value also sees every byte the writer stored before it.
+    """
+    __slots__ = ("words",)
+
+    def __init__(self, value=0, buf=None, off=0):
+        """
+        :param value: Initial value; only used for a private (unmapped) counter.
+        :param buf: Writable or read-only buffer holding the counter, e.g. an mmap.
+        :param off: Byte offset of the counter in buf; must be 8-byte aligned.
+        """
+        if off % 8 != 0:
+            raise Exception(f"AtomicUint64 offset should be 8-byte aligned; off={off}")
+
+        if buf is None:
+            buf = bytearray(8)
+            off = 0
+            self.words = memoryview(buf).cast("Q")
+            self.words[0] = value
+        else:
+            self.words = memoryview(buf)[off:off + 8].cast("Q")
+
+    def get(self):
+        return self.words[0]
+
+    def set(self, value):
+        self.words[0] = value
+
+    def release(self):
+        """
+        Drops the view over the mapped region so the mapping can be closed.
+        """
+        self.words.release()
+
+
+class AtomicUint32:
+    """
+    The 4-byte counterpart of AtomicUint64, with the same single-writer protocol.
+    """
+    __slots__ = ("words",)
+
+    def __init__(self, value=0, buf=None, off=0):
+        if off % 4 != 0:
+            raise Exception(f"AtomicUint32 offset should be 4-byte aligned; off={off}")
+
+        if buf is None:
+            buf = bytearray(4)
+            off = 0
+            self.words = memoryview(buf).cast("I")
+            self.words[0] = value
+        else:
+            self.words = memoryview(buf)[off:off + 4].cast("I")
+
+    def get(self):
+        return self.words[0]
+
+    def set(self, value):
+        self.words[0] = value
+
+    def release(self):
+        self.words.release()
@@ -0,0 +1,93 @@
+import ctypes
+import ctypes.util
+import errno
+import mmap
+import os
+import platform
+from persistance.atomic_word import AtomicUint32
+
+FUTEX_WAIT = 0
+FUTEX_WAKE = 1
+FUTEX_WAKE_ALL = 0x7fffffff
+SYS_FUTEX = {"x86_64": 202, "aarch64": 98}.get(platform.machine())
+
+libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+libc.syscall.restype = ctypes.c_long
+
+
+class Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+class FutexDoorbell:
+    """
+    A commit doorbell shared by a journal's writer and every follower process, kept
+    in a small file of its own (LFJ_DOORBELL) so that followers, which map the journal
+    itself read-only, can still map it writable.
+
+    seq is a 4-byte futex word the writer bumps after publishing a commit; a follower
+    remembers the seq it last handled and sleeps in FUTEX_WAIT until seq differs, so
+    no core is spent polling. The wake syscall is only made once some follower has set
+    has_followers (it is never cleared). The writer stores seq and then loads
+    has_followers, which x86 may reorder, so the first wait of the very first follower
+    can miss a ring; followers bound every wait with a timeout to cover it.
+    """
+    SEQ_OFF = 0
+    HAS_FOLLOWERS_OFF = 4
+
+    def __init__(self, path: str):
+        if SYS_FUTEX is None:
+            raise Exception(f"futex doorbell is not supported on {platform.machine()}")
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        if os.fstat(self.fd).st_size < mmap.PAGESIZE:
+            os.ftruncate(self.fd, mmap.PAGESIZE)
+        self.data = mmap.mmap(self.fd, mmap.PAGESIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self.seq = AtomicUint32(buf=self.data, off=self.SEQ_OFF)
+        self.has_followers = AtomicUint32(buf=self.data, off=self.HAS_FOLLOWERS_OFF)
+        # the kernel needs the word's address; the ctypes view pins the mapping until close()
+        self.seq_word = ctypes.c_uint32.from_buffer(self.data, self.SEQ_OFF)
+        self.seq_addr = ctypes.c_void_p(ctypes.addressof(self.seq_word))
+
+    def ring(self):
+        """
+        Called by the writer after publishing a commit.
+        """
+        self.seq.set((self.seq.get() + 1) & 0xffffffff)
+        if self.has_followers.get():
+            libc.syscall(SYS_FUTEX, self.seq_addr, FUTEX_WAKE, FUTEX_WAKE_ALL, None, None, 0)
+
+    def get_seq(self) -> int:
+        return self.seq.get()
+
+    def wake(self):
+        """
+        Wakes the waiters without ringing, so that one whose is_done() became true returns.
+        """
+        libc.syscall(SYS_FUTEX, self.seq_addr, FUTEX_WAKE, FUTEX_WAKE_ALL, None, None, 0)
+
+    def wait(self, seen_seq: int, timeout_secs: float = None, is_done=None) -> int:
+        """
+        Sleeps until seq moves past seen_seq, timeout_secs elapses or, after a wake(),
+        is_done() returns true.
+        :return: The current seq.
+        """
+        if not self.has_followers.get():
+            self.has_followers.set(1)
+        timeout = None
+        if timeout_secs is not None:
+            timeout = ctypes.byref(Timespec(int(timeout_secs), int((timeout_secs % 1) * 1000000000)))
+        while self.seq.get() == seen_seq and not (is_done is not None and is_done()):
+            if libc.syscall(SYS_FUTEX, self.seq_addr, FUTEX_WAIT, ctypes.c_uint32(seen_seq), timeout, None, 0) != 0:
+                err = ctypes.get_errno()
+                if err == errno.ETIMEDOUT:
+                    break
+                if err not in (errno.EAGAIN, errno.EINTR):
+                    raise OSError(err, os.strerror(err))
+        return self.seq.get()
+
+    def close(self):
+        self.seq.release()
+        self.has_followers.release()
+        self.seq_word = None
+        self.data.close()
+        os.close(self.fd)
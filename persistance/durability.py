@@ -0,0 +1,237 @@
+import ctypes
+import ctypes.util
+import mmap
+import threading
+import time
+
+MS_ASYNC = 1
+MS_SYNC = 4
+
+libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+libc.msync.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int)
+libc.msync.restype = ctypes.c_int
+
+
+class DurabilityMode:
+    NONE = 0
+    PERIODIC = 1
+    EVERY_N_BYTES = 2
+    GROUP_COMMIT = 3
+
+DurabilityModeName = [
+    "NONE",
+    "PERIODIC",
+    "EVERY_N_BYTES",
+    "GROUP_COMMIT"
+]
+
+
+class DurabilityPolicy:
+    """
+    When committed stream data is msync'ed to disk.
+
+        NONE           nothing is flushed in the background; wait_durable() flushes inline
+        PERIODIC       the flusher flushes every interval_secs
+        EVERY_N_BYTES  the flusher flushes once n_bytes have been committed since the last flush
+        GROUP_COMMIT   the flusher flushes as soon as a writer waits for durability, coalescing
+                       every waiter (and every stream) that arrives meanwhile into one round;
+                       dirty data nobody waits for is flushed every interval_secs
+    """
+
+    def __init__(self, mode=DurabilityMode.NONE, interval_secs=1.0, n_bytes=16 << 20, sync=True):
+        """
+        :param sync: msync with MS_SYNC (data on disk when durable_len advances) rather than
+                     MS_ASYNC (writeback only scheduled).
+        """
+        self.mode = mode
+        self.interval_secs = interval_secs
+        self.n_bytes = n_bytes
+        self.sync = sync
+
+    @staticmethod
+    def none():
+        return DurabilityPolicy(DurabilityMode.NONE)
+
+    @staticmethod
+    def periodic(interval_secs, sync=True):
+        return DurabilityPolicy(DurabilityMode.PERIODIC, interval_secs=interval_secs, sync=sync)
+
+    @staticmethod
+    def every_n_bytes(n_bytes, sync=True):
+        return DurabilityPolicy(DurabilityMode.EVERY_N_BYTES, n_bytes=n_bytes, sync=sync)
+
+    @staticmethod
+    def group_commit(interval_secs=1.0, sync=True):
+        return DurabilityPolicy(DurabilityMode.GROUP_COMMIT, interval_secs=interval_secs, sync=sync)
+
+    def __repr__(self):
+        return f"DurabilityPolicy({DurabilityModeName[self.mode]}, interval_secs={self.interval_secs}, n_bytes={self.n_bytes}, sync={self.sync})"
+
+
+class Durability:
+    """
+    Flushes committed stream data of a journal and tracks how far it is durable.
+
+    A flush round snapshots every stream's committed_len, msyncs exactly the pages
+    between its durable_len and that length, then raises durable_len in the stream's
+    header record and msyncs the header. Rounds are numbered; a writer waiting for
+    durability asks for the round after the one in progress (which may have
+    snapshotted before its commit) and sleeps on a condition until it completes, so
+    waiting never holds a stream's write mutex and other writers keep committing.
+    """
+
+    def __init__(self, lock_free_journal, policy: DurabilityPolicy = None):
+        self.lock_free_journal = lock_free_journal
+        self.policy = policy if policy is not None else DurabilityPolicy.none()
+        self.cond = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.bytes_since_flush = 0
+        self.rounds_requested = 0
+        self.rounds_started = 0
+        self.rounds_done = 0
+        self.flusher_thread = None
+        self.is_closed = False
+
+    def start(self):
+        if self.policy.mode != DurabilityMode.NONE and self.flusher_thread is None:
+            self.is_closed = False
+            self.flusher_thread = threading.Thread(target=self.run_flusher, name="lfj_flusher", daemon=True)
+            self.flusher_thread.start()
+
+    def close(self):
+        """
+        Stops the flusher after a last round, so everything committed before close is flushed.
+        """
+        if self.flusher_thread is None:
+            return
+        with self.cond:
+            self.is_closed = True
+            self.cond.notify_all()
+        self.flusher_thread.join()
+        self.flusher_thread = None
+
+    def note_commit(self, strm, num_bytes):
+        """
+        Called by a writer after raising committed_len; cheap unless a flush is due.
+        """
+        if self.policy.mode != DurabilityMode.EVERY_N_BYTES:
+            return
+        # writers of different streams add to it concurrently
+        with self.cond:
+            self.bytes_since_flush += num_bytes
+            if self.bytes_since_flush >= self.policy.n_bytes:
+                self.cond.notify_all()
+
+    def wait_durable(self, timeout=None) -> bool:
+        """
+        Blocks until everything committed so far, on every stream, is durable.
+        :return: False if timeout expired first.
+        """
+        if self.flusher_thread is None:
+            self.flush_all()
+            return True
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            ticket = self.rounds_started + 1
+            if self.rounds_requested < ticket:
+                self.rounds_requested = ticket
+                self.cond.notify_all()
+            while self.rounds_done < ticket:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def run_flusher(self):
+        policy = self.policy
+        while True:
+            with self.cond:
+                while not self.is_closed and not self.is_flush_due():
+                    if not self.cond.wait(policy.interval_secs) and policy.mode != DurabilityMode.EVERY_N_BYTES:
+                        break
+                is_closed = self.is_closed
+                self.rounds_started += 1
+
+            self.flush_all()
+
+            with self.cond:
+                self.rounds_done += 1
+                self.cond.notify_all()
+            if is_closed:
+                return
+
+    def is_flush_due(self) -> bool:
+        if self.rounds_requested > self.rounds_started:
+            return True
+        return self.policy.mode == DurabilityMode.EVERY_N_BYTES and self.bytes_since_flush >= self.policy.n_bytes
+
+    def flush_all(self):
+        """
+        Runs one flush round over every stream of the journal.
+        """
+        with self.flush_lock:
+            with self.cond:
+                self.bytes_since_flush = 0
+            lfj = self.lock_free_journal
+            flags = MS_SYNC if self.policy.sync else MS_ASYNC
+            advanced = False
+            for strm in list(lfj.strms):
+                if strm is None or strm.on_disk_strm_info is None:
+                    continue
+                on_disk_strm_info = strm.on_disk_strm_info
+                durable_len = on_disk_strm_info.durable_len.get()
+                committed_len = on_disk_strm_info.committed_len.get()
+                if committed_len <= durable_len:
+                    continue
+                self.flush_strm_range(strm, durable_len, committed_len, flags)
+                if strm.checksum is not None and self.policy.sync:
+                    # without its records the data would be cut back by the next recovery
+                    strm.checksum.sync()
+                on_disk_strm_info.durable_len.set(committed_len)
+                advanced = True
+
+            if advanced and lfj.on_disk_journal_hdr is not None and isinstance(lfj.on_disk_journal_hdr.buf, mmap.mmap):
+                self.msync(lfj.on_disk_journal_hdr.buf, 0, lfj.on_disk_journal_hdr.SIZE, flags)
+
+    def flush_strm_range(self, strm, begin_off, end_off, flags):
+        """
+        msyncs stream bytes [begin_off, end_off). The segments are looked up (and mapped)
+        under the stream's write mutex, as the writer maps them on rollover, and msync'ed
+        after it is dropped, so writers are not held up by the flush.
+        """
+        ranges = []
+        with strm.strm_write_mutex:
+            strm_off = begin_off
+            while strm_off < end_off:
+                seg_num = strm.get_seg_num(strm_off)
+                seg_off = strm.get_seg_off(strm_off)
+                seg_data = strm.map_seg(seg_num, False, "Durability.flush_strm_range")
+                if seg_data is None:
+                    raise Exception(f"committed data is not in strm file; strm_name={strm.strm_name}, seg_num={seg_num}")
+                n = min(len(seg_data) - seg_off, end_off - strm_off)
+                ranges.append((seg_data, seg_off, n))
+                strm_off += n
+
+        for seg_data, seg_off, n in ranges:
+            self.msync(seg_data, seg_off, n, flags)
+
+    @staticmethod
+    def msync(seg_data, off, length, flags):
+        """
+        msyncs the pages of seg_data covering [off, off + length).
+        """
+        begin = off & ~(mmap.PAGESIZE - 1)
+        end = off + length
+        if flags == MS_SYNC:
+            seg_data.flush(begin, end - begin)
+            return
+
+        addr_holder = ctypes.c_char.from_buffer(seg_data)
+        try:
+            if libc.msync(ctypes.addressof(addr_holder) + begin, end - begin, flags) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"msync() failed; off={off}, length={length}")
+        finally:
+            del addr_holder
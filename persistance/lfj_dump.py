@@ -0,0 +1,504 @@
+import contextlib
+import csv
+import fnmatch
+import heapq
+import importlib
+import io
+import multiprocessing
+import os
+import sys
+from collections import Counter, deque, namedtuple
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+from persistance.lock_free_journal import LockFreeJournal, StrmTypeName
+from persistance.pos_array import np
+from persistance.replay import split_tx_strm
+from persistance.rup_pos import Pos
+from persistance.rup_tx import Tx
+from persistance.tx_builder import iter_tx_ops, read_tx_hdr
+from persistance.tx_merge import get_tx_strms, iter_strm_txs
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+DUMP_SHARD_BYTES = 1 << 20
+DUMP_TASK_ITEMS = 16384
+MORE_PAYLOAD_BYTES = 64
+MAX_MAPPED_SEGS = 64
+PrintLevelName = ["none", "little", "more", "all"]
+OpCodes = [Tx.OP_SET_VEC_ITEM, Tx.OP_SET_ITEM_POS_FLAG, Tx.OP_PATCH_MSG, Tx.OP_STORE_MULTI_ORDER_DATA]
+
+# (name, arrow type) of the columns of each kind of row
+TX_COLUMNS = [("global_tx_seq", "u64"), ("tx_strm_num", "u64"), ("tx_strm_off", "u64"), ("op", "str"),
+              ("vec_num", "u64"), ("vec_name", "str"), ("seq_num", "u64"), ("timestamp_ns", "i64"),
+              ("strm_num", "u64"), ("strm_off", "u64"), ("len", "u64"), ("value", "u64"), ("payload", "bin")]
+ITEM_COLUMNS = [("vec_num", "u64"), ("vec_name", "str"), ("idx", "u64"), ("seq_num", "u64"), ("timestamp_ns", "i64"),
+                ("strm_num", "u64"), ("strm_off", "u64"), ("len", "u64"), ("flag", "u64"), ("payload", "bin")]
+STRM_COLUMNS = [("strm_num", "u64"), ("strm_name", "str"), ("strm_type", "str"), ("committed_len", "u64"), ("durable_len", "u64")]
+
+DumpFilter = namedtuple("DumpFilter", ["vec_nums", "seq_from", "seq_to", "time_from_ns", "time_to_ns", "op_codes"])
+
+# the journal a pool worker opened read-only, and how it renders payloads
+worker_lfj = None
+worker_level = LockFreeJournal.PRINT_LITTLE
+worker_printer_finder = None
+worker_printers = {}
+
+
+def load_printer_finder(printer_spec: str):
+    """
+    :param printer_spec: "module:function" naming a PrinterFinder, or None.
+    """
+    if printer_spec is None:
+        return None
+    module_name, _, func_name = printer_spec.partition(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def open_journal(lfj_name: str, max_mapped_segs: int) -> LockFreeJournal:
+    # segments are mapped as they are read and the least recently used ones unmapped
+    lfj = LockFreeJournal()
+    if lfj.open(lfj_name, False, False, prefault_segs=False, keep_spare_seg=False, max_mapped_segs=max_mapped_segs,
+                enable_metrics=False) is None:
+        raise Exception(f"journal does not exist; lfj_name={lfj_name}")
+    return lfj
+
+
+def init_worker(lfj_name: str, max_mapped_segs: int, level: int, printer_spec: str):
+    global worker_lfj, worker_level, worker_printer_finder, worker_printers
+    worker_lfj = open_journal(lfj_name, max_mapped_segs)
+    worker_level = level
+    worker_printer_finder = load_printer_finder(printer_spec)
+    worker_printers = {}
+
+
+def close_worker():
+    global worker_lfj
+    if worker_lfj is not None:
+        worker_lfj.close()
+        worker_lfj = None
+
+
+def get_vec_name(vec_num: int) -> str:
+    vec = worker_lfj.get_vec(vec_num)
+    return vec.on_disk_vec_info.name if vec is not None and vec.on_disk_vec_info is not None else ""
+
+
+def render_payload(vec_num: int, data_1, data_2, idx: int):
+    """
+    :return: None below PRINT_MORE; else the message (its first MORE_PAYLOAD_BYTES at
+             PRINT_MORE) as bytes, or as the text printed by the vec's printer when the
+             PrinterFinder has one for it.
+    """
+    if worker_level < LockFreeJournal.PRINT_MORE:
+        return None
+    if worker_level == LockFreeJournal.PRINT_MORE:
+        data_1 = data_1[:MORE_PAYLOAD_BYTES]
+        data_2 = data_2[:MORE_PAYLOAD_BYTES - len(data_1)] if data_2 is not None else None
+    data = bytes(data_1) + bytes(data_2) if data_2 is not None else bytes(data_1)
+
+    if worker_printer_finder is None:
+        return data
+    printer = worker_printers.get(vec_num, False)
+    if printer is False:
+        vec = worker_lfj.get_vec(vec_num)
+        vec_info = vec.on_disk_vec_info if vec is not None else None
+        printer = worker_printer_finder(vec_info.name, vec_info.encode_name) if vec_info is not None else None
+        worker_printers[vec_num] = printer
+    if printer is None:
+        return data
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        printer(get_vec_name(vec_num), data, idx, worker_level)
+    return out.getvalue().rstrip("\n")
+
+
+def locate_payload(vec_num: int, pos: int, idx: int):
+    if worker_level < LockFreeJournal.PRINT_MORE or pos == 0:
+        return None
+    strm = worker_lfj.get_strm((pos >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK)
+    if strm is None:
+        return None
+    data_1, data_2 = strm.locate_data(pos & Pos.STRM_OFF_MASK, (pos >> Pos.LEN_SHIFT) & Pos.LEN_MASK, "lfj_dump.locate_payload")
+    return render_payload(vec_num, data_1, data_2, idx)
+
+
+def is_selected(dump_filter: DumpFilter, vec_num: int, seq_num, timestamp_ns: int) -> bool:
+    if dump_filter.vec_nums is not None and vec_num not in dump_filter.vec_nums:
+        return False
+    if dump_filter.seq_from is not None or dump_filter.seq_to is not None:
+        if seq_num is None:
+            return False
+        if dump_filter.seq_from is not None and seq_num < dump_filter.seq_from:
+            return False
+        if dump_filter.seq_to is not None and seq_num >= dump_filter.seq_to:
+            return False
+    if dump_filter.time_from_ns is not None and timestamp_ns < dump_filter.time_from_ns:
+        return False
+    if dump_filter.time_to_ns is not None and timestamp_ns >= dump_filter.time_to_ns:
+        return False
+    return True
+
+
+def summarize(rows, key_idx: int):
+    if worker_level == LockFreeJournal.PRINT_NONE:
+        return Counter(row[key_idx] for row in rows)
+    return rows
+
+
+def dump_tx_shard(strm_num: int, begin_off: int, end_off: int, dump_filter: DumpFilter):
+    """
+    Decodes the ops of the txs in [begin_off, end_off) of a TX stream into TX_COLUMNS rows,
+    one per vec of an OP_STORE_MULTI_ORDER_DATA. Ops without a timestamp of their own are
+    filtered on their tx's.
+    """
+    rows = []
+    for global_tx_seq, _, tx_strm_off, tx in iter_strm_txs(worker_lfj.get_strm(strm_num), begin_off, end_off):
+        tx_timestamp_ns = read_tx_hdr(tx)[3]
+        for op_code, fields in iter_tx_ops(tx):
+            if dump_filter.op_codes is not None and op_code not in dump_filter.op_codes:
+                continue
+            op = Tx.op_code_to_name(op_code)
+            if op_code == Tx.OP_SET_VEC_ITEM:
+                vec_num, seq_num, pos, timestamp_ns = fields
+                if is_selected(dump_filter, vec_num, seq_num, timestamp_ns):
+                    rows.append((global_tx_seq, strm_num, tx_strm_off, op, vec_num, get_vec_name(vec_num), seq_num, timestamp_ns,
+                                 (pos >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK, pos & Pos.STRM_OFF_MASK,
+                                 (pos >> Pos.LEN_SHIFT) & Pos.LEN_MASK, pos >> Pos.FLAG_SHIFT, locate_payload(vec_num, pos, seq_num)))
+            elif op_code == Tx.OP_PATCH_MSG:
+                vec_num, seq_num, patch_len, timestamp_ns, _ = fields
+                if is_selected(dump_filter, vec_num, seq_num, timestamp_ns):
+                    rows.append((global_tx_seq, strm_num, tx_strm_off, op, vec_num, get_vec_name(vec_num), seq_num, timestamp_ns,
+                                 None, None, None, patch_len, None))
+            elif op_code == Tx.OP_SET_ITEM_POS_FLAG:
+                flag, vec_num, seq_num, _ = fields
+                if is_selected(dump_filter, vec_num, seq_num, tx_timestamp_ns):
+                    rows.append((global_tx_seq, strm_num, tx_strm_off, op, vec_num, get_vec_name(vec_num), seq_num, tx_timestamp_ns,
+                                 None, None, None, flag, None))
+            elif op_code == Tx.OP_STORE_MULTI_ORDER_DATA:
+                vec_nums, data = fields
+                for vec_num in vec_nums:
+                    if is_selected(dump_filter, vec_num, None, tx_timestamp_ns):
+                        rows.append((global_tx_seq, strm_num, tx_strm_off, op, vec_num, get_vec_name(vec_num), None, tx_timestamp_ns,
+                                     None, None, len(data), None, render_payload(vec_num, data, None, global_tx_seq)))
+    return summarize(rows, 3)
+
+
+def dump_item_range(vec_num: int, begin_idx: int, end_idx: int, dump_filter: DumpFilter):
+    """
+    Decodes items [begin_idx, end_idx) of a vec into ITEM_COLUMNS rows. The seq_num and
+    time filters are applied to the mapped columns first (vectorized with NumPy), so only
+    the selected items are read.
+    """
+    vec = worker_lfj.get_vec(vec_num)
+    vec_name = vec.on_disk_vec_info.name
+    columns = vec.columns
+    end_idx = min(end_idx, columns.get_num_items())
+    if np is not None:
+        positions, timestamps_ns, seq_nums = columns.get_range(begin_idx, end_idx)
+        selected = np.ones(len(positions), dtype=bool)
+        if dump_filter.seq_from is not None or dump_filter.seq_to is not None:
+            if seq_nums is None:
+                selected[:] = False
+            if seq_nums is not None and dump_filter.seq_from is not None:
+                selected &= seq_nums >= dump_filter.seq_from
+            if seq_nums is not None and dump_filter.seq_to is not None:
+                selected &= seq_nums < dump_filter.seq_to
+        if dump_filter.time_from_ns is not None:
+            selected &= timestamps_ns >= dump_filter.time_from_ns
+        if dump_filter.time_to_ns is not None:
+            selected &= timestamps_ns < dump_filter.time_to_ns
+        items = ((begin_idx + int(i), int(positions[i]), int(timestamps_ns[i]), int(seq_nums[i]) if seq_nums is not None else None)
+                 for i in np.flatnonzero(selected))
+    else:
+        items = ((idx, columns.pos.get(idx), columns.ts.get(idx), columns.seq.get(idx) if columns.seq is not None else None)
+                 for idx in range(begin_idx, end_idx))
+        items = (item for item in items if is_selected(dump_filter, vec_num, item[3], item[2]))
+
+    rows = []
+    for idx, pos, timestamp_ns, seq_num in items:
+        rows.append((vec_num, vec_name, idx, seq_num, timestamp_ns, (pos >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK,
+                     pos & Pos.STRM_OFF_MASK, (pos >> Pos.LEN_SHIFT) & Pos.LEN_MASK, pos >> Pos.FLAG_SHIFT,
+                     locate_payload(vec_num, pos, idx)))
+    return summarize(rows, 1)
+
+
+class TaskRunner:
+    """
+    Runs dump tasks in order with at most window of them in flight, on a pool or, with
+    no pool, in this process; results are yielded as soon as the oldest one is done, so
+    memory stays bounded by the window whatever the journal size.
+    """
+
+    def __init__(self, pool, window: int):
+        self.pool = pool
+        self.window = window
+
+    def run(self, func, tasks):
+        if self.pool is None:
+            for task in tasks:
+                yield func(*task)
+            return
+        pending = deque()
+        for task in tasks:
+            pending.append(self.pool.apply_async(func, task))
+            if len(pending) >= self.window:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def iter_tx_rows(lfj, runner: TaskRunner, dump_filter: DumpFilter, level: int, shard_bytes: int):
+    """
+    Streams the TX_COLUMNS rows of every TX stream, merged in global_tx_seq order (the
+    per-task row counts at PRINT_NONE).
+    """
+    strm_tasks = [[(strm.get_strm_num(), begin_off, end_off, dump_filter) for begin_off, end_off in split_tx_strm(strm, shard_bytes)]
+                  for strm in get_tx_strms(lfj)]
+    if level == LockFreeJournal.PRINT_NONE:
+        for tasks in strm_tasks:
+            yield from runner.run(dump_tx_shard, tasks)
+        return
+
+    # one window per stream: the heap merge pulls from each one as it goes
+    strm_runner = TaskRunner(runner.pool, max(1, runner.window // max(1, len(strm_tasks))))
+
+    def iter_shard_rows(tasks):
+        for rows in strm_runner.run(dump_tx_shard, tasks):
+            yield from rows
+
+    yield from heapq.merge(*[iter_shard_rows(tasks) for tasks in strm_tasks], key=itemgetter(0))
+
+
+def iter_item_rows(lfj, runner: TaskRunner, dump_filter: DumpFilter, level: int, task_items: int):
+    """
+    Streams the ITEM_COLUMNS rows of the selected vecs, vec by vec. A time range is first
+    narrowed to an idx range with the vec's time index.
+    """
+    tasks = []
+    for vec_num in range(len(lfj.vecs)):
+        vec = lfj.get_vec(vec_num)
+        if vec is None or vec.columns is None or (dump_filter.vec_nums is not None and vec_num not in dump_filter.vec_nums):
+            continue
+        columns = vec.columns
+        begin_idx = 0
+        end_idx = columns.get_num_items()
+        if dump_filter.time_from_ns is not None:
+            begin_idx = columns.seek_timestamp(dump_filter.time_from_ns, 0, end_idx)
+        if dump_filter.time_to_ns is not None:
+            end_idx = columns.seek_timestamp(dump_filter.time_to_ns, begin_idx, end_idx)
+        tasks.extend((vec_num, idx, min(idx + task_items, end_idx), dump_filter) for idx in range(begin_idx, end_idx, task_items))
+    for rows in runner.run(dump_item_range, tasks):
+        if level == LockFreeJournal.PRINT_NONE:
+            yield rows
+        else:
+            yield from rows
+
+
+def iter_strm_rows(lfj):
+    for strm in lfj.strms:
+        if strm is not None and strm.on_disk_strm_info is not None:
+            yield (strm.get_strm_num(), strm.get_strm_name(), StrmTypeName[strm.get_strm_type()], strm.get_committed_len(),
+                   strm.on_disk_strm_info.durable_len.get())
+
+
+class TextWriter:
+    """
+    One line per row of name=value pairs, skipping empty columns (fmt "text"), or CSV
+    with a header line (fmt "csv"). Bytes are written with non-ASCII escaped.
+    """
+
+    def __init__(self, out, columns, fmt: str):
+        self.out = out
+        self.names = [name for name, _ in columns]
+        self.csv_writer = csv.writer(out) if fmt == "csv" else None
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(self.names)
+
+    @staticmethod
+    def to_text(value):
+        if isinstance(value, bytes):
+            return value.decode("ascii", "backslashreplace")
+        return value
+
+    def write_rows(self, rows):
+        if self.csv_writer is not None:
+            self.csv_writer.writerows([[self.to_text(value) if value is not None else "" for value in row] for row in rows])
+            return
+        self.out.write("".join(" ".join(f"{name}={self.to_text(value)}" for name, value in zip(self.names, row) if value is not None) + "\n"
+                               for row in rows))
+
+    def close(self):
+        self.out.flush()
+
+
+class ParquetWriter:
+    """
+    Writes rows to a Parquet file one row group per batch (pyarrow).
+    """
+    ARROW_TYPES = {"u64": "uint64", "i64": "int64", "str": "string", "bin": "binary"}
+
+    def __init__(self, path: str, columns):
+        if pyarrow is None:
+            raise Exception("Parquet output needs the pyarrow package")
+        self.schema = pyarrow.schema([(name, getattr(pyarrow, self.ARROW_TYPES[type_name])()) for name, type_name in columns])
+        self.binary_idxs = [idx for idx, (_, type_name) in enumerate(columns) if type_name == "bin"]
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        columns = [list(column) for column in zip(*rows)]
+        for idx in self.binary_idxs:
+            columns[idx] = [value.encode() if isinstance(value, str) else value for value in columns[idx]]
+        self.writer.write_table(pyarrow.Table.from_arrays([pyarrow.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+                                                          schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def iter_batches(rows, batch_rows: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_time_ns(value: str) -> int:
+    """
+    Nanoseconds since the epoch, or an ISO 8601 time (UTC unless it has an offset).
+    """
+    if value.isdigit():
+        return int(value)
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - datetime(1970, 1, 1, tzinfo=timezone.utc)) // timedelta(microseconds=1) * 1000
+
+
+def get_vec_nums(lfj, vec_patterns) -> frozenset:
+    if not vec_patterns:
+        return None
+    vec_nums = set()
+    for vec_num in range(len(lfj.vecs)):
+        vec = lfj.get_vec(vec_num)
+        if vec is not None and vec.on_disk_vec_info is not None and any(fnmatch.fnmatchcase(vec.on_disk_vec_info.name, pattern) for pattern in vec_patterns):
+            vec_nums.add(vec_num)
+    return frozenset(vec_nums)
+
+
+def dump_journal(lfj_name: str, kind: str, out, fmt: str = "text", level: int = LockFreeJournal.PRINT_LITTLE,
+                 vec_patterns=None, seq_from: int = None, seq_to: int = None, time_from_ns: int = None, time_to_ns: int = None,
+                 op_names=None, num_workers: int = None, printer_spec: str = None, max_mapped_segs: int = MAX_MAPPED_SEGS,
+                 shard_bytes: int = DUMP_SHARD_BYTES, task_items: int = DUMP_TASK_ITEMS, mp_context=None) -> int:
+    """
+    Streams the tx ops ("tx"), vec items ("items") or streams ("strms") of a journal to out
+    (a text stream for "text"/"csv", a path for "parquet"). The journal is opened read-only
+    with at most max_mapped_segs segments mapped, in this process to plan the work and in
+    each pool worker to decode it; at most two tasks per worker are in flight.
+
+    :param level: PRINT_NONE prints only row counts per op or vec; PRINT_LITTLE rows without
+                  payloads; PRINT_MORE the first MORE_PAYLOAD_BYTES of each; PRINT_ALL whole.
+    :param printer_spec: "module:function" naming a PrinterFinder; a printer it returns for a
+                         vec renders that vec's payloads (what it prints becomes the payload).
+    :param num_workers: Pool size; defaults to the number of CPUs. 0 decodes in this process.
+    :return: The number of rows written.
+    """
+    op_codes = None
+    if op_names:
+        names = {Tx.op_code_to_name(op_code): op_code for op_code in OpCodes}
+        unknown = [op_name for op_name in op_names if op_name not in names]
+        if unknown:
+            raise Exception(f"unknown op names; op_names={unknown}, known={sorted(names)}")
+        op_codes = frozenset(names[op_name] for op_name in op_names)
+
+    lfj = open_journal(lfj_name, max_mapped_segs)
+    pool = None
+    try:
+        dump_filter = DumpFilter(get_vec_nums(lfj, vec_patterns), seq_from, seq_to, time_from_ns, time_to_ns, op_codes)
+        num_workers = (os.cpu_count() or 1) if num_workers is None else num_workers
+        if kind == "strms":
+            columns, rows = STRM_COLUMNS, iter_strm_rows(lfj)
+        else:
+            if num_workers == 0:
+                init_worker(lfj_name, max_mapped_segs, level, printer_spec)
+            else:
+                mp_context = multiprocessing.get_context() if mp_context is None else mp_context
+                pool = mp_context.Pool(num_workers, initializer=init_worker, initargs=(lfj_name, max_mapped_segs, level, printer_spec))
+            runner = TaskRunner(pool, 2 * max(1, num_workers))
+            if kind == "tx":
+                columns, rows = TX_COLUMNS, iter_tx_rows(lfj, runner, dump_filter, level, shard_bytes)
+            elif kind == "items":
+                columns, rows = ITEM_COLUMNS, iter_item_rows(lfj, runner, dump_filter, level, task_items)
+            else:
+                raise Exception(f"unknown kind; kind={kind}")
+
+        if level == LockFreeJournal.PRINT_NONE and kind != "strms":
+            counts = Counter()
+            for task_counts in rows:
+                counts.update(task_counts)
+            columns, rows = [("op" if kind == "tx" else "vec_name", "str"), ("num_rows", "u64")], sorted(counts.items())
+
+        writer = ParquetWriter(out, columns) if fmt == "parquet" else TextWriter(out, columns, fmt)
+        num_rows = 0
+        try:
+            for batch in iter_batches(rows, 65536 if fmt == "parquet" else 1024):
+                writer.write_rows(batch)
+                num_rows += len(batch)
+        finally:
+            writer.close()
+        return num_rows
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        close_worker()
+        lfj.close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Dump the tx ops, vec items or streams of a journal, read-only and streaming")
+    parser.add_argument("lfj_name", help="journal directory")
+    parser.add_argument("kind", choices=["tx", "items", "strms"])
+    parser.add_argument("--format", dest="fmt", choices=["text", "csv", "parquet"], default="text")
+    parser.add_argument("--output", help="output file; stdout when omitted (required for parquet)")
+    parser.add_argument("--level", choices=PrintLevelName, default="little", help="none: counts only, little: no payloads, more: payload prefixes, all: payloads")
+    parser.add_argument("--vec", action="append", help="vec name or glob pattern; repeatable")
+    parser.add_argument("--seq-from", type=int, help="lowest seq_num")
+    parser.add_argument("--seq-to", type=int, help="seq_num to stop before")
+    parser.add_argument("--time-from", type=parse_time_ns, help="earliest timestamp: ns since the epoch or ISO 8601 (UTC)")
+    parser.add_argument("--time-to", type=parse_time_ns, help="timestamp to stop before")
+    parser.add_argument("--op", action="append", help="op code name, e.g. OP_SET_VEC_ITEM; repeatable (tx only)")
+    parser.add_argument("--workers", type=int, help="decoding processes; default: number of CPUs, 0: none")
+    parser.add_argument("--printer", help="module:function returning a printer per vec (a PrinterFinder)")
+    parser.add_argument("--max-mapped-segs", type=int, default=MAX_MAPPED_SEGS)
+    args = parser.parse_args()
+
+    if args.fmt == "parquet" and args.output is None:
+        parser.error("--format parquet needs --output")
+    out = args.output if args.fmt == "parquet" else (open(args.output, "w", newline="") if args.output else sys.stdout)
+    # run as __main__, the pool tasks must still name functions of the importable module
+    from persistance.lfj_dump import dump_journal as run_dump
+    try:
+        run_dump(args.lfj_name, args.kind, out, args.fmt, PrintLevelName.index(args.level), args.vec, args.seq_from, args.seq_to,
+                     args.time_from, args.time_to, args.op, args.workers, args.printer, args.max_mapped_segs)
+    except BrokenPipeError:
+        # the reader (e.g. head) went away; keep the interpreter from failing to flush stdout
+        sys.stdout = open(os.devnull, "w")
+    finally:
+        if out is not sys.stdout and args.fmt != "parquet":
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+import itertools
+import os
+import socket
+import threading
+import time
+from array import array
+
+
+class HdrHistogram:
+    """
+    A fixed-memory log-linear histogram of non-negative integers (ns by default).
+
+    Values below 2^sub_bucket_bits are counted exactly; above that every power of two
+    is split into 2^(sub_bucket_bits - 1) equal buckets, so any recorded value is
+    known to within 2^-(sub_bucket_bits - 1) of itself (under 1% with the default 8
+    bits) up to 2^max_bits - 1, above which values are clamped. The counts live in one
+    preallocated array('Q'); record() allocates nothing.
+
+    A histogram is recorded into by a single writer (a stream's writer holds its
+    write mutex); readers only take snapshots.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 8, max_bits: int = 40):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_shift = sub_bucket_bits - 1
+        self.max_value = (1 << max_bits) - 1
+        self.counts = array('Q', bytes(8 * (self.get_index(self.max_value) + 1)))
+        self.total_count = 0
+        self.total_sum = 0
+        self.max_recorded = 0
+
+    def get_index(self, value: int) -> int:
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return (shift << self.half_shift) + (value >> shift)
+
+    def get_bucket_bounds(self, idx: int):
+        """
+        :return: (lowest, highest) value counted in bucket idx.
+        """
+        if idx < self.sub_bucket_count:
+            return idx, idx
+        shift = (idx >> self.half_shift) - 1
+        sub_idx = idx - (shift << self.half_shift)
+        return sub_idx << shift, ((sub_idx + 1) << shift) - 1
+
+    def record(self, value: int):
+        if value < 0:
+            value = 0
+        elif value > self.max_value:
+            value = self.max_value
+        self.counts[self.get_index(value)] += 1
+        self.total_count += 1
+        self.total_sum += value
+        if value > self.max_recorded:
+            self.max_recorded = value
+
+    def get_count(self) -> int:
+        return self.total_count
+
+    def get_mean(self) -> float:
+        return self.total_sum / self.total_count if self.total_count else 0.0
+
+    def get_value_at_percentile(self, percentile: float) -> int:
+        """
+        :return: The highest value of the bucket holding the percentile-th value.
+        """
+        if self.total_count == 0:
+            return 0
+        rank = max(1, int(self.total_count * percentile / 100.0 + 0.5))
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.get_bucket_bounds(idx)[1], self.max_recorded)
+        return self.max_recorded
+
+    def get_count_at_or_below(self, values):
+        """
+        :param values: Ascending bucket limits.
+        :return: Cumulative counts of recorded values <= each limit, for Prometheus buckets.
+        """
+        cumulative = []
+        seen = 0
+        idx = 0
+        for value in values:
+            last_idx = self.get_index(min(value, self.max_value))
+            if self.get_bucket_bounds(last_idx)[1] > value:
+                last_idx -= 1
+            while idx <= last_idx:
+                seen += self.counts[idx]
+                idx += 1
+            cumulative.append(seen)
+        return cumulative
+
+    def add(self, other: 'HdrHistogram'):
+        for idx, count in enumerate(other.counts):
+            if count:
+                self.counts[idx] += count
+        self.total_count += other.total_count
+        self.total_sum += other.total_sum
+        self.max_recorded = max(self.max_recorded, other.max_recorded)
+
+    def reset(self):
+        self.counts = array('Q', bytes(8 * len(self.counts)))
+        self.total_count = 0
+        self.total_sum = 0
+        self.max_recorded = 0
+
+
+class StrmMetrics:
+    """
+    Counters and histograms of one stream, updated by its writer.
+    """
+
+    def __init__(self, strm_num: int, strm_name: str):
+        self.strm_num = strm_num
+        self.strm_name = strm_name
+        self.committed_bytes = 0
+        self.committed_msgs = 0
+        self.heap_buf_spills = 0
+        self.alloc_ns = 0
+        self.commit_latency = HdrHistogram()
+        self.map_seg_latency = HdrHistogram()
+        self.tx_latency = HdrHistogram()
+
+    def on_alloc(self):
+        """
+        Starts the commit latency of the buffer or burst being allocated.
+        """
+        self.alloc_ns = time.perf_counter_ns()
+
+    def on_commit(self, num_bytes: int, num_msgs: int):
+        self.committed_bytes += num_bytes
+        self.committed_msgs += num_msgs
+        if self.alloc_ns:
+            self.commit_latency.record(time.perf_counter_ns() - self.alloc_ns)
+            self.alloc_ns = 0
+
+    def on_tx_commit(self, num_bytes: int, begin_ns: int):
+        """
+        Counts a tx TxBuilder.commit() published and records its latency from begin_ns.
+        """
+        self.committed_bytes += num_bytes
+        self.committed_msgs += 1
+        self.tx_latency.record(time.perf_counter_ns() - begin_ns)
+
+
+class JournalMetrics:
+    """
+    The metrics registry of a LockFreeJournal:
+
+        lfj_strm_committed_bytes_total / lfj_strm_committed_msgs_total   per stream
+        lfj_strm_heap_buf_spills_total   buffers that crossed a segment and went through a heap copy
+        lfj_strm_commit_latency_ns       buf_malloc() to buf_commit(), reserve() to commit_many() and
+                                         append_batch() start to end
+        lfj_strm_map_seg_latency_ns      mapping one segment (file growth, mmap and pre-faulting)
+        lfj_tx_latency_ns                TxBuilder.begin() to the tx's committed_len store, recorded
+                                         per TX stream and summed over them when read
+        lfj_reader_lag_items             items a ReadSnapshot knows of but its consumer has not read
+
+    snapshot() adds per-second rates since the previous snapshot; to_prometheus_text()
+    renders everything in the Prometheus text format, which export() writes to a file
+    or a socket, once or every interval_secs from a background thread.
+    """
+    LATENCY_BUCKETS_NS = [1 << shift for shift in range(8, 35)]
+
+    def __init__(self):
+        self.strm_metrics = {}
+        self.reader_lags = {}
+        self.reader_ids = itertools.count()
+        self.last_snapshot = None
+        self.export_thread = None
+        self.export_stop = threading.Event()
+
+    def get_strm_metrics(self, strm_num: int, strm_name: str) -> StrmMetrics:
+        strm_metrics = self.strm_metrics.get(strm_num)
+        if strm_metrics is None or strm_metrics.strm_name != strm_name:
+            strm_metrics = StrmMetrics(strm_num, strm_name)
+            self.strm_metrics[strm_num] = strm_metrics
+        return strm_metrics
+
+    def get_tx_latency(self) -> HdrHistogram:
+        tx_latency = HdrHistogram()
+        for strm_metrics in list(self.strm_metrics.values()):
+            tx_latency.add(strm_metrics.tx_latency)
+        return tx_latency
+
+    def register_reader(self) -> int:
+        reader_id = next(self.reader_ids)
+        self.reader_lags[reader_id] = 0
+        return reader_id
+
+    def set_reader_lag(self, reader_id: int, lag_items: int):
+        self.reader_lags[reader_id] = lag_items
+
+    def snapshot(self):
+        """
+        :return: {"secs": seconds since the previous snapshot,
+                  "strms": {strm_name: {committed_bytes, committed_msgs, bytes_per_sec, msgs_per_sec, heap_buf_spills,
+                                        commit_latency_p50_ns, commit_latency_p99_ns, map_seg_latency_p99_ns}},
+                  "tx_latency_p50_ns", "tx_latency_p99_ns", "reader_lags": {reader_id: items}}
+        """
+        now = time.monotonic()
+        last_time, last_counts = self.last_snapshot if self.last_snapshot is not None else (None, {})
+        secs = now - last_time if last_time is not None else 0.0
+        strms = {}
+        counts = {}
+        for strm_num, strm_metrics in list(self.strm_metrics.items()):
+            committed_bytes = strm_metrics.committed_bytes
+            committed_msgs = strm_metrics.committed_msgs
+            last_bytes, last_msgs = last_counts.get(strm_num, (0, 0))
+            counts[strm_num] = (committed_bytes, committed_msgs)
+            strms[strm_metrics.strm_name] = {
+                "committed_bytes": committed_bytes,
+                "committed_msgs": committed_msgs,
+                "bytes_per_sec": (committed_bytes - last_bytes) / secs if secs > 0 else 0.0,
+                "msgs_per_sec": (committed_msgs - last_msgs) / secs if secs > 0 else 0.0,
+                "heap_buf_spills": strm_metrics.heap_buf_spills,
+                "commit_latency_p50_ns": strm_metrics.commit_latency.get_value_at_percentile(50),
+                "commit_latency_p99_ns": strm_metrics.commit_latency.get_value_at_percentile(99),
+                "map_seg_latency_p99_ns": strm_metrics.map_seg_latency.get_value_at_percentile(99),
+            }
+        self.last_snapshot = (now, counts)
+        tx_latency = self.get_tx_latency()
+        return {
+            "secs": secs,
+            "strms": strms,
+            "tx_latency_p50_ns": tx_latency.get_value_at_percentile(50),
+            "tx_latency_p99_ns": tx_latency.get_value_at_percentile(99),
+            "reader_lags": dict(self.reader_lags),
+        }
+
+    def histogram_lines(self, name: str, labels: str, histogram: HdrHistogram):
+        sep = "," if labels else ""
+        suffix = f"{{{labels}}}" if labels else ""
+        lines = []
+        for le, count in zip(self.LATENCY_BUCKETS_NS, histogram.get_count_at_or_below(self.LATENCY_BUCKETS_NS)):
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {histogram.get_count()}')
+        lines.append(f"{name}_sum{suffix} {histogram.total_sum}")
+        lines.append(f"{name}_count{suffix} {histogram.get_count()}")
+        return lines
+
+    def to_prometheus_text(self) -> str:
+        strm_metrics_list = sorted(self.strm_metrics.values(), key=lambda strm_metrics: strm_metrics.strm_num)
+        lines = []
+        for name, attr, help_text in (("lfj_strm_committed_bytes_total", "committed_bytes", "Bytes committed to the stream"),
+                                      ("lfj_strm_committed_msgs_total", "committed_msgs", "Messages committed to the stream"),
+                                      ("lfj_strm_heap_buf_spills_total", "heap_buf_spills", "Buffers spilled to the heap at a segment boundary")):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for strm_metrics in strm_metrics_list:
+                lines.append(f'{name}{{strm="{strm_metrics.strm_name}"}} {getattr(strm_metrics, attr)}')
+
+        for name, attr, help_text in (("lfj_strm_commit_latency_ns", "commit_latency", "Buffer allocation to commit"),
+                                      ("lfj_strm_map_seg_latency_ns", "map_seg_latency", "Mapping one stream segment")):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for strm_metrics in strm_metrics_list:
+                lines += self.histogram_lines(name, f'strm="{strm_metrics.strm_name}"', getattr(strm_metrics, attr))
+
+        lines.append("# HELP lfj_tx_latency_ns TxBuilder.begin() to commit")
+        lines.append("# TYPE lfj_tx_latency_ns histogram")
+        lines += self.histogram_lines("lfj_tx_latency_ns", "", self.get_tx_latency())
+
+        lines.append("# HELP lfj_reader_lag_items Items known to a ReadSnapshot but not yet read")
+        lines.append("# TYPE lfj_reader_lag_items gauge")
+        for reader_id, lag_items in sorted(self.reader_lags.items()):
+            lines.append(f'lfj_reader_lag_items{{reader="{reader_id}"}} {lag_items}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, target, interval_secs: float = None):
+        """
+        Writes to_prometheus_text() to target: a file path (replaced atomically, e.g. for
+        node_exporter's textfile collector), a unix socket path prefixed with "unix:" or a
+        (host, port) tuple. With interval_secs a background thread repeats it until
+        stop_export().
+        """
+        if interval_secs is None:
+            self.export_once(target)
+            return
+        self.stop_export()
+        self.export_stop.clear()
+        self.export_thread = threading.Thread(target=self.run_export, args=(target, interval_secs), name="lfj_metrics_export", daemon=True)
+        self.export_thread.start()
+
+    def export_once(self, target):
+        text = self.to_prometheus_text().encode()
+        if isinstance(target, tuple):
+            with socket.create_connection(target, timeout=5) as sock:
+                sock.sendall(text)
+        elif target.startswith("unix:"):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(5)
+                sock.connect(target[len("unix:"):])
+                sock.sendall(text)
+        else:
+            tmp_path = f"{target}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as metrics_file:
+                metrics_file.write(text)
+            os.replace(tmp_path, target)
+
+    def run_export(self, target, interval_secs: float):
+        while not self.export_stop.wait(interval_secs):
+            try:
+                self.export_once(target)
+            except OSError:
+                # the collector may be down; the next round retries
+                pass
+
+    def stop_export(self):
+        if self.export_thread is not None:
+            self.export_stop.set()
+            self.export_thread.join()
+            self.export_thread = None
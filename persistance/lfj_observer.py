@@ -22,6 +22,16 @@ class LFJObserver(ABC):
         """
         pass
 
+    def on_vector_update_batch(self, vec_num, begin_idx, end_idx):
+        """
+        A run of items has been appended to a vector; called by TailFollower once per wakeup
+        :param vec_num: Vector number that has been updated
+        :param begin_idx: Index of the first new item
+        :param end_idx: One past the index of the last new item
+        """
+        for idx in range(begin_idx, end_idx):
+            self.on_vector_update(vec_num, idx)
+
     @abstractmethod
     def on_vector_created(self, vec):
         """
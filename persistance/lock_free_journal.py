@@ -2,10 +2,30 @@ import os
 import mmap
 import struct
 import threading
+import time
+from array import array
 import fcntl
 import errno
+import stat
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from typing import Callable, List, Tuple, Dict, Optional, Any
+from persistance.archive import ARCHIVE_SUFFIX, ArchiveReader
+from persistance.atomic_word import AtomicUint32, AtomicUint64
+from persistance.doorbell import FutexDoorbell
+from persistance.durability import Durability
+from persistance.lfj_metrics import JournalMetrics
+from persistance.ondisk_journal_hdr import OnDiskJournalHdr
+from persistance.order_index import ORDER_INDEX_NODES_NAME, OrderIndex
+from persistance.rup_pos import Pos
+from persistance.rup_vec import AuxTagsStatus, Vec
+from persistance.strm_pool import StrmPool
+from persistance.strm_checksum import CHECKSUM_SUFFIX, StrmChecksum, verify_strms
+from persistance.seg_mapper import SegLru, SegMapper
+from persistance.rup_tx import Tx
+from persistance.tx_builder import iter_tx_ops, read_tx_hdr
+from persistance.vec_columns import VecColumns
 
 VAL_TO_NAME = lambda name: str(name)
 
@@ -31,12 +51,6 @@ class VecType:
     ORDER_VEC = 2
     AUX_VEC = 3
 
-class AuxTagsStatus:
-    AuxTagsReady = 0
-    AuxTagsNotReady = 1
-    AuxTagsError = 2
-    AuxTagsNone = 3
-
 StrmTypeName = [
     "UNKNOWN_STREAM",
     "DATA_STREAM",
@@ -57,32 +71,6 @@ PrinterFinder = Callable[[str, str], Callable[[str, bytes, int, int], None]]
 class LFJObserver:
     pass
 
-class AtomicUint32:
-    def __init__(self, value=0):
-        self.value = value
-        self.lock = threading.Lock()
-
-    def get(self):
-        with self.lock:
-            return self.value
-
-    def set(self, value):
-        with self.lock:
-            self.value = value
-
-class AtomicUint64:
-    def __init__(self, value=0):
-        self.value = value
-        self.lock = threading.Lock()
-
-    def get(self):
-        with self.lock:
-            return self.value
-
-    def set(self, value):
-        with self.lock:
-            self.value = value
-
 class LockFreeJournal:
     PRINT_NONE = 0
     PRINT_LITTLE = 1
@@ -99,6 +87,7 @@ class LockFreeJournal:
     MAX_VEC_NUM = MAX_VECS - 1
     STRM_OFF_MASK = ((1 << (32 + SEG_SIZE_SHIFT)) - 1)
     LFJ_STRM_0_NAME = "LFJ_STRM_0"
+    LFJ_DOORBELL_NAME = "LFJ_DOORBELL"
     TX_STRM_NAME_PREFIX = "TX_STRM"
 
     UNITIALIZED_STRM_NUM = MAX_STRMS
@@ -106,79 +95,42 @@ class LockFreeJournal:
     UNITIALIZED_VEC_NUM = MAX_VECS
 
     def __init__(self):
+        self.lfj_name = None
+        self.lfj_dir = None
+        self.is_initialized = False
+        self.is_writeable = False
+        self.is_rollbackable = False
+        self.did_exist_before_open = False
         self.strms = []
         self.vecs = []
         self.listeners = []
-
-    class Pos:
-        SEG_OFF_SHIFT = 0
-        SEG_OFF_MASK = LockFreeJournal.SEG_SIZE_MASK
-        SEG_NUM_SHIFT = SEG_OFF_SHIFT + 14
-        SEG_NUM_MASK = LockFreeJournal.SEG_NUM_MASK
-        STRM_OFF_SHIFT = 0
-        STRM_OFF_MASK = LockFreeJournal.STRM_OFF_MASK
-        STRM_NUM_SHIFT = STRM_OFF_SHIFT + 36
-        STRM_NUM_MASK = LockFreeJournal.STRM_NUM_MASK
-        LEN_SHIFT = STRM_NUM_SHIFT + 10
-        LEN_MASK = 0x0001ffff
-        FLAG_SHIFT = 63
-        FLAG_MASK = 0x01
-
-        def __init__(self):
-            self.strm_num_seg_num_seg_off = 0
-
-        def get_strm_num(self) -> int:
-            return (self.strm_num_seg_num_seg_off >> self.STRM_NUM_SHIFT) & self.STRM_NUM_MASK
-
-        def get_strm_off(self) -> int:
-            return (self.strm_num_seg_num_seg_off >> self.STRM_OFF_SHIFT) & self.STRM_OFF_MASK
-
-        def get_seg_num(self) -> int:
-            return (self.strm_num_seg_num_seg_off >> self.SEG_NUM_SHIFT) & self.SEG_NUM_MASK
-
-        def get_seg_off(self) -> int:
-            return (self.strm_num_seg_num_seg_off >> self.SEG_OFF_SHIFT) & self.SEG_OFF_MASK
-
-        def get_len(self) -> int:
-            return (self.strm_num_seg_num_seg_off >> self.LEN_SHIFT) & self.LEN_MASK
-
-        def get_flag(self) -> bool:
-            return (self.strm_num_seg_num_seg_off >> self.FLAG_SHIFT) & self.FLAG_MASK
-
-        def is_null(self) -> bool:
-            return self.strm_num_seg_num_seg_off == 0
-
-        def is_patch(self) -> bool:
-            return self.get_flag()
-
-        def __eq__(self, other):
-            if isinstance(other, LockFreeJournal.Pos):
-                return self.strm_num_seg_num_seg_off == other.strm_num_seg_num_seg_off
-            return False
-
-        def __ne__(self, other):
-            return not self.__eq__(other)
-
-        def __lt__(self, other):
-            if isinstance(other, LockFreeJournal.Pos):
-                return self.strm_num_seg_num_seg_off < other.strm_num_seg_num_seg_off
-            return False
-
-        def __gt__(self, other):
-            return not self.__lt__(other) and not self.__eq__(other)
-
-        def __le__(self, other):
-            return self.__lt__(other) or self.__eq__(other)
-
-        def __ge__(self, other):
-            return not self.__lt__(other)
-
-        def __repr__(self):
-            return f"Pos({self.strm_num_seg_num_seg_off})"
-
-        @staticmethod
-        def get_max_len() -> int:
-            return LockFreeJournal.Pos.LEN_MASK
+        self.on_disk_journal_hdr = None
+        self.prefault_segs = True
+        self.keep_spare_seg = True
+        self.seg_overlap = 0
+        self.checksum_block_size = None
+        self.verify_checksums = False
+        self.checksum_verified_lens = {}
+        self.recovery_threads = min(32, os.cpu_count() or 1)
+        self.strm_recovery_secs = {}
+        self.vec_recovery_secs = {}
+        self.open_secs = 0.0
+        self.open_complete = threading.Event()
+        self.seg_lru = None
+        self.durability = Durability(self)
+        self.doorbell = None
+        self.num_alloc_mutex = threading.RLock()
+        self.strm_pool = None
+        self.metrics = JournalMetrics()
+        self.order_index = None
+        self.global_tx_seq_mutex = threading.Lock()
+        self.own_tx_strm = threading.local()
+        self.free_tx_strms = []
+        self.tx_strms_to_roll_back = []
+
+    # the packed position type is shared with pos_array; see rup_pos.Pos for the bit layout
+    Pos = Pos
+    Vec = Vec
 
     class Seg:
         def __init__(self):
@@ -186,6 +138,7 @@ class LockFreeJournal:
             self.strm = None
             self.seg_num_plus_1 = 0
             self.seg_data = None
+            self.seg_view = None
 
         def get_seg_num(self) -> int:
             return self.seg_num_plus_1 - 1
@@ -206,8 +159,27 @@ class LockFreeJournal:
             self.lock_free_journal = strm.lock_free_journal
             self.strm = strm
             self.seg_data = seg_data
+            self.seg_view = memoryview(seg_data)
             self.seg_num_plus_1 = seg_num + 1
 
+        def unmap(self) -> bool:
+            """
+            Unmaps the segment unless a view handed out over it is still alive.
+            :return: False if the segment is still in use and stays mapped.
+            """
+            try:
+                self.seg_view.release()
+            except BufferError:
+                return False
+            try:
+                self.seg_data.close()
+            except BufferError:
+                self.seg_view = memoryview(self.seg_data)
+                return False
+            self.seg_view = None
+            self.seg_data = None
+            return True
+
     class Strm:
         def __init__(self):
             self.lock_free_journal = None
@@ -223,10 +195,21 @@ class LockFreeJournal:
             self.alloc_buf = None
             self.alloc_buf_strm_off = 0
             self.strm_write_mutex = threading.RLock()
+            self.seg_mapper = None
+            self.seg_lru = None
+            self.archive = None
+            self.batch_strm_off = 0
+            self.batch_len = 0
+            self.batch_heap_buf = None
+            self.strm_metrics = None
+            self.checksum = None
 
         def get_strm_num(self) -> int:
             return self.strm_num_plus_1 - 1
 
+        def get_lfj(self):
+            return self.lock_free_journal
+
         def get_strm_name(self) -> str:
             return self.strm_path  # Assuming the path is the name
 
@@ -254,61 +237,124 @@ class LockFreeJournal:
         def is_initialized(self) -> bool:
             return self.lock_free_journal is not None
 
-        def locate_data_in_strm(self, strm_off: int, caller: str) -> bytes:
+        @staticmethod
+        def get_seg_num(strm_off: int) -> int:
+            return strm_off >> SEG_SIZE_SHIFT
+
+        @staticmethod
+        def get_seg_off(strm_off: int) -> int:
+            return strm_off & SEG_SIZE_MASK
+
+        def locate_data_in_strm(self, strm_off: int, caller: str) -> memoryview:
             seg_num = self.get_seg_num(strm_off)
             seg_off = self.get_seg_off(strm_off)
-            seg_data = self.map_seg(seg_num, True, caller)
-            return seg_data[seg_off:]
+            self.map_seg(seg_num, True, caller)
+            return self.segs[seg_num].seg_view[seg_off:]
+
+        def locate_data(self, strm_off: int, length: int, caller: str) -> Tuple[memoryview, Optional[memoryview]]:
+            """
+            Returns views over the mapped segments holding [strm_off, strm_off + length).
+            The second view is None unless the data is split across a segment boundary.
+            """
+            if self.archive is not None:
+                return self.archive.locate_data(strm_off, length), None
+
+            seg_num = strm_off >> SEG_SIZE_SHIFT
+            seg_off = strm_off & SEG_SIZE_MASK
+            segs = self.segs
+            seg = segs[seg_num] if seg_num < len(segs) else None
+            if seg is None or seg.seg_data is None:
+                if self.map_seg(seg_num, False, caller) is None:
+                    raise Exception(f"seg is not in strm file; strm_name={self.strm_name}, seg_num={seg_num}, caller={caller}")
+                seg = segs[seg_num]
+            elif self.seg_lru is not None:
+                self.seg_lru.touch(seg)
+
+            seg_end = seg_off + length
+            if seg_end <= len(seg.seg_view):
+                return seg.seg_view[seg_off:seg_end], None
+
+            # the first view pins its segment so mapping the next one cannot evict it
+            data_1 = seg.seg_view[seg_off:]
+            if self.map_seg(seg_num + 1, False, caller) is None:
+                raise Exception(f"seg is not in strm file; strm_name={self.strm_name}, seg_num={seg_num + 1}, caller={caller}")
+            return data_1, segs[seg_num + 1].seg_view[:seg_end - SEG_SIZE]
+
+        def map_seg(self, seg_num: int, create_if_needed: bool, caller: str) -> mmap.mmap:
+            if seg_num < len(self.segs):
+                seg = self.segs[seg_num]
+                if seg is not None and seg.seg_data is not None:
+                    if self.seg_lru is not None:
+                        self.seg_lru.touch(seg)
+                    return seg.seg_data
+            return self.map_seg_(seg_num, create_if_needed, caller, False)
+
+        def map_seg_(self, seg_num: int, create_if_needed: bool, caller: str, is_recovery: bool) -> mmap.mmap:
+            if self.archive is not None:
+                raise Exception(f"an archived strm has no segs, read it with locate_data(); strm_name={self.strm_name}, caller={caller}")
+            if seg_num > LockFreeJournal.MAX_SEG_NUM:
+                raise Exception(f"seg_num exceeds MAX_SEG_NUM; strm_name={self.strm_name}, seg_num={seg_num}, caller={caller}")
 
-        def map_seg(self, seg_num: int, create_if_needed: bool, caller: str) -> bytes:
             while len(self.segs) <= seg_num:
                 self.segs.append(None)
 
             seg = self.segs[seg_num]
-            if seg is None or seg.seg_data is None:
-                seg = LockFreeJournal.Seg()
-                seg_data = self.map_seg_(seg_num, create_if_needed, caller, False)
-                seg.init(self, seg_data, seg_num, caller)
-                self.segs[seg_num] = seg
-            return seg.seg_data
+            if seg is not None and seg.seg_data is not None:
+                return seg.seg_data
+
+            if self.seg_mapper is None:
+                lfj = self.lock_free_journal
+                self.seg_lru = lfj.seg_lru
+                self.seg_mapper = SegMapper(self.get_strm_fd(), lfj.is_writeable, lfj.prefault_segs, lfj.keep_spare_seg and self.seg_lru is None,
+                                            overlap=lfj.seg_overlap)
+
+            # recovery only maps segments that are already in the file; the spare is requested by the first writer map
+            map_begin_ns = time.perf_counter_ns()
+            seg_data = self.seg_mapper.map_seg(seg_num, create_if_needed and not is_recovery, caller)
+            if seg_data is None:
+                return None
+            if self.strm_metrics is not None:
+                self.strm_metrics.map_seg_latency.record(time.perf_counter_ns() - map_begin_ns)
 
-        def map_seg_(self, seg_num: int, create_if_needed: bool, caller: str, is_recovery: bool) -> bytes:
-            # Implementation of map_seg_ function
-            pass
+            seg = LockFreeJournal.Seg()
+            self.segs[seg_num] = seg
+            seg.init(self, seg_data, seg_num, caller)
+            if self.seg_lru is not None:
+                self.seg_lru.add(seg)
+            return seg_data
 
         def acquire_write_lock(self, fd, file_name):
-            file_lock = struct.pack('hhllhh', mmap.LOCK_EX, 0, 0, 0, 0, 0)
+            """
+            Takes an exclusive flock on the stream file, failing at once if another writer
+            (in this or another process) holds it. flock rather than fcntl record locks, so
+            a reader of the same file closing its own fd does not drop the lock.
+            """
             try:
-                fcntl.fcntl(fd, fcntl.F_SETLK, file_lock)
-            except IOError as e:
-                if e.errno in [errno.EACCES, errno.EAGAIN]:
-                    fcntl.fcntl(fd, fcntl.F_GETLK, file_lock)
-                    raise Exception(f"Cannot acquire write lock on {file_name}; file is currently locked by pid {file_lock.l_pid}")
-                else:
-                    raise Exception(f"Cannot acquire write lock on {file_name}; errno={errno} {os.strerror(errno)}")
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                if e.errno in (errno.EACCES, errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise Exception(f"Cannot acquire write lock on {file_name}; file is currently locked by another writer")
+                raise Exception(f"Cannot acquire write lock on {file_name}; errno={e.errno} {os.strerror(e.errno)}")
 
         def create_strm_file(self, strm_path: str) -> int:
-            flags = os.O_RDWR if self.lock_free_journal.is_writeable else os.O_RDONLY
-            fd = os.open(strm_path, flags, 0)
-            mode = 0
+            """
+            Creates the stream file, or truncates a leftover one once its write lock is held.
+            """
+            if not self.lock_free_journal.is_writeable:
+                raise Exception(f"a strm file cannot be created by a read-only journal; strm_path={strm_path}")
 
-            if fd >= 0:
-                os.close(fd)
-                if self.lock_free_journal.is_writeable:
-                    mode = stat.S_IRWXU | stat.S_IRGRP | stat.S_IROTH
-                    flags |= os.O_TRUNC | os.O_CREAT
-                    fd = os.open(strm_path, flags, mode)
-            elif errno == errno.ENOENT and self.lock_free_journal.is_writeable:
-                mode = stat.S_IRWXU | stat.S_IRGRP | stat.S_IROTH
-                flags |= os.O_CREAT
-                fd = os.open(strm_path, flags, mode)
-
-            if fd == -1:
-                raise Exception(f"::open() failed; strm_path={strm_path}")
+            mode = stat.S_IRWXU | stat.S_IRGRP | stat.S_IROTH
+            try:
+                fd = os.open(strm_path, os.O_RDWR | os.O_CREAT, mode)
+            except OSError as e:
+                raise Exception(f"::open() failed; strm_path={strm_path}, errno={e.errno} {os.strerror(e.errno)}")
 
-            if self.lock_free_journal.is_writeable:
+            try:
                 self.acquire_write_lock(fd, strm_path)
-
+                os.ftruncate(fd, 0)
+            except Exception:
+                os.close(fd)
+                raise
             return fd
 
         def recover_strm_from_file(self, strm_num: int, strm_path: str) -> int:
@@ -316,41 +362,48 @@ class LockFreeJournal:
                 raise Exception(f"Cannot recover a strm when lfj did not exist before open; strm_path={strm_path}")
 
             flags = os.O_RDWR if self.lock_free_journal.is_writeable else os.O_RDONLY
-            fd = os.open(strm_path, flags, 0)
-
-            if fd < 0:
+            try:
+                fd = os.open(strm_path, flags, 0)
+            except FileNotFoundError:
                 raise Exception(f"strm file does not exist; strm_path={strm_path}")
 
             if self.lock_free_journal.is_writeable:
-                self.acquire_write_lock(fd, strm_path)
+                try:
+                    self.acquire_write_lock(fd, strm_path)
+                except Exception:
+                    os.close(fd)
+                    raise
 
             return fd
 
-        def buf_malloc(self, size: int, caller: str) -> bytes:
-            self.buf_free(self.alloc_heap_buf if self.alloc_heap_buf else self.alloc_buf, caller)
+        def buf_malloc(self, size: int, caller: str) -> memoryview:
+            if self.strm_metrics is not None:
+                self.strm_metrics.on_alloc()
+            self.buf_free(self.alloc_buf, caller)
             return self.buf_compact_and_realloc(0, size, caller)
 
-        def buf_free(self, alloc_buf: bytes, caller: str):
-            if self.alloc_heap_buf:
-                if alloc_buf != self.alloc_heap_buf:
-                    raise Exception(f"alloc_buf specified != alloc_heap_buf_; caller={caller}")
-                del self.alloc_heap_buf
-                self.alloc_heap_buf = None
-            else:
-                if alloc_buf != self.alloc_buf:
-                    raise Exception(f"alloc_buf specified != alloc_buf_; caller={caller}")
+        def buf_free(self, alloc_buf, caller: str):
+            if alloc_buf is not self.alloc_buf:
+                raise Exception(f"alloc_buf specified != alloc_buf_; caller={caller}")
 
+            self.alloc_heap_buf = None
             self.alloc_buf = None
             self.alloc_buf_strm_off = 0
 
-        def buf_compact_and_realloc(self, num_bytes_to_compact_at_front: int, new_buf_len: int, caller: str) -> bytes:
+        def buf_compact_and_realloc(self, num_bytes_to_compact_at_front: int, new_buf_len: int, caller: str) -> memoryview:
+            """
+            Moves the start of alloc_buf num_bytes_to_compact_at_front committed bytes forward
+            and makes it new_buf_len long; the committed bytes left at its front are kept. It
+            is a view of the mapped segment while it fits in the segment's window (counting
+            open(seg_overlap=)), else a heap buffer that buf_commit() copies into the segments.
+            """
             committed_len = self.get_committed_len()
             alloc_len = self.get_alloc_len()
 
             if self.alloc_buf is None:
                 self.alloc_buf_strm_off = committed_len
-                self.alloc_buf = self.map_seg(self.get_seg_num(committed_len), True, caller) + self.get_seg_off(committed_len)
                 self.alloc_heap_buf = None
+                alloc_len = committed_len
 
             num_bytes_committed = committed_len - self.alloc_buf_strm_off
             old_buf_len = alloc_len - self.alloc_buf_strm_off
@@ -365,45 +418,44 @@ class LockFreeJournal:
             if num_bytes_committed >= num_bytes_to_compact_at_front + new_buf_len:
                 raise Exception(f"new buf should contain space after committed_len_; caller={caller}")
 
-            num_new_segs = self.additional_new_segs_needed(new_alloc_buf_strm_off, new_buf_len)
-            if num_new_segs > 1:
+            if self.additional_new_segs_needed(new_alloc_buf_strm_off, new_buf_len) > 1:
                 raise Exception(f"Adding new_buf_len to committed_len would span 2 or more segs; caller={caller}")
 
             num_bytes_at_front_of_new_buf = num_bytes_committed - num_bytes_to_compact_at_front
+            old_buf = self.alloc_buf
             self.alloc_buf_strm_off = new_alloc_buf_strm_off
             self.on_disk_strm_info.alloc_len.set(new_alloc_buf_strm_off + new_buf_len)
 
-            if self.alloc_heap_buf is None:
-                if num_bytes_to_compact_at_front > 0:
-                    self.alloc_buf += num_bytes_to_compact_at_front
-
-                if num_new_segs == 0:
-                    return self.alloc_buf
-
-                self.alloc_heap_buf = bytearray(new_buf_len)
-                if num_bytes_at_front_of_new_buf > 0:
-                    self.alloc_heap_buf[:num_bytes_at_front_of_new_buf] = self.alloc_buf[:num_bytes_at_front_of_new_buf]
-                self.alloc_buf = self.alloc_heap_buf
-                return self.alloc_buf
-
-            if num_new_segs == 0:
+            if self.fits_in_seg_window(new_alloc_buf_strm_off, new_buf_len, caller):
+                # the committed bytes at the front are in the segment already
+                seg_off = self.get_seg_off(new_alloc_buf_strm_off)
                 self.alloc_heap_buf = None
-                seg_num = self.get_seg_num(new_alloc_buf_strm_off)
-                seg_data = self.map_seg(seg_num, True, caller)
-                self.alloc_buf = seg_data + self.get_seg_off(new_alloc_buf_strm_off)
-            else:
-                new_heap_buf = bytearray(new_buf_len)
-                if num_bytes_at_front_of_new_buf > 0:
-                    new_heap_buf[:num_bytes_at_front_of_new_buf] = self.alloc_heap_buf[num_bytes_to_compact_at_front:num_bytes_to_compact_at_front + num_bytes_at_front_of_new_buf]
-                del self.alloc_heap_buf
-                self.alloc_heap_buf = new_heap_buf
-                self.alloc_buf = self.alloc_heap_buf
+                self.alloc_buf = self.segs[self.get_seg_num(new_alloc_buf_strm_off)].seg_view[seg_off:seg_off + new_buf_len]
+                return self.alloc_buf
 
+            new_heap_buf = bytearray(new_buf_len)
+            if self.strm_metrics is not None:
+                self.strm_metrics.heap_buf_spills += 1
+            if num_bytes_at_front_of_new_buf > 0:
+                new_heap_buf[:num_bytes_at_front_of_new_buf] = old_buf[num_bytes_to_compact_at_front:num_bytes_committed]
+            self.alloc_heap_buf = new_heap_buf
+            self.alloc_buf = memoryview(new_heap_buf)
             return self.alloc_buf
 
         def additional_new_segs_needed(self, new_alloc_buf_strm_off: int, new_buf_len: int) -> int:
-            # Implementation of additional_new_segs_needed function
-            pass
+            if new_buf_len <= 0:
+                return 0
+            return self.get_seg_num(new_alloc_buf_strm_off + new_buf_len - 1) - self.get_seg_num(new_alloc_buf_strm_off)
+
+        def fits_in_seg_window(self, strm_off: int, n_bytes: int, caller: str) -> bool:
+            """
+            Whether [strm_off, strm_off + n_bytes) lies within the mapping of strm_off's
+            segment, counting the overlap window into the next segment (open(seg_overlap=)).
+            """
+            seg_num = self.get_seg_num(strm_off)
+            if self.map_seg(seg_num, True, caller) is None:
+                return False
+            return self.get_seg_off(strm_off) + n_bytes <= len(self.segs[seg_num].seg_view)
 
         def buf_commit(self, num_bytes_to_commit: int, caller: str) -> 'LockFreeJournal.Pos':
             old_committed_len = self.get_committed_len()
@@ -416,7 +468,10 @@ class LockFreeJournal:
             if self.on_disk_strm_info is None:
                 raise Exception(f"on_disk_strm_info should not be null; caller={caller}")
 
-            if self.alloc_heap_buf:
+            if num_bytes_committed + num_bytes_to_commit > buf_len:
+                raise Exception(f"committed bytes exceed alloc_buf; num_bytes_to_commit={num_bytes_to_commit}, caller={caller}")
+
+            if self.alloc_heap_buf is not None:
                 start_pos = old_committed_len
                 num_bytes_to_copy = num_bytes_to_commit
                 cur_pos = start_pos
@@ -435,9 +490,142 @@ class LockFreeJournal:
                     num_bytes_to_copy -= n
                     cur_pos += n
 
+            if self.checksum is not None:
+                self.checksum.on_commit(self, old_committed_len, new_committed_len, caller)
             self.on_disk_strm_info.valid_len.set(new_committed_len)
             self.on_disk_strm_info.committed_len.set(new_committed_len)
-            return self.Pos(self.get_strm_num(), old_committed_len, 0)
+            self.lock_free_journal.durability.note_commit(self, num_bytes_to_commit)
+            if self.strm_metrics is not None:
+                self.strm_metrics.on_commit(num_bytes_to_commit, 1)
+            self.lock_free_journal.ring_doorbell()
+            return LockFreeJournal.Pos(self.get_strm_num(), old_committed_len, num_bytes_to_commit)
+
+        def write_at(self, strm_off: int, data, caller: str):
+            """
+            Copies data into the mapped segments starting at strm_off, splitting it at segment boundaries.
+            """
+            data = memoryview(data).cast('B')
+            num_bytes = len(data)
+            done = 0
+            while done < num_bytes:
+                seg_num = strm_off >> SEG_SIZE_SHIFT
+                seg_off = strm_off & SEG_SIZE_MASK
+                segs = self.segs
+                if seg_num >= len(segs) or segs[seg_num] is None or segs[seg_num].seg_data is None:
+                    if self.map_seg(seg_num, True, caller) is None:
+                        raise Exception(f"map_seg() returns null; seg_num={seg_num}, caller={caller}")
+                seg_view = segs[seg_num].seg_view
+                n = min(num_bytes - done, len(seg_view) - seg_off)
+                seg_view[seg_off:seg_off + n] = data[done:done + n]
+                done += n
+                strm_off += n
+
+        def reserve(self, n_bytes: int, caller: str) -> memoryview:
+            """
+            Reserves n_bytes right after committed_len for a burst of messages to be
+            published by commit_many(). The returned view points into the mapped
+            segment, or into a heap buffer if the reservation crosses a segment boundary
+            beyond the segment's overlap window.
+            """
+            if self.on_disk_strm_info is None:
+                raise Exception(f"on_disk_strm_info should not be null; caller={caller}")
+            if n_bytes <= 0:
+                raise Exception(f"n_bytes should be positive; n_bytes={n_bytes}, caller={caller}")
+
+            if self.strm_metrics is not None:
+                self.strm_metrics.on_alloc()
+            committed_len = self.get_committed_len()
+            seg_num = self.get_seg_num(committed_len)
+            seg_off = self.get_seg_off(committed_len)
+            self.batch_strm_off = committed_len
+            self.batch_len = n_bytes
+            self.on_disk_strm_info.alloc_len.set(committed_len + n_bytes)
+
+            if self.fits_in_seg_window(committed_len, n_bytes, caller):
+                self.batch_heap_buf = None
+                return self.segs[seg_num].seg_view[seg_off:seg_off + n_bytes]
+
+            self.batch_heap_buf = bytearray(n_bytes)
+            if self.strm_metrics is not None:
+                self.strm_metrics.heap_buf_spills += 1
+            return memoryview(self.batch_heap_buf)
+
+        def commit_many(self, lengths, caller: str) -> array:
+            """
+            Publishes consecutive messages of the given lengths from the last reserve()
+            with a single valid_len/committed_len update.
+            :return: array('Q') of packed Pos values, one per message.
+            """
+            if self.batch_len == 0:
+                raise Exception(f"commit_many() called without reserve(); caller={caller}")
+
+            strm_off = self.batch_strm_off
+            strm_bits = (self.get_strm_num() & LockFreeJournal.Pos.STRM_NUM_MASK) << LockFreeJournal.Pos.STRM_NUM_SHIFT
+            len_shift = LockFreeJournal.Pos.LEN_SHIFT
+            max_len = LockFreeJournal.Pos.LEN_MASK
+            positions = array('Q')
+            for length in lengths:
+                if length > max_len:
+                    raise Exception(f"message is longer than Pos max len; len={length}, caller={caller}")
+                positions.append(strm_bits | (length << len_shift) | strm_off)
+                strm_off += length
+
+            num_bytes = strm_off - self.batch_strm_off
+            if num_bytes > self.batch_len:
+                raise Exception(f"committed bytes exceed reserved bytes; num_bytes={num_bytes}, batch_len={self.batch_len}, caller={caller}")
+
+            if self.batch_heap_buf is not None:
+                self.write_at(self.batch_strm_off, memoryview(self.batch_heap_buf)[:num_bytes], caller)
+                self.batch_heap_buf = None
+
+            self.batch_len = 0
+            if self.checksum is not None:
+                self.checksum.on_commit(self, self.batch_strm_off, strm_off, caller)
+            self.on_disk_strm_info.valid_len.set(strm_off)
+            self.on_disk_strm_info.committed_len.set(strm_off)
+            self.lock_free_journal.durability.note_commit(self, num_bytes)
+            if self.strm_metrics is not None:
+                self.strm_metrics.on_commit(num_bytes, len(positions))
+            self.lock_free_journal.ring_doorbell()
+            return positions
+
+        def append_batch(self, bufs, caller: str) -> array:
+            """
+            Copies a burst of messages straight into the mapped segments and publishes
+            them with a single committed_len update.
+            :param bufs: Iterable of bytes-like messages.
+            :return: array('Q') of packed Pos values, one per message.
+            """
+            bufs = bufs if isinstance(bufs, (list, tuple)) else list(bufs)
+            if not bufs:
+                return array('Q')
+
+            with self.strm_write_mutex:
+                if self.strm_metrics is not None:
+                    self.strm_metrics.on_alloc()
+                lengths = [len(buf) for buf in bufs]
+                total = sum(lengths)
+                committed_len = self.get_committed_len()
+                self.batch_strm_off = committed_len
+                self.batch_len = total
+                self.batch_heap_buf = None
+                self.on_disk_strm_info.alloc_len.set(committed_len + total)
+
+                strm_off = committed_len
+                seg_num = -1
+                seg_view = None
+                for buf in bufs:
+                    n = len(buf)
+                    seg_off = strm_off & SEG_SIZE_MASK
+                    if (strm_off >> SEG_SIZE_SHIFT) != seg_num or seg_off + n > len(seg_view):
+                        self.write_at(strm_off, buf, caller)
+                        seg_num = strm_off >> SEG_SIZE_SHIFT
+                        seg_view = self.segs[seg_num].seg_view
+                    else:
+                        seg_view[seg_off:seg_off + n] = buf
+                    strm_off += n
+
+                return self.commit_many(lengths, caller)
 
         def process_committed_data(self, buf_processor: BufProcessor):
             committed_len = self.get_committed_len()
@@ -452,7 +640,10 @@ class LockFreeJournal:
             finally:
                 committed_data.close()
 
-        def get_data_by_iovec(self, begin_off: int, end_off: int) -> List[mmap.mmap]:
+        def get_data_by_iovec(self, begin_off: int, end_off: int) -> List[memoryview]:
+            """
+            :return: Views of the mapped segments covering [begin_off, end_off), one per segment.
+            """
             if end_off < begin_off:
                 raise Exception(f"end_off should not be less than begin_off; begin_off={begin_off}, end_off={end_off}")
 
@@ -463,16 +654,12 @@ class LockFreeJournal:
                 seg_num = self.get_seg_num(cur_off)
                 seg_off = self.get_seg_off(cur_off)
 
-                seg_data = self.map_seg(seg_num, True, __PRETTY_FUNCTION__)
-                if seg_data is None:
+                if self.map_seg(seg_num, True, "Strm.get_data_by_iovec") is None:
                     raise Exception(f"seg_data should not be null; seg_num={seg_num}, seg_off={seg_off}")
 
-                if seg_num == self.get_seg_num(end_off):
-                    iov.append(seg_data[seg_off:end_off - cur_off])
-                    cur_off = end_off
-                else:
-                    iov.append(seg_data[seg_off:SEG_SIZE])
-                    cur_off += SEG_SIZE - seg_off
+                n = min(end_off - cur_off, SEG_SIZE - seg_off)
+                iov.append(self.segs[seg_num].seg_view[seg_off:seg_off + n])
+                cur_off += n
 
             return iov
 
@@ -491,33 +678,99 @@ class LockFreeJournal:
             self.last_known_file_size = 0
             self.strm_path = f"{lock_free_journal.lfj_name}/{strm_name}"
             self.strm_write_mutex = threading.RLock()
+            self.strm_metrics = lock_free_journal.metrics.get_strm_metrics(strm_num, strm_name) if lock_free_journal.metrics is not None else None
 
-            if is_recovery:
-                self.fd_plus_1 = lock_free_journal.recover_strm_from_file(strm_num, self.strm_path) + 1
-                self.map_seg_(0, True, __PRETTY_FUNCTION__, True)
-                if self.on_disk_strm_info.valid_len < self.on_disk_strm_info.committed_len:
-                    raise Exception(f"Strm valid len {self.on_disk_strm_info.valid_len} is less than committed len {self.on_disk_strm_info.committed_len}")
-
-                valid_seg_num = self.get_seg_num(self.on_disk_strm_info.valid_len)
-                for seg_num in range(1, valid_seg_num + 1):
-                    self.map_seg_(seg_num, True, __PRETTY_FUNCTION__, True)
+            archive_path = self.strm_path + ARCHIVE_SUFFIX
+            if is_recovery and not os.path.exists(self.strm_path) and os.path.exists(archive_path):
+                # compacted by archive.compact_journal; the data is read from the archive from now on,
+                # through locate_data() only: there is no fd and no segment to map
+                if lock_free_journal.is_writeable:
+                    raise Exception(f"an archived strm cannot be opened for writing; strm_path={self.strm_path}, caller={caller}")
+                self.archive = ArchiveReader(archive_path)
+                self.attach_on_disk_strm_info(strm_num, caller)
+            elif is_recovery:
+                self.fd_plus_1 = self.recover_strm_from_file(strm_num, self.strm_path) + 1
+                if self.map_seg_(0, True, "Strm.init", True) is None:
+                    raise Exception(f"strm file is shorter than one segment; strm_path={self.strm_path}, caller={caller}")
+                self.attach_on_disk_strm_info(strm_num, caller)
+                if strm_num == 0 and not lock_free_journal.on_disk_journal_hdr.is_formatted():
+                    raise Exception(f"journal header has no valid magic (not a journal, or its creation was cut); strm_path={self.strm_path}, caller={caller}")
+                on_disk_strm_info = self.on_disk_strm_info
+                if on_disk_strm_info.valid_len.get() < on_disk_strm_info.committed_len.get():
+                    raise Exception(f"Strm valid len {on_disk_strm_info.valid_len.get()} is less than committed len {on_disk_strm_info.committed_len.get()}")
+
+                # the other segments are mapped on first access (locate_data/map_seg) rather than all up front
 
                 if lock_free_journal.is_writeable:
                     if lock_free_journal.is_rollbackable:
-                        if self.on_disk_strm_info.strm_type == StrmType.DATA_STREAM:
-                            self.on_disk_strm_info.valid_len = self.on_disk_strm_info.committed_len
-                            self.on_disk_strm_info.alloc_len = self.on_disk_strm_info.committed_len
-                        elif self.on_disk_strm_info.strm_type == StrmType.TX_STREAM:
-                            if self.on_disk_strm_info.valid_len > self.on_disk_strm_info.committed_len:
-                                self.rollback_tx(self.on_disk_strm_info.committed_len, self.on_disk_strm_info.valid_len)
-                                self.on_disk_strm_info.committed_len = self.on_disk_strm_info.valid_len
-                                after_valid_data = self.locate_data_in_strm(self.on_disk_strm_info.valid_len, __PRETTY_FUNCTION__)
-                                seg_end = self.locate_data_in_strm(self.get_seg_num(self.on_disk_strm_info.valid_len), 0, __PRETTY_FUNCTION__) + SEG_SIZE
-                                after_valid_data[:seg_end - after_valid_data] = b'\x00' * (seg_end - after_valid_data)
+                        if on_disk_strm_info.strm_type == StrmType.DATA_STREAM:
+                            on_disk_strm_info.valid_len.set(on_disk_strm_info.committed_len.get())
+                            on_disk_strm_info.alloc_len.set(on_disk_strm_info.committed_len.get())
+                        elif on_disk_strm_info.strm_type == StrmType.TX_STREAM:
+                            if max(on_disk_strm_info.valid_len.get(), on_disk_strm_info.alloc_len.get()) > on_disk_strm_info.committed_len.get():
+                                # the cut tx is undone by update_cache() once the vecs it touched are recovered too
+                                lock_free_journal.tx_strms_to_roll_back.append(self)
                     else:
                         pass
             else:
-                self.map_seg_(0, True, __PRETTY_FUNCTION__, False)
+                if self.fd_plus_1 == 0:
+                    self.fd_plus_1 = self.create_strm_file(self.strm_path) + 1
+                self.map_seg_(0, True, "Strm.init", False)
+                self.attach_on_disk_strm_info(strm_num, caller)
+                with lock_free_journal.num_alloc_mutex:
+                    lock_free_journal.on_disk_journal_hdr.init_strm_info(strm_num, strm_name, strm_type)
+                if strm_num == 0:
+                    # strm0 data starts right after the journal header mapped at its front
+                    hdr_len = (OnDiskJournalHdr.SIZE + 7) & ~7
+                    self.on_disk_strm_info.alloc_len.set(hdr_len)
+                    self.on_disk_strm_info.valid_len.set(hdr_len)
+                    self.on_disk_strm_info.committed_len.set(hdr_len)
+                    lock_free_journal.on_disk_journal_hdr.format(time.time_ns())
+                if lock_free_journal.checksum_block_size is not None and strm_type != StrmType.TX_STREAM:
+                    self.checksum = StrmChecksum.create(self.strm_path + CHECKSUM_SUFFIX, lock_free_journal.checksum_block_size, self.get_committed_len())
+
+        def attach_on_disk_strm_info(self, strm_num, caller):
+            """
+            Points on_disk_strm_info at this stream's record in the mapped journal header.
+            The header lives at the front of segment 0 of strm0, so strm0 maps it first.
+            """
+            lfj = self.lock_free_journal
+            if strm_num == 0:
+                lfj.on_disk_journal_hdr = OnDiskJournalHdr(self.segs[0].seg_data)
+            if lfj.on_disk_journal_hdr is None:
+                raise Exception(f"journal header is not mapped; strm_name={self.strm_name}, caller={caller}")
+            self.on_disk_strm_info = lfj.on_disk_journal_hdr.strm_infos[strm_num]
+
+        def close(self):
+            """
+            Unmaps the stream's segments and closes its files; the journal header is left alone.
+            """
+            self.alloc_buf = None
+            self.alloc_heap_buf = None
+            if self.seg_mapper is not None:
+                self.seg_mapper.close()
+                self.seg_mapper = None
+            for seg in self.segs:
+                if seg is None:
+                    continue
+                if seg.seg_data is not None and not seg.unmap():
+                    # a view handed out by locate_data() is still alive; the mapping goes with the last one
+                    seg.seg_view = None
+                    seg.seg_data = None
+                seg.lock_free_journal = None
+                seg.seg_num_plus_1 = 0
+
+            if self.checksum is not None:
+                self.checksum.close()
+                self.checksum = None
+            if self.archive is not None:
+                self.archive.close()
+                self.archive = None
+            self.lock_free_journal = None
+            self.on_disk_strm_info = None
+            if self.fd_plus_1 != 0:
+                os.close(self.fd_plus_1 - 1)
+                self.fd_plus_1 = 0
 
         def refresh_from_file(self, is_committed_len):
             if self.on_disk_strm_info is None:
@@ -530,10 +783,41 @@ class LockFreeJournal:
             if seg_off == 0 and seg_num > 0:
                 seg_num -= 1
 
-            for i in range(seg_num + 1):
-                self.map_seg_(i, False, __PRETTY_FUNCTION__, False)
-
-    def open(self, lfj_name, is_writeable, is_rollbackable):
+            # mapping the last segment picks up the file size; the ones before it are mapped on first access
+            self.map_seg_(seg_num, False, "Strm.refresh_from_file", False)
+
+    def open(self, lfj_name, is_writeable, is_rollbackable, prefault_segs=True, keep_spare_seg=True, recovery_threads=None,
+             max_mapped_segs=None, max_mapped_bytes=None, durability_policy=None, strm_pool_size=0, enable_metrics=True,
+             seg_overlap=0, checksum_block_size=None, verify_checksums=None, order_index=False):
+        """
+        :param recovery_threads: Size of the pool recovering streams and vecs of an existing
+                                 journal; defaults to the number of CPUs (at most 32).
+        :param max_mapped_segs: Read-only opens only: most stream segments kept mapped at once,
+                                least recently used ones are unmapped beyond it.
+        :param max_mapped_bytes: Read-only opens only: the same bound in bytes.
+        :param durability_policy: Writeable opens only: when committed data is msync'ed
+                                  (durability.DurabilityPolicy); nothing is flushed in the
+                                  background when None.
+        :param strm_pool_size: Writeable opens only: streams kept pre-created by a background
+                               thread for create_strm()/create_vec_with_strm() (strm_pool.StrmPool).
+        :param enable_metrics: Keep the metrics registry (lfj_metrics.JournalMetrics) in metrics;
+                               None when False, which also skips timing the hot paths.
+        :param seg_overlap: Bytes of the next segment mapped past the end of every stream
+                            segment (rounded up to pages, at most a segment), so messages and
+                            reservations of up to that many bytes crossing a segment boundary
+                            are written and read in place rather than through a heap copy.
+        :param checksum_block_size: Writeable opens only: new data streams get a checksum file
+                                    (strm_checksum.StrmChecksum) with a CRC every commit when 0,
+                                    or every checksum_block_size bytes; none when None.
+        :param verify_checksums: Verify the streams having a checksum file on recovery, in
+                                 parallel (strm_checksum.verify_strms); defaults to writeable
+                                 and rollbackable opens, which truncate every stream to its
+                                 last verified block. Results are in checksum_verified_lens.
+        :param order_index: Writeable opens only: keep the order index (order_index.OrderIndex)
+                            up to date on every TxBuilder commit, catching it up first.
+                            Read-only opens use the index when the journal has one.
+        """
+        open_begin = time.perf_counter()
         if lfj_name is None or len(lfj_name) == 0:
             raise Exception("lfj_name should not be null or of 0-length")
 
@@ -543,18 +827,29 @@ class LockFreeJournal:
         self.lfj_name = lfj_name
         self.is_writeable = is_writeable
         self.is_rollbackable = is_rollbackable
+        self.prefault_segs = prefault_segs
+        self.keep_spare_seg = keep_spare_seg
+        self.seg_overlap = min(SEG_SIZE, (seg_overlap + mmap.PAGESIZE - 1) & ~(mmap.PAGESIZE - 1))
+        self.checksum_block_size = checksum_block_size if is_writeable else None
+        self.verify_checksums = verify_checksums if verify_checksums is not None else is_writeable and is_rollbackable
+        if recovery_threads is not None:
+            self.recovery_threads = max(1, recovery_threads)
+        if not is_writeable and (max_mapped_segs is not None or max_mapped_bytes is not None):
+            self.seg_lru = SegLru(max_mapped_segs, max_mapped_bytes)
+        if is_writeable and durability_policy is not None:
+            self.durability = Durability(self, durability_policy)
+        if not enable_metrics:
+            self.metrics = None
 
         dir_exists = os.path.exists(lfj_name)
         did_exist_before_open = False
 
         if dir_exists:
             strm_path0 = os.path.join(lfj_name, self.LFJ_STRM_0_NAME)
-            fd0 = os.open(strm_path0, os.O_RDONLY) if os.path.exists(strm_path0) else -1
-            if fd0 > 0:
+            if os.path.exists(strm_path0):
                 did_exist_before_open = True
             elif not is_writeable:
                 return None
-            os.close(fd0)
         elif is_writeable:
             os.makedirs(lfj_name)
             dir_exists = True
@@ -566,57 +861,196 @@ class LockFreeJournal:
         self.did_exist_before_open = did_exist_before_open
 
         try:
+            if is_writeable:
+                self.doorbell = FutexDoorbell(os.path.join(lfj_name, self.LFJ_DOORBELL_NAME))
+
             if is_writeable and not did_exist_before_open:
-                strm0 = self.Strm()
-                strm0.init(self, 0, self.LFJ_STRM_0_NAME, StrmType.TX_STREAM, __PRETTY_FUNCTION__, False)
+                strm0 = self.add_strm(0)
+                strm0.init(self, 0, self.LFJ_STRM_0_NAME, StrmType.TX_STREAM, "LockFreeJournal.open", False)
 
             self.update_cache(did_exist_before_open)
             self.is_initialized = True
+
+            if is_writeable and order_index:
+                self.order_index = OrderIndex(lfj_name, True)
+                self.order_index.catch_up(self)
+            elif not is_writeable and os.path.exists(os.path.join(lfj_name, ORDER_INDEX_NODES_NAME)):
+                self.order_index = OrderIndex(lfj_name, False)
+
+            if is_writeable:
+                StrmPool.remove_leftovers(lfj_name)
+                if strm_pool_size > 0:
+                    self.strm_pool = StrmPool(self, strm_pool_size)
+                    self.strm_pool.start()
         except Exception as ex:
             self.close()
             raise ex
 
+        self.open_secs = time.perf_counter() - open_begin
+        self.durability.start()
+        self.open_complete.set()
         return self
 
+    def ring_doorbell(self):
+        """
+        Wakes followers (see tail_follower.TailFollower) after a commit is published.
+        """
+        if self.doorbell is not None:
+            self.doorbell.ring()
+
+    def wait_durable(self, timeout=None) -> bool:
+        """
+        Blocks until everything committed so far, on every stream, has been msync'ed.
+        Only the calling thread waits; writers keep committing meanwhile.
+        :return: False if timeout expired first.
+        """
+        return self.durability.wait_durable(timeout)
+
+    def wait_open_complete(self, timeout=None) -> bool:
+        """
+        Blocks until open() has recovered every stream and vec (e.g. for an observer
+        thread started alongside open).
+        :return: False if timeout expired first.
+        """
+        return self.open_complete.wait(timeout)
+
     def update_cache(self, did_exist_before_open):
+        """
+        Recovers the streams and vecs of an existing journal. strm0 goes first since it
+        maps the journal header; every other stream and every vec is then recovered on a
+        pool of recovery_threads. Once the streams are, the txs cut at the tail of TX
+        streams are rolled back on the same pool (rollback_txs()), each group as soon as
+        the vecs it touches are recovered. Failures are re-raised in strm/vec number
+        order, so the outcome does not depend on scheduling.
+        """
         if did_exist_before_open:
-            strm0 = self.strms[0]
-            strm0.init(self, 0, self.LFJ_STRM_0_NAME, StrmType.TX_STREAM, __PRETTY_FUNCTION__, True)
+            self.strm_recovery_secs.clear()
+            self.vec_recovery_secs.clear()
+            strm0 = self.add_strm(0)
+            self.recover_strm(strm0, 0, self.LFJ_STRM_0_NAME, StrmType.TX_STREAM)
 
+            strm_jobs = []
             for strm_num in range(1, self.on_disk_journal_hdr.get_highest_committed_strm_num() + 1):
                 strm_info = self.on_disk_journal_hdr.strm_infos[strm_num]
                 if strm_info.strm_num_plus_1 != 0:
-                    strm = self.Strm()
-                    strm.init(self, strm_num, strm_info.name, strm_info.strm_type, __PRETTY_FUNCTION__, True)
+                    strm_jobs.append((self.add_strm(strm_num), strm_num, strm_info.name, strm_info.strm_type))
 
+            vec_jobs = []
             for vec_num in range(self.on_disk_journal_hdr.get_highest_committed_vec_num() + 1):
                 vec_info = self.on_disk_journal_hdr.vec_infos[vec_num]
                 if vec_info.vec_num_plus_1 != 0:
-                    vec = self.Vec()
-                    vec.init(self, vec_num, vec_info.vec_type, vec_info.name, __PRETTY_FUNCTION__, True)
+                    vec_jobs.append((self.add_vec(vec_num), vec_num, vec_info.vec_type, vec_info.name))
+
+            with ThreadPoolExecutor(max_workers=self.recovery_threads, thread_name_prefix="lfj_recovery") as pool:
+                strm_futures = [pool.submit(self.recover_strm, *job) for job in strm_jobs]
+                vec_futures = {job[1]: pool.submit(self.recover_vec, *job) for job in vec_jobs}
+                for future in strm_futures:
+                    future.result()
+
+                # the vec recoveries were queued first, so a rollback waiting on them never
+                # holds up a worker they still need
+                tx_strms = sorted(self.tx_strms_to_roll_back, key=lambda strm: strm.get_strm_num())
+                self.tx_strms_to_roll_back = []
+                rollback_futures = [pool.submit(self.rollback_txs, group, [vec_futures[vec_num] for vec_num in sorted(vec_nums) if vec_num in vec_futures])
+                                    for group, vec_nums in self.group_cut_txs([(tx_strm, self.read_cut_tx(tx_strm)) for tx_strm in tx_strms])]
+                for future in list(vec_futures.values()) + rollback_futures:
+                    future.result()
+
+            self.recover_checksums([strm for strm, strm_num, strm_name, strm_type in strm_jobs])
+
+            # TX streams of earlier sessions are handed out again before new ones are created
+            if self.is_writeable:
+                self.free_tx_strms = [strm for strm, strm_num, strm_name, strm_type in strm_jobs if strm_type == StrmType.TX_STREAM]
+
+    def recover_checksums(self, strms):
+        """
+        Verifies the streams that have a checksum file when verify_checksums is set; a
+        writeable rollbackable open then truncates a stream with a block failing its CRC
+        back to the end of the last good block, which catches a corrupt or torn block left
+        by a power loss that committed_len alone does not, and drops the vec items and txs
+        referring to the data cut (roll_back_cut_data()). A writeable open then reopens the
+        checksum files so the writers keep extending them.
+        """
+        strms = [strm for strm in strms if strm.archive is None and os.path.exists(strm.strm_path + CHECKSUM_SUFFIX)]
+        if not strms:
+            return
+
+        if self.verify_checksums:
+            self.checksum_verified_lens = verify_strms([(strm.get_strm_num(), strm.strm_path, strm.get_committed_len()) for strm in strms],
+                                                       self.recovery_threads)
+            if self.is_writeable and self.is_rollbackable:
+                cut_lens = {strm.get_strm_num(): self.checksum_verified_lens[strm.get_strm_num()] for strm in strms
+                            if self.checksum_verified_lens[strm.get_strm_num()] < strm.get_committed_len()}
+                if cut_lens:
+                    self.roll_back_cut_data(cut_lens)
+                    for strm_num, verified_len in cut_lens.items():
+                        self.truncate_strm(self.strms[strm_num], verified_len, "LockFreeJournal.recover_checksums")
+
+        if self.is_writeable:
+            for strm in strms:
+                committed_len = strm.get_committed_len()
+                strm.checksum = StrmChecksum.open_for_append(strm.strm_path + CHECKSUM_SUFFIX, committed_len)
+                if strm.checksum.block_end_off < committed_len:
+                    strm.checksum.on_commit(strm, strm.checksum.block_end_off, committed_len, "LockFreeJournal.recover_checksums")
+
+    def add_strm(self, strm_num):
+        while len(self.strms) <= strm_num:
+            self.strms.append(None)
+        if self.strms[strm_num] is None:
+            self.strms[strm_num] = self.Strm()
+        return self.strms[strm_num]
+
+    def add_vec(self, vec_num):
+        while len(self.vecs) <= vec_num:
+            self.vecs.append(None)
+        if self.vecs[vec_num] is None:
+            self.vecs[vec_num] = self.Vec()
+        return self.vecs[vec_num]
+
+    def recover_strm(self, strm, strm_num, strm_name, strm_type):
+        begin = time.perf_counter()
+        strm.init(self, strm_num, strm_name, strm_type, "LockFreeJournal.recover_strm", True)
+        self.strm_recovery_secs[strm_num] = time.perf_counter() - begin
+
+    def recover_vec(self, vec, vec_num, vec_type, vec_name):
+        begin = time.perf_counter()
+        vec.init(self, vec_num, vec_type, vec_name, "LockFreeJournal.recover_vec", True)
+        self.vec_recovery_secs[vec_num] = time.perf_counter() - begin
+
+    def get_recovery_report(self):
+        """
+        :return: (open seconds, {strm_num: recovery seconds}, {vec_num: recovery seconds})
+                 for the last open of an existing journal.
+        """
+        return self.open_secs, dict(self.strm_recovery_secs), dict(self.vec_recovery_secs)
 
     def close(self):
         if not self.is_initialized:
             return
         self.is_initialized = False
+        self.open_complete.clear()
+        if self.strm_pool is not None:
+            self.strm_pool.close()
+            self.strm_pool = None
+        if self.metrics is not None:
+            self.metrics.stop_export()
+        if self.order_index is not None:
+            self.order_index.close()
+            self.order_index = None
+        # the last flush round runs before any segment is unmapped
+        self.durability.close()
+
+        # the header holds views into strm0's first segment, which is unmapped below
+        if self.on_disk_journal_hdr is not None:
+            self.on_disk_journal_hdr.release()
 
         for strm in self.strms:
-            if strm is None:
-                continue
-            for seg in strm.segs:
-                if seg is None:
-                    continue
-                if seg.seg_data is not None:
-                    seg.seg_data.close()
-                    seg.seg_data = None
-                seg.lock_free_journal = None
-                seg.seg_num_plus_1 = 0
+            if strm is not None:
+                strm.close()
 
-            strm.lock_free_journal = None
-            strm.on_disk_strm_info = None
-            if strm.fd_plus_1 != 0:
-                os.close(strm.fd_plus_1 - 1)
-                strm.fd_plus_1 = 0
+        for vec in self.vecs:
+            if vec is not None:
+                vec.close()
 
         self.is_writeable = False
         self.is_rollbackable = False
@@ -629,6 +1063,21 @@ class LockFreeJournal:
             self.lfj_name = None
 
         self.on_disk_journal_hdr = None
+        self.seg_lru = None
+
+        if self.doorbell is not None:
+            self.doorbell.close()
+            self.doorbell = None
+
+        self.own_tx_strm = threading.local()
+        self.free_tx_strms = []
+
+    def get_seg_lru_stats(self):
+        """
+        :return: SegLruStats (hits, misses, evictions, mapped segs/bytes) of a read-only
+                 journal opened with a mapping budget, None otherwise.
+        """
+        return self.seg_lru.get_stats() if self.seg_lru is not None else None
 
     def get_strm(self, strm_num):
         if strm_num >= len(self.strms):
@@ -640,9 +1089,29 @@ class LockFreeJournal:
             return None
         return self.vecs[vec_num]
 
-    def locate_data_by_pos(self, pos, data_1, msg_len_1, data_2, msg_len_2):
-        # Implementation of locate_data_by_pos function
-        pass
+    def locate_data_by_pos(self, pos) -> Tuple[memoryview, Optional[memoryview]]:
+        """
+        Returns zero-copy views of the data at pos. The second view is None
+        unless the data is split across two segments.
+        """
+        strm = self.get_strm(pos.get_strm_num())
+        if strm is None:
+            raise Exception(f"strm does not exist; pos={pos}")
+        return strm.locate_data(pos.get_strm_off(), pos.get_len(), "LockFreeJournal.locate_data_by_pos")
+
+    def read_into(self, pos, buf) -> int:
+        """
+        Copies the data at pos into buf (any writable buffer of at least pos.get_len() bytes).
+        Meant for the split case where one contiguous buffer is needed.
+        :return: The number of bytes copied.
+        """
+        data_1, data_2 = self.locate_data_by_pos(pos)
+        len_1 = len(data_1)
+        buf[:len_1] = data_1
+        if data_2 is None:
+            return len_1
+        buf[len_1:len_1 + len(data_2)] = data_2
+        return len_1 + len(data_2)
 
     def locate_order_data_from_tx_hdr(self, cur_pos, next_pos):
         # Implementation of locate_order_data_from_tx_hdr function
@@ -652,17 +1121,326 @@ class LockFreeJournal:
         # Implementation of locate_order_data_by_pos function
         pass
 
-    def rollback_tx(self, committed_len, valid_len):
-        # Implementation of rollback_tx function
-        pass
+    def get_order_positions(self, vec_num: int, seq_num: int) -> array:
+        """
+        :return: array('Q') of the packed Pos of every item set for the order (vec_num, seq_num),
+                 oldest first, from the order index.
+        """
+        if self.order_index is None:
+            raise Exception(f"journal has no order index; lfj_name={self.lfj_name}")
+        if not self.is_writeable:
+            self.order_index.refresh()
+        return self.order_index.get_positions(vec_num, seq_num)
+
+    def locate_order_history(self, vec_num: int, seq_num: int) -> List[Tuple[memoryview, Optional[memoryview]]]:
+        """
+        Every state of the order (vec_num, seq_num), oldest first, as zero-copy views (see
+        locate_data_by_pos()). The positions come from one order index lookup and are
+        located in stream and offset order, so the segments are touched sequentially.
+        """
+        positions = self.get_order_positions(vec_num, seq_num)
+        STRM_NUM_OFF_MASK = (Pos.STRM_NUM_MASK << Pos.STRM_NUM_SHIFT) | Pos.STRM_OFF_MASK
+        history = [None] * len(positions)
+        for idx in sorted(range(len(positions)), key=lambda idx: positions[idx] & STRM_NUM_OFF_MASK):
+            pos = positions[idx]
+            strm = self.get_strm((pos >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK)
+            if strm is None:
+                raise Exception(f"strm does not exist; pos={pos}")
+            history[idx] = strm.locate_data(pos & Pos.STRM_OFF_MASK, (pos >> Pos.LEN_SHIFT) & Pos.LEN_MASK, "LockFreeJournal.locate_order_history")
+        return history
+
+    def read_cut_tx(self, tx_strm):
+        """
+        :return: The tx a crash cut at the end of a TX stream, between committed_len and
+                 valid_len, or None. TxBuilder.commit() writes a whole tx before raising
+                 valid_len and applies it to its vecs before raising committed_len, so such
+                 a tx was applied in part.
+        """
+        on_disk_strm_info = tx_strm.on_disk_strm_info
+        committed_len = on_disk_strm_info.committed_len.get()
+        valid_len = on_disk_strm_info.valid_len.get()
+        if valid_len <= committed_len:
+            return None
+
+        data_1, data_2 = tx_strm.locate_data(committed_len, valid_len - committed_len, "LockFreeJournal.read_cut_tx")
+        tx = bytes(data_1) if data_2 is None else bytes(data_1) + bytes(data_2)
+        del data_1, data_2
+        if read_tx_hdr(tx)[1] != len(tx):
+            raise Exception(f"cut tx is not whole; strm_name={tx_strm.strm_name}, committed_len={committed_len}, valid_len={valid_len}")
+        return tx
+
+    @staticmethod
+    def group_cut_txs(tx_strms_and_txs):
+        """
+        Splits the cut txs [(tx_strm, tx or None)] into groups sharing no vec, so the
+        groups can be rolled back concurrently.
+        :return: [([(tx_strm, tx or None)], vec_nums)]
+        """
+        groups = []
+        for tx_strm, tx in tx_strms_and_txs:
+            vec_nums = set()
+            if tx is not None:
+                for op_code, fields in iter_tx_ops(tx):
+                    if op_code in (Tx.OP_SET_VEC_ITEM, Tx.OP_PATCH_MSG):
+                        vec_nums.add(fields[0])
+                    elif op_code == Tx.OP_SET_ITEM_POS_FLAG:
+                        vec_nums.add(fields[1])
+            group = [(tx_strm, tx)]
+            for other_group, other_vec_nums in [(g, v) for g, v in groups if v & vec_nums]:
+                groups.remove((other_group, other_vec_nums))
+                group += other_group
+                vec_nums |= other_vec_nums
+            groups.append((group, vec_nums))
+        return groups
+
+    def rollback_txs(self, tx_strms_and_txs, vec_futures):
+        """
+        Undoes the cut txs of a group from group_cut_txs() once the vecs they touch are
+        recovered (vec_futures), newest first by global_tx_seq, since txs of several
+        TX streams may have appended to one vec (undo_tx()). Each TX stream is then
+        truncated to committed_len, dropping any partly written tx past it too.
+        """
+        for future in vec_futures:
+            future.result()
+        cut_txs = sorted(((read_tx_hdr(tx)[2], tx_strm, tx) for tx_strm, tx in tx_strms_and_txs if tx is not None),
+                         key=itemgetter(0), reverse=True)
+        for _, tx_strm, tx in cut_txs:
+            self.undo_tx(tx_strm.get_strm_num(), tx_strm.get_committed_len(), tx)
+        for tx_strm, _ in tx_strms_and_txs:
+            self.truncate_strm(tx_strm, tx_strm.get_committed_len(), "LockFreeJournal.rollback_txs")
+
+    def undo_tx(self, tx_strm_num: int, tx_off: int, tx):
+        """
+        Undoes the ops of the tx at tx_off of a TX stream, in reverse order. An item
+        appended by an OP_SET_VEC_ITEM or OP_PATCH_MSG is removed while it is still its
+        vec's last item, and an item carrying the flag of an OP_SET_ITEM_POS_FLAG gets
+        the other one back (a flag op always changes the flag).
+        """
+        tx_end = tx_off + len(tx)
+        for op_code, fields in reversed(list(iter_tx_ops(tx))):
+            if op_code == Tx.OP_SET_ITEM_POS_FLAG:
+                flag, vec_num, seq_num, idx = fields
+                columns = self.vecs[vec_num].columns
+                if idx < columns.get_num_items() and (columns.pos.get(idx) >> Pos.FLAG_SHIFT) == flag:
+                    columns.set_pos_flag(idx, flag ^ 1)
+            elif op_code in (Tx.OP_SET_VEC_ITEM, Tx.OP_PATCH_MSG):
+                vec_num, seq_num = fields[0], fields[1]
+                columns = self.vecs[vec_num].columns
+                num_items = columns.get_num_items()
+                if num_items == 0:
+                    continue
+                pos, timestamp_ns, item_seq_num = columns.get_item(num_items - 1)
+                if columns.seq is not None and item_seq_num != seq_num:
+                    continue
+                if op_code == Tx.OP_SET_VEC_ITEM:
+                    is_applied = pos == fields[2] and timestamp_ns == fields[3]
+                else:
+                    # a patch item points into this tx
+                    is_applied = (pos >> Pos.FLAG_SHIFT) == 1 and timestamp_ns == fields[3] and \
+                        ((pos >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK) == tx_strm_num and \
+                        tx_off <= (pos & Pos.STRM_OFF_MASK) < tx_end
+                if is_applied:
+                    columns.truncate(num_items - 1)
+
+    @staticmethod
+    def truncate_strm(strm, strm_len: int, caller: str):
+        """
+        Cuts a stream back to strm_len: the bytes past it (up to valid_len or alloc_len)
+        are zeroed and every length is lowered to it.
+        """
+        on_disk_strm_info = strm.on_disk_strm_info
+        end_len = max(on_disk_strm_info.valid_len.get(), on_disk_strm_info.alloc_len.get(), on_disk_strm_info.committed_len.get())
+        if end_len > strm_len:
+            strm.write_at(strm_len, bytes(end_len - strm_len), caller)
+        on_disk_strm_info.committed_len.set(strm_len)
+        on_disk_strm_info.valid_len.set(strm_len)
+        on_disk_strm_info.alloc_len.set(strm_len)
+        on_disk_strm_info.durable_len.set(min(on_disk_strm_info.durable_len.get(), strm_len))
+
+    def roll_back_cut_data(self, cut_lens):
+        """
+        Drops everything referring to data streams cut back by recover_checksums(), whose
+        {strm_num: new length} is cut_lens. Every tx from the first one (in global_tx_seq
+        order) setting an item whose data lies past a cut is undone, newest first, and its
+        TX stream truncated there; later txs may build on it. Each vec is then truncated
+        to its first item still pointing past a cut (e.g. one appended outside a tx). The
+        order index finds its streams behind it and is rebuilt by catch_up().
+        """
+        # tx_merge imports this module
+        from persistance.tx_merge import get_tx_strms, iter_strm_txs
+
+        def is_cut(pos):
+            cut_len = cut_lens.get((pos >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK)
+            return cut_len is not None and pos != 0 and (pos & Pos.STRM_OFF_MASK) + ((pos >> Pos.LEN_SHIFT) & Pos.LEN_MASK) > cut_len
+
+        tx_strms = get_tx_strms(self)
+        first_cut_seq = None
+        for tx_strm in tx_strms:
+            for global_tx_seq, _, _, tx in iter_strm_txs(tx_strm):
+                if any(op_code == Tx.OP_SET_VEC_ITEM and is_cut(fields[2]) for op_code, fields in iter_tx_ops(tx)):
+                    if first_cut_seq is None or global_tx_seq < first_cut_seq:
+                        first_cut_seq = global_tx_seq
+                    break
+
+        if first_cut_seq is not None:
+            txs = []
+            for tx_strm in tx_strms:
+                txs += [tx for tx in iter_strm_txs(tx_strm) if tx[0] >= first_cut_seq]
+            for _, tx_strm_num, tx_off, tx in sorted(txs, key=itemgetter(0), reverse=True):
+                self.undo_tx(tx_strm_num, tx_off, tx)
+            tx_lens = {}
+            for _, tx_strm_num, tx_off, _ in txs:
+                tx_lens[tx_strm_num] = min(tx_lens.get(tx_strm_num, tx_off), tx_off)
+            for tx_strm_num, tx_len in tx_lens.items():
+                self.truncate_strm(self.strms[tx_strm_num], tx_len, "LockFreeJournal.roll_back_cut_data")
+
+        for vec in self.vecs:
+            columns = vec.columns if vec is not None else None
+            if columns is None:
+                continue
+            idx = 0
+            for chunk in columns.pos.chunks(0, columns.get_num_items()):
+                cut_idxs = [i for i, pos in enumerate(chunk) if is_cut(pos)]
+                if cut_idxs:
+                    columns.truncate(idx + cut_idxs[0])
+                    break
+                idx += len(chunk)
 
     def alloc_next_strm_num(self, caller):
-        # Implementation of alloc_next_strm_num function
-        pass
+        """
+        Reserves the next free strm number; the caller inits the stream in strms[strm_num].
+        """
+        with self.num_alloc_mutex:
+            strm_num = max(len(self.strms), self.on_disk_journal_hdr.get_highest_strm_num() + 1)
+            if strm_num > self.MAX_STRM_NUM:
+                raise Exception(f"no strm number is left; strm_num={strm_num}, caller={caller}")
+            self.add_strm(strm_num)
+            return strm_num
+
+    def get_or_create_own_tx_strm(self):
+        """
+        The calling thread's own TX stream, so writer threads never contend on one
+        stream's mutex. It is a stream freed by an earlier session if any is left, or
+        a new TX_STREAM named TX_STRM_NAME_PREFIX + strm_num.
+        """
+        tx_strm = getattr(self.own_tx_strm, "tx_strm", None)
+        if tx_strm is None:
+            with self.num_alloc_mutex:
+                tx_strm = self.free_tx_strms.pop() if self.free_tx_strms else None
+            if tx_strm is None:
+                caller = "LockFreeJournal.get_or_create_own_tx_strm"
+                strm_num, entry = self.reserve_strm_num(caller)
+                tx_strm = self.init_reserved_strm(strm_num, entry, f"{self.TX_STRM_NAME_PREFIX}_{strm_num}", StrmType.TX_STREAM, caller)
+            tx_strm.owner_thread_id = threading.get_ident()
+            self.own_tx_strm.tx_strm = tx_strm
+        return tx_strm
+
+    def next_global_tx_seq(self) -> int:
+        """
+        Takes the next number of the journal-wide tx sequence kept in the mapped header,
+        stamped into every tx header so readers can merge TX streams in commit order.
+        """
+        with self.global_tx_seq_mutex:
+            global_tx_seq = self.on_disk_journal_hdr.global_tx_seq.get() + 1
+            self.on_disk_journal_hdr.global_tx_seq.set(global_tx_seq)
+            return global_tx_seq
 
     def alloc_next_vec_num(self, caller):
-        # Implementation of alloc_next_vec_num function
-        pass
+        """
+        Reserves the next free vec number; the caller inits the vec in vecs[vec_num].
+        """
+        with self.num_alloc_mutex:
+            vec_num = max(len(self.vecs), self.on_disk_journal_hdr.highest_vec_num_plus_1)
+            if vec_num > self.MAX_VEC_NUM:
+                raise Exception(f"no vec number is left; vec_num={vec_num}, caller={caller}")
+            self.add_vec(vec_num)
+            return vec_num
+
+    def reserve_strm_num(self, caller):
+        """
+        :return: (strm_num, pool entry) of a stream taken from strm_pool, or (a newly
+                 allocated strm_num, None) when the pool is empty.
+        """
+        entry = self.strm_pool.take() if self.strm_pool is not None else None
+        return (entry[0], entry) if entry is not None else (self.alloc_next_strm_num(caller), None)
+
+    def init_reserved_strm(self, strm_num, entry, strm_name, strm_type, caller):
+        strm = self.strms[strm_num]
+        try:
+            if entry is not None:
+                self.strm_pool.assign(entry, strm, f"{self.lfj_name}/{strm_name}")
+            strm.init(self, strm_num, strm_name, strm_type, caller, False)
+        except Exception:
+            self.release_reserved_strm(strm_num, strm_name)
+            raise
+        return strm
+
+    def release_reserved_strm(self, strm_num, strm_name):
+        """
+        Undoes init_reserved_strm() for a stream whose creation failed: its header record
+        is cleared so no open recovers it, and the files it created are closed and removed.
+        The number itself is not handed out again.
+        """
+        strm = self.strms[strm_num]
+        if strm is None:
+            return
+        self.on_disk_journal_hdr.strm_infos[strm_num].strm_num_plus_1 = 0
+        strm_path = f"{self.lfj_name}/{strm_name}"
+        # a stream holding an fd created the file (or adopted a pool one) under its write lock
+        remove_paths = [strm_path] if strm.fd_plus_1 != 0 else []
+        if strm.checksum is not None:
+            remove_paths.append(strm_path + CHECKSUM_SUFFIX)
+        strm.close()
+        for path in remove_paths:
+            os.remove(path)
+        self.strms[strm_num] = None
+
+    def create_strm(self, strm_name, strm_type, caller):
+        """
+        Creates a stream, taking a pre-created one from strm_pool when one is ready.
+        """
+        strm_num, entry = self.reserve_strm_num(caller)
+        return self.init_reserved_strm(strm_num, entry, strm_name, strm_type, caller)
+
+    def create_vec_with_strm(self, vec_name, vec_type, caller, strm_name=None, strm_type=StrmType.TX_DATA_STREAM, **vec_attrs):
+        """
+        Creates a vec together with its backing stream (named vec_name unless strm_name is
+        given). Both numbers are reserved under one short hold of num_alloc_mutex, the
+        stream comes from strm_pool when one is ready, and the vec's header record is
+        published with its strm_num already set, so no tx on strm0 is involved.
+        :param vec_attrs: Extra fields of the vec's header record (see OnDiskVecInfo.init).
+        :return: (vec, strm)
+        """
+        with self.num_alloc_mutex:
+            vec_num = self.alloc_next_vec_num(caller)
+            strm_num, entry = self.reserve_strm_num(caller)
+        strm_name = vec_name if strm_name is None else strm_name
+        vec_path = f"{self.lfj_name}/{vec_name}"
+        # columns of a same-named vec are never removed by a failed create
+        is_new_vec_path = not os.path.exists(vec_path + VecColumns.POS_SUFFIX)
+        try:
+            strm = self.init_reserved_strm(strm_num, entry, strm_name, strm_type, caller)
+            self.on_disk_journal_hdr.vec_infos[vec_num].strm_num_plus_1 = strm_num + 1
+            vec = self.vecs[vec_num]
+            vec.init(self, vec_num, vec_type, vec_name, caller, False, **vec_attrs)
+        except Exception:
+            self.release_reserved_vec(vec_num, vec_path if is_new_vec_path else None)
+            self.release_reserved_strm(strm_num, strm_name)
+            raise
+        return vec, strm
+
+    def release_reserved_vec(self, vec_num, vec_path):
+        """
+        Undoes a failed create of vec vec_num: its header record is cleared and its
+        columns closed, and removed when vec_path is given.
+        """
+        vec_info = self.on_disk_journal_hdr.vec_infos[vec_num]
+        vec_info.vec_num_plus_1 = 0
+        vec_info.strm_num_plus_1 = 0
+        self.vecs[vec_num].close()
+        if vec_path is not None:
+            VecColumns.remove_files(vec_path)
+        self.vecs[vec_num] = None
 
     def get_transaction_latency(self, item, vec_direction):
         # Implementation of get_transaction_latency function
@@ -674,4 +1452,168 @@ class LockFreeJournal:
     def notify_listeners(self, event_type, *args):
         for listener in self.listeners:
             listener(event_type, *args)
-          
+
+
+def bench_locate_data(num_reads: int = 200000, msg_len: int = 256):
+    """
+    Compares reading msg_len-byte messages through Strm.locate_data against
+    slicing seg_data[seg_off:] as locate_data_in_strm used to do.
+    :return: (ns per read with locate_data, ns per read with slicing)
+    """
+    import tempfile
+    import time
+
+    bench_dir = tempfile.mkdtemp()
+    lfj = LockFreeJournal()
+    lfj.is_writeable = True
+    strm = LockFreeJournal.Strm()
+    strm.lock_free_journal = lfj
+    strm.strm_name = "bench_strm"
+    strm.fd_plus_1 = os.open(os.path.join(bench_dir, strm.strm_name), os.O_RDWR | os.O_CREAT, 0o644) + 1
+    strm.map_seg(0, True, "bench_locate_data")
+    strm.map_seg(1, True, "bench_locate_data")
+
+    offs = [(i * 7919 * msg_len) % (2 * SEG_SIZE - msg_len) for i in range(1024)]
+    total = 0
+    begin = time.perf_counter_ns()
+    for i in range(num_reads):
+        data_1, data_2 = strm.locate_data(offs[i & 1023], msg_len, "bench_locate_data")
+        total += len(data_1)
+    view_ns = (time.perf_counter_ns() - begin) / num_reads
+
+    begin = time.perf_counter_ns()
+    for i in range(num_reads):
+        strm_off = offs[i & 1023]
+        seg_data = strm.map_seg(strm_off >> SEG_SIZE_SHIFT, True, "bench_locate_data")
+        data = seg_data[strm_off & SEG_SIZE_MASK:]
+        total += len(data)
+    slice_ns = (time.perf_counter_ns() - begin) / num_reads
+
+    del data_1, data_2
+    for seg in strm.segs:
+        seg.seg_view.release()
+        seg.seg_data.close()
+    strm.seg_mapper.close()
+    os.close(strm.get_strm_fd())
+    os.unlink(os.path.join(bench_dir, strm.strm_name))
+    os.rmdir(bench_dir)
+    return view_ns, slice_ns
+
+
+def bench_append_batch(num_msgs: int = 200000, batch_size: int = 1000, msg_len: int = 200):
+    """
+    Compares appending msg_len-byte messages one reserve()/commit_many() cycle per
+    message against append_batch() bursts of batch_size messages.
+    :return: (ns per message one at a time, ns per message batched)
+    """
+    import tempfile
+    import time
+    from types import SimpleNamespace
+
+    bench_dir = tempfile.mkdtemp()
+    lfj = LockFreeJournal()
+    lfj.is_writeable = True
+    results = []
+    msgs = [bytes([i & 0xff]) * msg_len for i in range(batch_size)]
+
+    for is_batched in (False, True):
+        strm = LockFreeJournal.Strm()
+        strm.lock_free_journal = lfj
+        strm.strm_name = "bench_strm"
+        strm.strm_num_plus_1 = 1
+        strm.on_disk_strm_info = SimpleNamespace(committed_len=AtomicUint64(), valid_len=AtomicUint64(), alloc_len=AtomicUint64())
+        strm.fd_plus_1 = os.open(os.path.join(bench_dir, strm.strm_name), os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644) + 1
+
+        begin = time.perf_counter_ns()
+        for _ in range(num_msgs // batch_size):
+            if is_batched:
+                strm.append_batch(msgs, "bench_append_batch")
+            else:
+                for msg in msgs:
+                    with strm.strm_write_mutex:
+                        strm.reserve(msg_len, "bench_append_batch")[:] = msg
+                        strm.commit_many((msg_len,), "bench_append_batch")
+        results.append((time.perf_counter_ns() - begin) / num_msgs)
+
+        strm.seg_mapper.close()
+        for seg in strm.segs:
+            seg.seg_view.release()
+            seg.seg_data.close()
+        os.close(strm.get_strm_fd())
+
+    os.unlink(os.path.join(bench_dir, "bench_strm"))
+    os.rmdir(bench_dir)
+    return results[0], results[1]
+
+
+def bench_seg_overlap(num_msgs: int = 50000, max_msg_len: int = 64 << 10, seg_overlap: int = 64 << 10, seed: int = 1,
+                      use_buf_malloc: bool = False):
+    """
+    Appends num_msgs messages of random lengths up to max_msg_len, one reserve()/
+    commit_many() cycle each (buf_malloc()/buf_commit() with use_buf_malloc), without and
+    with a seg_overlap-byte overlap window. Long messages cross a segment boundary every
+    few dozen appends, which without the window goes through a heap buffer and a second copy.
+    :return: ((ns per msg, heap spills) without the window, (ns per msg, heap spills) with it)
+    """
+    import random
+    import tempfile
+    import time
+    from types import SimpleNamespace
+
+    bench_dir = tempfile.mkdtemp()
+    rnd = random.Random(seed)
+    lengths = [rnd.randint(1, max_msg_len) for _ in range(num_msgs)]
+    payload = bytes(max_msg_len)
+    results = []
+
+    for overlap in (0, seg_overlap):
+        lfj = LockFreeJournal()
+        lfj.is_writeable = True
+        lfj.seg_overlap = overlap
+        strm = LockFreeJournal.Strm()
+        strm.lock_free_journal = lfj
+        strm.strm_name = "bench_strm"
+        strm.strm_num_plus_1 = 1
+        strm.on_disk_strm_info = SimpleNamespace(committed_len=AtomicUint64(), valid_len=AtomicUint64(), alloc_len=AtomicUint64())
+        strm.fd_plus_1 = os.open(os.path.join(bench_dir, strm.strm_name), os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644) + 1
+
+        spills = 0
+        begin = time.perf_counter_ns()
+        for length in lengths:
+            with strm.strm_write_mutex:
+                if use_buf_malloc:
+                    strm.buf_malloc(length, "bench_seg_overlap")[:] = payload[:length]
+                    if strm.alloc_heap_buf is not None:
+                        spills += 1
+                    strm.buf_commit(length, "bench_seg_overlap")
+                else:
+                    strm.reserve(length, "bench_seg_overlap")[:] = payload[:length]
+                    if strm.batch_heap_buf is not None:
+                        spills += 1
+                    strm.commit_many((length,), "bench_seg_overlap")
+        results.append(((time.perf_counter_ns() - begin) / num_msgs, spills))
+
+        strm.alloc_buf = strm.alloc_heap_buf = None
+        strm.seg_mapper.close()
+        for seg in strm.segs:
+            seg.seg_view.release()
+            seg.seg_data.close()
+        os.close(strm.get_strm_fd())
+
+    os.unlink(os.path.join(bench_dir, "bench_strm"))
+    os.rmdir(bench_dir)
+    return results[0], results[1]
+
+
+# Example usage
+if __name__ == "__main__":
+    view_ns, slice_ns = bench_locate_data()
+    print(f"locate_data: {view_ns:.0f} ns/read, seg_data[seg_off:]: {slice_ns:.0f} ns/read")
+    single_ns, batched_ns = bench_append_batch()
+    print(f"one message per commit: {single_ns:.0f} ns/msg, append_batch: {batched_ns:.0f} ns/msg")
+    (split_ns, split_spills), (overlap_ns, overlap_spills) = bench_seg_overlap()
+    print(f"random-length appends: {split_ns:.0f} ns/msg with {split_spills} heap spills, "
+          f"{overlap_ns:.0f} ns/msg with a 64 KiB overlap window and {overlap_spills} spills")
+    (split_ns, split_spills), (overlap_ns, overlap_spills) = bench_seg_overlap(use_buf_malloc=True)
+    print(f"buf_malloc()/buf_commit(): {split_ns:.0f} ns/msg with {split_spills} heap spills, "
+          f"{overlap_ns:.0f} ns/msg with a 64 KiB overlap window and {overlap_spills} spills")
@@ -0,0 +1,155 @@
+import struct
+import threading
+from collections import OrderedDict
+from persistance.pos_array import np
+from persistance.rup_pos import Pos
+
+PATCH_HDR = struct.Struct("<QI")   # base item idx, num_edits
+PATCH_EDIT = struct.Struct("<II")  # msg_off, edit_len; then edit_len bytes
+PATCH_FLAG = 1 << Pos.FLAG_SHIFT
+MATERIALIZED_CACHE_ITEMS = 1024
+
+
+def encode_patch(base_idx: int, edits) -> bytes:
+    """
+    Encodes a patch of item base_idx of a vec, an item that is not a patch itself. edits
+    are (msg_off, bytes) pairs applied in order, each overwriting the message from msg_off
+    (and extending it past its end). A patch becomes an item of the same vec with the Pos
+    flag raised (PATCH_FLAG, Pos.is_patch()) through an OP_PATCH_MSG carrying it inline
+    (TxBuilder.patch_item()), or by an OP_SET_ITEM_POS_FLAG on an item holding it.
+    """
+    parts = [PATCH_HDR.pack(base_idx, len(edits))]
+    for msg_off, edit in edits:
+        parts.append(PATCH_EDIT.pack(msg_off, len(edit)))
+        parts.append(bytes(edit))
+    return b"".join(parts)
+
+
+def read_base_idx(patch, patch_idx: int) -> int:
+    """
+    :return: The base item idx in the header of patch, the message of item patch_idx,
+             which must be an earlier item.
+    """
+    if len(patch) < PATCH_HDR.size:
+        raise Exception(f"patch is shorter than its header; patch_idx={patch_idx}, len={len(patch)}")
+    base_idx = PATCH_HDR.unpack_from(patch, 0)[0]
+    if base_idx >= patch_idx:
+        raise Exception(f"patch base should be an earlier item; base_idx={base_idx}, patch_idx={patch_idx}")
+    return base_idx
+
+
+def apply_patch(buf: bytearray, patch):
+    off = PATCH_HDR.size
+    num_edits = PATCH_HDR.unpack_from(patch, 0)[1]
+    for _ in range(num_edits):
+        msg_off, edit_len = PATCH_EDIT.unpack_from(patch, off)
+        off += PATCH_EDIT.size
+        if msg_off + edit_len > len(buf):
+            buf.extend(bytes(msg_off + edit_len - len(buf)))
+        buf[msg_off:msg_off + edit_len] = patch[off:off + edit_len]
+        off += edit_len
+
+
+class PatchOverlay:
+    """
+    The patches of one vec's items and an LRU of the messages materialized with them.
+
+    patches maps a base item idx to the idxs of its patch items, oldest first. It is
+    caught up with the vec's new items on each lookup: the flag bit of their positions
+    is checked a segment chunk at a time and only the patch items are read, for the
+    base idx in their header. A flag changed on an item already indexed bumps the
+    vec's flag generation (VecColumns.get_flag_gen()), which starts the index over. A
+    cached message is the bytes of its base with the patches up to some idx applied; a
+    lookup after more patches landed copies it and applies only the new ones, so views
+    handed out earlier keep their contents.
+    """
+
+    def __init__(self, vec, max_items: int = MATERIALIZED_CACHE_ITEMS):
+        self.vec = vec
+        self.max_items = max_items
+        self.lock = threading.Lock()
+        self.patches = {}
+        self.indexed_count = 0
+        self.flag_gen = 0
+        self.cache = OrderedDict()  # (num patches applied, message bytearray) by item idx
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def read_msg(self, pos: int) -> bytes:
+        data_1, data_2 = self.vec.lock_free_journal.get_strm((pos >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK).locate_data(
+            pos & Pos.STRM_OFF_MASK, (pos >> Pos.LEN_SHIFT) & Pos.LEN_MASK, "PatchOverlay.read_msg")
+        if data_2 is None:
+            return data_1
+        return bytes(data_1) + bytes(data_2)
+
+    def catch_up(self):
+        columns = self.vec.columns
+        num_items = columns.get_num_items()
+        idx = self.indexed_count
+        for chunk in columns.pos.chunks(idx, num_items):
+            if np is not None:
+                patch_idxs = (np.flatnonzero(np.frombuffer(chunk, dtype=np.uint64) >> np.uint64(Pos.FLAG_SHIFT)) + idx).tolist()
+            else:
+                patch_idxs = [idx + i for i, pos in enumerate(chunk) if pos & PATCH_FLAG]
+            for patch_idx in patch_idxs:
+                base_idx = read_base_idx(self.read_msg(columns.pos.get(patch_idx)), patch_idx)
+                if columns.pos.get(base_idx) & PATCH_FLAG:
+                    raise Exception(f"patch base is a patch itself; base_idx={base_idx}, patch_idx={patch_idx}")
+                self.patches.setdefault(base_idx, []).append(patch_idx)
+            idx += len(chunk)
+        self.indexed_count = num_items
+
+    def get_materialized(self, idx: int):
+        """
+        :return: The message of item idx with its patches applied (for a patch item, those of
+                 its base up to it) as a read-only memoryview, or None if there is no item idx.
+        """
+        columns = self.vec.columns
+        with self.lock:
+            flag_gen = columns.get_flag_gen()
+            if flag_gen != self.flag_gen:
+                self.patches.clear()
+                self.cache.clear()
+                self.indexed_count = 0
+                self.flag_gen = flag_gen
+            if columns.get_num_items() > self.indexed_count:
+                self.catch_up()
+            if idx >= self.indexed_count:
+                return None
+
+            pos = columns.pos.get(idx)
+            base_idx = idx
+            if pos & PATCH_FLAG:
+                base_idx = read_base_idx(self.read_msg(pos), idx)
+            patch_idxs = self.patches.get(base_idx, ())
+            num_patches = len(patch_idxs) if base_idx == idx else patch_idxs.index(idx) + 1
+            if num_patches == 0:
+                data = self.read_msg(pos)
+                if isinstance(data, memoryview):
+                    return data.toreadonly()
+
+            cached = self.cache.get(idx)
+            if cached is not None and cached[0] == num_patches:
+                self.cache.move_to_end(idx)
+                self.num_hits += 1
+                return memoryview(cached[1]).toreadonly()
+
+            self.num_misses += 1
+            if cached is not None and cached[0] < num_patches:
+                first_patch, buf = cached[0], bytearray(cached[1])
+            else:
+                first_patch, buf = 0, bytearray(self.read_msg(columns.pos.get(base_idx)))
+            for patch_idx in patch_idxs[first_patch:num_patches]:
+                apply_patch(buf, self.read_msg(columns.pos.get(patch_idx)))
+
+            self.cache[idx] = (num_patches, buf)
+            self.cache.move_to_end(idx)
+            while len(self.cache) > self.max_items:
+                self.cache.popitem(last=False)
+            return memoryview(buf).toreadonly()
+
+    def get_stats(self):
+        """
+        :return: (cached items, hits, misses) of the materialized LRU.
+        """
+        return len(self.cache), self.num_hits, self.num_misses
@@ -1,39 +1,402 @@
+import ctypes
+import struct
+from persistance.atomic_word import AtomicUint32, AtomicUint64
+from utils.timestamp import Timestamp
+
+MAX_STRMS = 0x000003ff
+MAX_VECS = 1024
+MAX_STRM_NAME_LEN = 127
+MAX_VEC_NAME_LEN = 127
+MAX_ENCODE_NAME_LEN = 127
+MAX_COMP_ID_LEN = 63
+MAX_SESSION_ID_LEN = 63
+UNKNOWN_STREAM = 0
+DATA_STREAM = 1
+
+
+class StrmInfoLayout(ctypes.Structure):
+    _fields_ = [
+        ("committed_len", ctypes.c_uint64),
+        ("valid_len", ctypes.c_uint64),
+        ("alloc_len", ctypes.c_uint64),
+        ("strm_num_plus_1", ctypes.c_uint32),
+        ("strm_type", ctypes.c_uint32),
+        ("name", ctypes.c_char * (MAX_STRM_NAME_LEN + 1)),
+        ("durable_len", ctypes.c_uint64),
+    ]
+
+
+class VecInfoLayout(ctypes.Structure):
+    _fields_ = [
+        ("vec_num_plus_1", ctypes.c_uint32),
+        ("vec_type", ctypes.c_uint32),
+        ("strm_num_plus_1", ctypes.c_uint32),
+        ("vec_dir", ctypes.c_uint32),
+        ("instance_id", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("item_idx_base", ctypes.c_uint64),
+        ("name", ctypes.c_char * (MAX_VEC_NAME_LEN + 1)),
+        ("encode_name", ctypes.c_char * (MAX_ENCODE_NAME_LEN + 1)),
+        ("comp_id", ctypes.c_char * (MAX_COMP_ID_LEN + 1)),
+        ("session_id", ctypes.c_char * (MAX_SESSION_ID_LEN + 1)),
+    ]
+
+
+class JournalHdrLayout(ctypes.Structure):
+    _fields_ = [
+        ("magic", ctypes.c_uint64),
+        ("creation_timestamp_ns", ctypes.c_uint64),
+        ("highest_strm_num", ctypes.c_uint64),
+        ("highest_vec_num_plus_1", ctypes.c_uint64),
+        ("flags", ctypes.c_uint64),
+        ("highest_committed_strm_num", ctypes.c_uint64),
+        ("highest_committed_vec_num_plus_1", ctypes.c_uint64),
+        ("global_tx_seq", ctypes.c_uint64),
+        ("strm_infos", StrmInfoLayout * MAX_STRMS),
+        ("vec_infos", VecInfoLayout * MAX_VECS),
+    ]
+
+
+class OnDiskRecord:
+    """
+    Base of a record in the mapped journal header: numeric fields are aligned words
+    (AtomicUint32/AtomicUint64) at their layout offsets, strings are NUL padded.
+    """
+    LAYOUT = None
+
+    def __init__(self, buf, off):
+        self.buf = buf
+        self.off = off
+        self.words = []
+
+    def word(self, field):
+        layout_field = getattr(self.LAYOUT, field)
+        word_cls = AtomicUint64 if layout_field.size == 8 else AtomicUint32
+        word = word_cls(buf=self.buf, off=self.off + layout_field.offset)
+        self.words.append(word)
+        return word
+
+    def get_str(self, field):
+        layout_field = getattr(self.LAYOUT, field)
+        begin = self.off + layout_field.offset
+        return bytes(self.buf[begin:begin + layout_field.size]).split(b"\0", 1)[0].decode()
+
+    def set_str(self, field, value):
+        layout_field = getattr(self.LAYOUT, field)
+        raw = value.encode()
+        if len(raw) >= layout_field.size:
+            raise Exception(f"{field} should not be longer than {layout_field.size - 1} characters; {field}={value}")
+        begin = self.off + layout_field.offset
+        self.buf[begin:begin + layout_field.size] = raw.ljust(layout_field.size, b"\0")
+
+    def release(self):
+        for word in self.words:
+            word.release()
+        self.words = []
+
+
+class OnDiskStrmInfo(OnDiskRecord):
+    """
+    A stream's record in the mapped journal header (StrmInfoLayout).
+
+    committed_len, valid_len and alloc_len are aligned 8-byte words written only by
+    the stream's writer. The writer raises alloc_len before copying data in, and
+    valid_len and then committed_len once it is copied (a TX stream raises
+    committed_len only once the tx's ops are applied), so a reader in any process
+    that loads committed_len can read every byte below it. Recovery cuts whatever
+    lies between committed_len and valid_len/alloc_len. durable_len is raised by the journal's flusher once the
+    bytes below it have been msync'ed (see durability.Durability).
+    """
+    LAYOUT = StrmInfoLayout
+    SIZE = ctypes.sizeof(StrmInfoLayout)
+
+    def __init__(self, buf, off):
+        super().__init__(buf, off)
+        self.committed_len = self.word("committed_len")
+        self.valid_len = self.word("valid_len")
+        self.alloc_len = self.word("alloc_len")
+        self.strm_num_plus_1_word = self.word("strm_num_plus_1")
+        self.strm_type_word = self.word("strm_type")
+        self.durable_len = self.word("durable_len")
+
+    @property
+    def strm_num_plus_1(self):
+        return self.strm_num_plus_1_word.get()
+
+    @strm_num_plus_1.setter
+    def strm_num_plus_1(self, value):
+        self.strm_num_plus_1_word.set(value)
+
+    @property
+    def strm_type(self):
+        return self.strm_type_word.get()
+
+    @strm_type.setter
+    def strm_type(self, value):
+        self.strm_type_word.set(value)
+
+    @property
+    def name(self):
+        return self.get_str("name")
+
+    @name.setter
+    def name(self, value):
+        self.set_str("name", value)
+
+    def init(self, strm_num, strm_name, strm_type):
+        self.name = strm_name
+        self.strm_type = strm_type
+        self.strm_num_plus_1 = strm_num + 1
+
+
+class OnDiskVecInfo(OnDiskRecord):
+    """
+    A vec's record in the mapped journal header (VecInfoLayout). vec_num_plus_1 is
+    written last, so a record with it set is complete.
+    """
+    LAYOUT = VecInfoLayout
+    SIZE = ctypes.sizeof(VecInfoLayout)
+
+    def __init__(self, buf, off):
+        super().__init__(buf, off)
+        self.vec_num_plus_1_word = self.word("vec_num_plus_1")
+        self.vec_type_word = self.word("vec_type")
+        self.strm_num_plus_1_word = self.word("strm_num_plus_1")
+        self.vec_dir_word = self.word("vec_dir")
+        self.instance_id_word = self.word("instance_id")
+        self.flags_word = self.word("flags")
+        self.item_idx_base_word = self.word("item_idx_base")
+
+    @property
+    def vec_num_plus_1(self):
+        return self.vec_num_plus_1_word.get()
+
+    @vec_num_plus_1.setter
+    def vec_num_plus_1(self, value):
+        self.vec_num_plus_1_word.set(value)
+
+    @property
+    def vec_type(self):
+        return self.vec_type_word.get()
+
+    @property
+    def strm_num_plus_1(self):
+        return self.strm_num_plus_1_word.get()
+
+    @strm_num_plus_1.setter
+    def strm_num_plus_1(self, value):
+        self.strm_num_plus_1_word.set(value)
+
+    @property
+    def vec_dir(self):
+        return self.vec_dir_word.get()
+
+    @property
+    def instance_id(self):
+        return self.instance_id_word.get()
+
+    @property
+    def flags(self):
+        return self.flags_word.get()
+
+    @flags.setter
+    def flags(self, value):
+        self.flags_word.set(value)
+
+    @property
+    def item_idx_base(self):
+        return self.item_idx_base_word.get()
+
+    @property
+    def name(self):
+        return self.get_str("name")
+
+    @property
+    def encode_name(self):
+        return self.get_str("encode_name")
+
+    @property
+    def comp_id(self):
+        return self.get_str("comp_id")
+
+    @property
+    def session_id(self):
+        return self.get_str("session_id")
+
+    def init(self, vec_num, vec_name, vec_type, vec_encode_name="", comp_id="", session_id="", vec_dir=0, instance_id=0, item_idx_base=0):
+        self.set_str("name", vec_name)
+        self.set_str("encode_name", vec_encode_name)
+        self.set_str("comp_id", comp_id)
+        self.set_str("session_id", session_id)
+        self.vec_type_word.set(vec_type)
+        self.vec_dir_word.set(vec_dir)
+        self.instance_id_word.set(instance_id)
+        self.item_idx_base_word.set(item_idx_base)
+        self.vec_num_plus_1_word.set(vec_num + 1)
+
+
+class OnDiskRecords:
+    """
+    The fixed array of records at off in the header. Records are wrapped on first
+    access, so mapping the header costs nothing per stream or vec.
+    """
+
+    def __init__(self, record_cls, buf, off, count):
+        self.record_cls = record_cls
+        self.buf = buf
+        self.off = off
+        self.records = [None] * count
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, idx):
+        record = self.records[idx]
+        if record is None:
+            if idx < 0:
+                idx += len(self.records)
+            record = self.record_cls(self.buf, self.off + idx * self.record_cls.SIZE)
+            self.records[idx] = record
+        return record
+
+    def release(self):
+        for record in self.records:
+            if record is not None:
+                record.release()
+        self.records = [None] * len(self.records)
+
+
 class OnDiskJournalHdr:
-    def __init__(self):
-        self.creation_timestamp = Timestamp()
-        self.highest_strm_num = 0
-        self.highest_vec_num_plus_1 = 0
-        self.strm_infos = [None] * LockFreeJournal.MAX_STRMS
-        self.vec_infos = [None] * LockFreeJournal.MAX_VECS
-        self.flags = 0
+    """
+    The journal header: JournalHdrLayout mapped in place at the start of segment 0
+    of LFJ_STRM_0. Opening a journal maps that segment and reads fields straight
+    from it; nothing is parsed or copied.
+
+    highest_committed_strm_num and highest_committed_vec_num_plus_1 are watermarks
+    the writer raises right after it completes a stream or vec record, so a reader
+    gets them with one load instead of scanning MAX_STRMS/MAX_VECS records.
+    global_tx_seq is the last number handed out by LockFreeJournal.next_global_tx_seq().
+    """
+    MAGIC = struct.unpack("<Q", b"RUPLFJ02")[0]
+    SIZE = ctypes.sizeof(JournalHdrLayout)
+
+    def __init__(self, buf=None):
+        """
+        :param buf: Mapped segment 0 of LFJ_STRM_0; a private buffer is used when None.
+        """
+        if buf is None:
+            buf = bytearray(self.SIZE)
+        self.buf = buf
+        self.words = []
+        self.magic = self.word("magic")
+        self.creation_timestamp_ns = self.word("creation_timestamp_ns")
+        self.highest_strm_num_word = self.word("highest_strm_num")
+        self.highest_vec_num_plus_1_word = self.word("highest_vec_num_plus_1")
+        self.flags_word = self.word("flags")
+        self.highest_committed_strm_num_word = self.word("highest_committed_strm_num")
+        self.highest_committed_vec_num_plus_1_word = self.word("highest_committed_vec_num_plus_1")
+        self.global_tx_seq = self.word("global_tx_seq")
+        self.strm_infos = OnDiskRecords(OnDiskStrmInfo, buf, JournalHdrLayout.strm_infos.offset, MAX_STRMS)
+        self.vec_infos = OnDiskRecords(OnDiskVecInfo, buf, JournalHdrLayout.vec_infos.offset, MAX_VECS)
+
+    def word(self, field):
+        word = AtomicUint64(buf=self.buf, off=getattr(JournalHdrLayout, field).offset)
+        self.words.append(word)
+        return word
+
+    def format(self, creation_timestamp_ns):
+        """
+        Stamps a freshly created header; the magic is written last so a reader
+        never accepts a half-initialized header.
+        """
+        self.creation_timestamp_ns.set(creation_timestamp_ns)
+        self.magic.set(self.MAGIC)
+
+    def is_formatted(self):
+        return self.magic.get() == self.MAGIC
+
+    @property
+    def highest_strm_num(self):
+        return self.highest_strm_num_word.get()
+
+    @highest_strm_num.setter
+    def highest_strm_num(self, value):
+        self.highest_strm_num_word.set(value)
+
+    @property
+    def highest_vec_num_plus_1(self):
+        return self.highest_vec_num_plus_1_word.get()
+
+    @highest_vec_num_plus_1.setter
+    def highest_vec_num_plus_1(self, value):
+        self.highest_vec_num_plus_1_word.set(value)
+
+    @property
+    def flags(self):
+        return self.flags_word.get()
+
+    @flags.setter
+    def flags(self, value):
+        self.flags_word.set(value)
 
     def get_creation_timestamp(self):
-        return self.creation_timestamp
+        ts_ns = self.creation_timestamp_ns.get()
+        return Timestamp(ts_ns // 1000000000, ts_ns % 1000000000)
 
     def get_highest_strm_num(self):
         return self.highest_strm_num
 
+    def init_strm_info(self, strm_num, strm_name, strm_type):
+        """
+        Completes a stream's record, then raises the watermarks past it. The caller holds
+        LockFreeJournal.num_alloc_mutex: the raise is a read-compare-write, which two
+        concurrent creates would otherwise undo for the lower number.
+        """
+        self.strm_infos[strm_num].init(strm_num, strm_name, strm_type)
+        if strm_num > self.highest_strm_num:
+            self.highest_strm_num = strm_num
+        if strm_num > self.highest_committed_strm_num_word.get():
+            self.highest_committed_strm_num_word.set(strm_num)
+
+    def init_vec_info(self, vec_num, vec_name, vec_type, *args, **kwargs):
+        """
+        Completes a vec's record, then raises the watermarks past it, under
+        LockFreeJournal.num_alloc_mutex like init_strm_info().
+        """
+        self.vec_infos[vec_num].init(vec_num, vec_name, vec_type, *args, **kwargs)
+        if vec_num + 1 > self.highest_vec_num_plus_1:
+            self.highest_vec_num_plus_1 = vec_num + 1
+        if vec_num + 1 > self.highest_committed_vec_num_plus_1_word.get():
+            self.highest_committed_vec_num_plus_1_word.set(vec_num + 1)
+
     def get_highest_committed_strm_num(self):
-        for strm_num in range(self.highest_strm_num, -1, -1):
-            if self.strm_infos[strm_num].committed_len > 0 and self.strm_infos[strm_num].strm_type != StrmType.UNKNOWN_STREAM:
-                return strm_num
-        return 0
+        return self.highest_committed_strm_num_word.get()
 
     def get_highest_vec_num(self):
         return self.highest_vec_num_plus_1 - 1 if self.highest_vec_num_plus_1 > 0 else 0
 
     def get_highest_committed_vec_num(self):
-        vec_num = self.get_highest_vec_num()
-        for vec_num in range(vec_num, -1, -1):
-            if self.vec_infos[vec_num].hop_one_slices[0].get_flag():
-                return vec_num
-        return 0
+        vec_num_plus_1 = self.highest_committed_vec_num_plus_1_word.get()
+        return vec_num_plus_1 - 1 if vec_num_plus_1 > 0 else 0
 
     def reinit(self, tx_strm):
+        self.strm_infos.release()
+        self.vec_infos.release()
         self.highest_strm_num = 0
         self.highest_vec_num_plus_1 = 0
-        self.strm_infos = [None] * LockFreeJournal.MAX_STRMS
-        self.vec_infos = [None] * LockFreeJournal.MAX_VECS
+        self.highest_committed_strm_num_word.set(0)
+        self.highest_committed_vec_num_plus_1_word.set(0)
+        begin = JournalHdrLayout.strm_infos.offset
+        self.buf[begin:self.SIZE] = bytes(self.SIZE - begin)
+
+    def release(self):
+        """
+        Drops every view over the mapped header so the segment can be unmapped.
+        """
+        for word in self.words:
+            word.release()
+        self.strm_infos.release()
+        self.vec_infos.release()
 
     def set_dir_not_exist_before_first_open(self, set_or_clear):
         if set_or_clear:
@@ -0,0 +1,258 @@
+import heapq
+import mmap
+import os
+import threading
+from array import array
+from operator import itemgetter
+from persistance.rup_tx import Tx
+from persistance.tx_builder import iter_tx_ops
+
+ORDER_INDEX_SLOTS_NAME = "LFJ_ORDER_INDEX_SLOTS"
+ORDER_INDEX_NODES_NAME = "LFJ_ORDER_INDEX_NODES"
+SLOTS_MAGIC = int.from_bytes(b"RUPOIS01", "little")
+NODES_MAGIC = int.from_bytes(b"RUPOIN01", "little")
+
+SLOTS_HDR_WORDS = 8            # magic, num_slots, num_used
+SLOT_WORDS = 4                 # vec_num_plus_1 | count << 32, seq_num, head_node_plus_1, tail_node_plus_1
+NODES_HDR_WORDS = 2048         # magic, num_nodes, capacity, then the indexed_len of every stream (up to MAX_STRMS) from word 8
+NODE_WORDS = 8                 # next_node_plus_1, then POSITIONS_PER_NODE positions
+POSITIONS_PER_NODE = NODE_WORDS - 1
+INDEXED_LENS_WORD = 8
+INITIAL_SLOTS = 1 << 12
+INITIAL_NODES = 1 << 12
+MAX_LOAD = 0.5
+
+
+class OrderIndex:
+    """
+    A persistent index from an order key (vec_num, seq_num) to the Pos of every item
+    set for it (OP_SET_VEC_ITEM), in commit order, so the history of an order is one
+    lookup and a batched read instead of a walk through the tx streams.
+
+    Two mapped files in the journal directory hold it:
+
+        LFJ_ORDER_INDEX_SLOTS  an open-addressing hash table of 32-byte slots (key, count,
+                               first and last node); rehashed into a new file, renamed
+                               over the old one, when half full
+        LFJ_ORDER_INDEX_NODES  64-byte nodes chaining 7 positions each, grown by doubling,
+                               behind a header holding how far each TX stream is indexed
+
+    TxBuilder.commit() adds a tx's items once its committed_len is raised and then
+    advances its stream's indexed length, so after a crash catch_up() re-reads only
+    the txs past it (a re-added last item is recognised and skipped). A slot's count
+    is stored after the positions it covers, so readers mapping the files need no lock
+    beyond the in-process one guarding remaps.
+    """
+
+    def __init__(self, lfj_name: str, is_writeable: bool):
+        self.slots_path = os.path.join(lfj_name, ORDER_INDEX_SLOTS_NAME)
+        self.nodes_path = os.path.join(lfj_name, ORDER_INDEX_NODES_NAME)
+        self.is_writeable = is_writeable
+        self.lock = threading.Lock()
+        self.slots_data = None
+        self.slots = None
+        self.slots_ino = 0
+        self.nodes_data = None
+        self.nodes = None
+        self.mask = 0
+        if is_writeable and not os.path.exists(self.nodes_path):
+            self.create_files()
+        self.map_files()
+
+    def create_files(self):
+        for path, num_words, magic in ((self.slots_path + ".tmp", SLOTS_HDR_WORDS + INITIAL_SLOTS * SLOT_WORDS, SLOTS_MAGIC),
+                                       (self.nodes_path + ".tmp", NODES_HDR_WORDS + INITIAL_NODES * NODE_WORDS, NODES_MAGIC)):
+            words = array('Q', bytes(8 * num_words))
+            words[0] = magic
+            words[1] = INITIAL_SLOTS if magic == SLOTS_MAGIC else 0
+            if magic == NODES_MAGIC:
+                words[2] = INITIAL_NODES
+            with open(path, "wb") as index_file:
+                index_file.write(words.tobytes())
+        os.replace(self.slots_path + ".tmp", self.slots_path)
+        os.replace(self.nodes_path + ".tmp", self.nodes_path)
+
+    def map_file(self, path: str, magic: int):
+        fd = os.open(path, os.O_RDWR if self.is_writeable else os.O_RDONLY)
+        try:
+            ino = os.fstat(fd).st_ino
+            data = mmap.mmap(fd, 0, prot=mmap.PROT_READ | mmap.PROT_WRITE if self.is_writeable else mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        words = memoryview(data).cast('Q')
+        if words[0] != magic:
+            words.release()
+            data.close()
+            raise Exception(f"not an order index file; path={path}")
+        return data, words, ino
+
+    def unmap_files(self):
+        for name in ("slots", "nodes"):
+            words = getattr(self, name)
+            if words is not None:
+                words.release()
+                getattr(self, name + "_data").close()
+                setattr(self, name, None)
+                setattr(self, name + "_data", None)
+
+    def map_files(self):
+        self.unmap_files()
+        self.slots_data, self.slots, self.slots_ino = self.map_file(self.slots_path, SLOTS_MAGIC)
+        self.nodes_data, self.nodes, _ = self.map_file(self.nodes_path, NODES_MAGIC)
+        self.mask = self.slots[1] - 1
+
+    def refresh(self):
+        """
+        Picks up a rehashed slots file or grown nodes file of a live writer (read-only opens).
+        """
+        with self.lock:
+            if os.stat(self.slots_path).st_ino != self.slots_ino or os.stat(self.nodes_path).st_size > len(self.nodes_data):
+                self.map_files()
+
+    def find_slot(self, slots, mask: int, vec_num: int, seq_num: int) -> int:
+        """
+        :return: Word index of the key's slot, or of the empty slot it would take.
+        """
+        idx = (((seq_num * 0x9E3779B97F4A7C15) ^ (vec_num * 0xC2B2AE3D27D4EB4F)) & 0xffffffffffffffff) >> 20 & mask
+        while True:
+            word = SLOTS_HDR_WORDS + idx * SLOT_WORDS
+            vec_num_plus_1 = slots[word] & 0xffffffff
+            if vec_num_plus_1 == 0 or (vec_num_plus_1 == vec_num + 1 and slots[word + 1] == seq_num):
+                return word
+            idx = (idx + 1) & mask
+
+    def add(self, vec_num: int, seq_num: int, pos: int, skip_if_last: bool = False):
+        with self.lock:
+            self.add_(vec_num, seq_num, pos, skip_if_last)
+
+    def add_tx(self, strm_num: int, end_off: int, vec_items):
+        """
+        Indexes the items of a committed tx and records its tx stream as indexed up to end_off.
+        :param vec_items: (vec_num, seq_num, pos, timestamp_ns) as kept by TxBuilder.
+        """
+        with self.lock:
+            for vec_num, seq_num, pos, _ in vec_items:
+                self.add_(vec_num, seq_num, pos, False)
+            self.nodes[INDEXED_LENS_WORD + strm_num] = end_off
+
+    def add_(self, vec_num: int, seq_num: int, pos: int, skip_if_last: bool):
+        slots = self.slots
+        word = self.find_slot(slots, self.mask, vec_num, seq_num)
+        count = slots[word] >> 32
+        if count == 0:
+            node = self.alloc_node()
+            nodes = self.nodes
+            nodes[NODES_HDR_WORDS + node * NODE_WORDS + 1] = pos
+            slots[word + 1] = seq_num
+            slots[word + 2] = node + 1
+            slots[word + 3] = node + 1
+            slots[word] = (vec_num + 1) | (1 << 32)
+            slots[2] += 1
+            if slots[2] > (self.mask + 1) * MAX_LOAD:
+                self.rehash()
+            return
+
+        tail_word = NODES_HDR_WORDS + (slots[word + 3] - 1) * NODE_WORDS
+        used = (count - 1) % POSITIONS_PER_NODE + 1
+        if skip_if_last and self.nodes[tail_word + used] == pos:
+            return
+        if used == POSITIONS_PER_NODE:
+            node = self.alloc_node()
+            nodes = self.nodes
+            nodes[NODES_HDR_WORDS + node * NODE_WORDS + 1] = pos
+            nodes[tail_word] = node + 1
+            slots[word + 3] = node + 1
+        else:
+            self.nodes[tail_word + used + 1] = pos
+        slots[word] = (vec_num + 1) | ((count + 1) << 32)
+
+    def alloc_node(self) -> int:
+        nodes = self.nodes
+        node = nodes[1]
+        if node == nodes[2]:
+            self.grow_nodes(node * 2)
+            nodes = self.nodes
+        nodes[1] = node + 1
+        return node
+
+    def grow_nodes(self, capacity: int):
+        fd = os.open(self.nodes_path, os.O_RDWR)
+        try:
+            os.ftruncate(fd, 8 * (NODES_HDR_WORDS + capacity * NODE_WORDS))
+        finally:
+            os.close(fd)
+        self.nodes.release()
+        self.nodes_data.close()
+        self.nodes_data, self.nodes, _ = self.map_file(self.nodes_path, NODES_MAGIC)
+        self.nodes[2] = capacity
+
+    def rehash(self):
+        num_slots = (self.mask + 1) * 2
+        words = array('Q', bytes(8 * (SLOTS_HDR_WORDS + num_slots * SLOT_WORDS)))
+        words[0] = SLOTS_MAGIC
+        words[1] = num_slots
+        words[2] = self.slots[2]
+        old_slots = self.slots
+        for old_idx in range(self.mask + 1):
+            old_word = SLOTS_HDR_WORDS + old_idx * SLOT_WORDS
+            if old_slots[old_word] & 0xffffffff:
+                word = self.find_slot(words, num_slots - 1, (old_slots[old_word] & 0xffffffff) - 1, old_slots[old_word + 1])
+                words[word:word + SLOT_WORDS] = array('Q', old_slots[old_word:old_word + SLOT_WORDS])
+        with open(self.slots_path + ".tmp", "wb") as slots_file:
+            slots_file.write(words.tobytes())
+        os.replace(self.slots_path + ".tmp", self.slots_path)
+        self.slots.release()
+        self.slots_data.close()
+        self.slots_data, self.slots, self.slots_ino = self.map_file(self.slots_path, SLOTS_MAGIC)
+        self.mask = num_slots - 1
+
+    def get_positions(self, vec_num: int, seq_num: int) -> array:
+        """
+        :return: array('Q') of the packed Pos values set for the key, oldest first.
+        """
+        positions = array('Q')
+        with self.lock:
+            slots = self.slots
+            word = self.find_slot(slots, self.mask, vec_num, seq_num)
+            count = slots[word] >> 32
+            node = slots[word + 2]
+            nodes = self.nodes
+            while count > 0 and node != 0:
+                node_word = NODES_HDR_WORDS + (node - 1) * NODE_WORDS
+                n = min(count, POSITIONS_PER_NODE)
+                positions.extend(nodes[node_word + 1:node_word + 1 + n])
+                count -= n
+                node = nodes[node_word]
+        return positions
+
+    def get_indexed_len(self, strm_num: int) -> int:
+        return self.nodes[INDEXED_LENS_WORD + strm_num]
+
+    def catch_up(self, lock_free_journal):
+        """
+        Indexes the committed txs past every TX stream's indexed length, in global_tx_seq
+        order. An index that is ahead of a stream (which was rolled back under it) is
+        rebuilt from scratch.
+        """
+        # tx_merge imports the journal module, which imports this one
+        from persistance.tx_merge import get_tx_strm_begin_off, get_tx_strms, iter_strm_txs
+
+        tx_strms = get_tx_strms(lock_free_journal)
+        if any(self.get_indexed_len(strm.get_strm_num()) > strm.get_committed_len() for strm in tx_strms):
+            self.unmap_files()
+            self.create_files()
+            self.map_files()
+
+        txs = heapq.merge(*[iter_strm_txs(strm, max(self.get_indexed_len(strm.get_strm_num()), get_tx_strm_begin_off(strm)))
+                            for strm in tx_strms], key=itemgetter(0))
+        with self.lock:
+            for _, strm_num, strm_off, tx in txs:
+                for op_code, fields in iter_tx_ops(tx):
+                    if op_code == Tx.OP_SET_VEC_ITEM:
+                        self.add_(fields[0], fields[1], fields[2], True)
+                self.nodes[INDEXED_LENS_WORD + strm_num] = strm_off + len(tx)
+
+    def close(self):
+        with self.lock:
+            self.unmap_files()
+
@@ -0,0 +1,39 @@
+from array import array
+from collections import namedtuple
+from persistance.rup_pos import Pos
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PosColumns = namedtuple("PosColumns", ["strm_num", "strm_off", "seg_num", "seg_off", "len", "flag"])
+
+
+def decode_pos_columns(values) -> PosColumns:
+    """
+    Splits packed uint64 Pos values into their fields in bulk.
+
+    :param values: Any buffer of uint64 (array('Q'), a 'Q' memoryview, a NumPy array).
+    :return: PosColumns of NumPy arrays, or of array('Q') when NumPy is not installed.
+    """
+    if np is not None:
+        v = values if isinstance(values, np.ndarray) else np.frombuffer(values, dtype=np.uint64)
+        strm_off = v & np.uint64(Pos.STRM_OFF_MASK)
+        return PosColumns(
+            strm_num=(v >> np.uint64(Pos.STRM_NUM_SHIFT)) & np.uint64(Pos.STRM_NUM_MASK),
+            strm_off=strm_off,
+            seg_num=strm_off >> np.uint64(Pos.SEG_NUM_SHIFT),
+            seg_off=strm_off & np.uint64(Pos.SEG_OFF_MASK),
+            len=(v >> np.uint64(Pos.LEN_SHIFT)) & np.uint64(Pos.LEN_MASK),
+            flag=(v >> np.uint64(Pos.FLAG_SHIFT)).astype(np.bool_))
+
+    strm_off = array('Q', [value & Pos.STRM_OFF_MASK for value in values])
+    return PosColumns(
+        strm_num=array('Q', [(value >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK for value in values]),
+        strm_off=strm_off,
+        seg_num=array('Q', [off >> Pos.SEG_NUM_SHIFT for off in strm_off]),
+        seg_off=array('Q', [off & Pos.SEG_OFF_MASK for off in strm_off]),
+        len=array('Q', [(value >> Pos.LEN_SHIFT) & Pos.LEN_MASK for value in values]),
+        flag=array('B', [value >> Pos.FLAG_SHIFT for value in values]))
+
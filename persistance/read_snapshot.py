@@ -1,3 +1,22 @@
+import math
+from persistance.pos_array import decode_pos_columns, np
+
+SCAN_WINDOW = 65536
+
+
+class ReadVecInfo:
+    def __init__(self):
+        self.is_discovered = False
+        self.last_known_vec_idx = -1
+        self.last_read_vec_idx = -1
+
+
+class ReadStrmInfo:
+    def __init__(self):
+        self.is_discovered = False
+        self.last_known_strm_len = 0
+
+
 class ReadSnapshot:
     def __init__(self, lock_free_journal):
         self.lock_free_journal = lock_free_journal
@@ -5,21 +24,28 @@ class ReadSnapshot:
         self.last_known_highest_vec_num = 0
         self.read_strm_infos = []
         self.read_vec_infos = []
+        self.reader_id = lock_free_journal.metrics.register_reader() if lock_free_journal.metrics is not None else None
 
     def do_snapshot(self):
         new_highest_strm_num = self.lock_free_journal.on_disk_journal_hdr.get_highest_committed_strm_num()
         new_highest_vec_num = self.lock_free_journal.on_disk_journal_hdr.get_highest_committed_vec_num()
 
+        while len(self.read_vec_infos) <= new_highest_vec_num:
+            self.read_vec_infos.append(ReadVecInfo())
+        while len(self.read_strm_infos) <= new_highest_strm_num:
+            self.read_strm_infos.append(ReadStrmInfo())
+
         for vec_num in range(new_highest_vec_num + 1):
             read_vec_info = self.read_vec_infos[vec_num]
             if not read_vec_info.is_discovered:
                 vec_num_plus_1 = self.lock_free_journal.on_disk_journal_hdr.vec_infos[vec_num].vec_num_plus_1
                 if vec_num_plus_1 != 0:
-                    vec = self.lock_free_journal.get_vec(vec_num)
-                    vec.init(self.lock_free_journal, vec_num, vec.lock_free_journal.on_disk_journal_hdr.vec_infos[vec_num].vec_type, vec.lock_free_journal.on_disk_journal_hdr.vec_infos[vec_num].name, __PRETTY_FUNCTION__, True)
+                    vec = self.lock_free_journal.add_vec(vec_num)
+                    if vec.lock_free_journal is None:
+                        vec.init(self.lock_free_journal, vec_num, self.lock_free_journal.on_disk_journal_hdr.vec_infos[vec_num].vec_type, self.lock_free_journal.on_disk_journal_hdr.vec_infos[vec_num].name, "ReadSnapshot.do_snapshot", True)
                     read_vec_info.is_discovered = True
 
-            vec = self.lock_free_journal.vecs[vec_num]
+            vec = self.lock_free_journal.get_vec(vec_num)
             if vec and read_vec_info.is_discovered:
                 read_vec_info.last_known_vec_idx = vec.get_max_item_idx() - 1
 
@@ -28,31 +54,114 @@ class ReadSnapshot:
             if not read_strm_info.is_discovered:
                 strm_num_plus_1 = self.lock_free_journal.on_disk_journal_hdr.strm_infos[strm_num].strm_num_plus_1
                 if strm_num_plus_1 != 0:
-                    strm = self.lock_free_journal.get_strm(strm_num)
-                    strm.init(self.lock_free_journal, strm_num, strm.lock_free_journal.on_disk_journal_hdr.strm_infos[strm_num].name, strm.lock_free_journal.on_disk_journal_hdr.strm_infos[strm_num].strm_type, __PRETTY_FUNCTION__, True)
+                    strm = self.lock_free_journal.add_strm(strm_num)
+                    if not strm.is_initialized():
+                        strm.init(self.lock_free_journal, strm_num, self.lock_free_journal.on_disk_journal_hdr.strm_infos[strm_num].name, self.lock_free_journal.on_disk_journal_hdr.strm_infos[strm_num].strm_type, "ReadSnapshot.do_snapshot", True)
                     read_strm_info.is_discovered = True
 
-            strm = self.lock_free_journal.strms[strm_num]
+            strm = self.lock_free_journal.get_strm(strm_num)
             if strm and read_strm_info.is_discovered:
                 read_strm_info.last_known_strm_len = strm.get_committed_len()
 
+        if self.reader_id is not None:
+            lag_items = sum(read_vec_info.last_known_vec_idx - read_vec_info.last_read_vec_idx
+                            for read_vec_info in self.read_vec_infos if read_vec_info.is_discovered)
+            self.lock_free_journal.metrics.set_reader_lag(self.reader_id, lag_items)
+
     def scan_vec_up_to_timestamp(self, vec_num, timestamp, strm_committed_lengths, previous_strm_offsets):
         read_vec_info = self.read_vec_infos[vec_num]
         if not read_vec_info.is_discovered:
             return 0
 
-        total = 0
         vec = self.lock_free_journal.get_vec(vec_num)
-        for idx in range(read_vec_info.last_read_vec_idx + 1, read_vec_info.last_known_vec_idx + 1):
-            ts = vec.get_vec_item_timestamp(idx).get_milliseconds()
-            pos = vec.get_vec_item_pos(idx)
-            strm_off = pos.get_strm_off()
-            if ts == 0:
-                strm_off = previous_strm_offsets[pos.get_strm_num()]
-            if (ts > 0 and ts >= timestamp) or strm_off > strm_committed_lengths[pos.get_strm_num()]:
-                break
-            previous_strm_offsets[pos.get_strm_num()] = strm_off
-            total += 1
+        begin_idx = read_vec_info.last_read_vec_idx + 1
+        end_idx = vec.columns.seek_timestamp(self.to_timestamp_ns(timestamp), begin_idx, read_vec_info.last_known_vec_idx + 1)
+        total = self.count_committed_items(vec, begin_idx, end_idx, strm_committed_lengths, previous_strm_offsets)
 
         read_vec_info.last_read_vec_idx += total
         return total
+
+    def seek_vec_to_timestamp(self, vec_num, timestamp, strm_committed_lengths=None, previous_strm_offsets=None):
+        """
+        Moves the read cursor of vec_num so the next item read is the first one stamped at
+        or after timestamp (ms), e.g. to replay from 14:30. Uses the vec's sparse time index
+        instead of walking every item. If strm_committed_lengths is given the cursor stops
+        earlier at the first item whose stream data is not committed yet, as
+        scan_vec_up_to_timestamp does.
+        :return: Index of the next item to read.
+        """
+        read_vec_info = self.read_vec_infos[vec_num]
+        if not read_vec_info.is_discovered:
+            return 0
+
+        vec = self.lock_free_journal.get_vec(vec_num)
+        idx = vec.columns.seek_timestamp(self.to_timestamp_ns(timestamp), 0, read_vec_info.last_known_vec_idx + 1)
+        if strm_committed_lengths is not None:
+            if previous_strm_offsets is None:
+                previous_strm_offsets = [0] * len(strm_committed_lengths)
+            idx = self.count_committed_items(vec, 0, idx, strm_committed_lengths, previous_strm_offsets)
+
+        read_vec_info.last_read_vec_idx = idx - 1
+        return idx
+
+    @staticmethod
+    def to_timestamp_ns(timestamp):
+        # an item at ts_ns is at or after timestamp (ms) iff ts_ns >= ceil(timestamp * 1e6)
+        return int(math.ceil(timestamp * 1000000))
+
+    def count_committed_items(self, vec, begin_idx, end_idx, strm_committed_lengths, previous_strm_offsets):
+        """
+        Counts the items from begin_idx that can be read before the first one whose stream
+        data is beyond the committed length of its stream. An item with a zero timestamp is
+        checked at the offset of the previous item of its stream. previous_strm_offsets is
+        updated as the items are accepted.
+        """
+        if np is None:
+            total = 0
+            for idx in range(begin_idx, end_idx):
+                ts = vec.get_vec_item_timestamp(idx).get_milliseconds()
+                pos = vec.get_vec_item_pos(idx)
+                strm_off = pos.get_strm_off()
+                if ts == 0:
+                    strm_off = previous_strm_offsets[pos.get_strm_num()]
+                if strm_off > strm_committed_lengths[pos.get_strm_num()]:
+                    break
+                previous_strm_offsets[pos.get_strm_num()] = strm_off
+                total += 1
+            return total
+
+        total = 0
+        idx = begin_idx
+        while idx < end_idx:
+            stop = min(end_idx, idx + SCAN_WINDOW)
+            positions, timestamps, _ = vec.get_item_range(idx, stop)
+            cols = decode_pos_columns(positions)
+            n = stop - idx
+            cut = n
+            has_ts = timestamps != 0
+            strm_nums = [int(strm_num) for strm_num in np.unique(cols.strm_num)]
+            for strm_num in strm_nums:
+                committed_len = strm_committed_lengths[strm_num]
+                in_strm = cols.strm_num == strm_num
+                in_strm_with_ts = in_strm & has_ts
+                beyond = np.flatnonzero(in_strm_with_ts & (cols.strm_off > committed_len))
+                if len(beyond) > 0:
+                    cut = min(cut, int(beyond[0]))
+                if previous_strm_offsets[strm_num] > committed_len:
+                    # zero-timestamp items before the stream's first stamped one carry an offset that is already too far
+                    with_ts = np.flatnonzero(in_strm_with_ts)
+                    first_with_ts = int(with_ts[0]) if len(with_ts) > 0 else n
+                    without_ts = np.flatnonzero(in_strm & ~has_ts)
+                    if len(without_ts) > 0 and without_ts[0] < first_with_ts:
+                        cut = min(cut, int(without_ts[0]))
+
+            for strm_num in strm_nums:
+                accepted_with_ts = np.flatnonzero((cols.strm_num[:cut] == strm_num) & has_ts[:cut])
+                if len(accepted_with_ts) > 0:
+                    previous_strm_offsets[strm_num] = int(cols.strm_off[accepted_with_ts[-1]])
+
+            total += cut
+            if cut < n:
+                break
+            idx = stop
+        return total
@@ -0,0 +1,219 @@
+import heapq
+import multiprocessing
+import os
+import struct
+from multiprocessing import resource_tracker, shared_memory
+from persistance.lock_free_journal import LockFreeJournal
+from persistance.pos_array import np
+from persistance.rup_pos import Pos
+from persistance.rup_tx import Tx
+from persistance.tx_builder import TX_HDR, iter_tx_ops, read_tx_hdr
+from persistance.tx_merge import get_tx_strm_begin_off, get_tx_strms, iter_strm_txs, read_strm_bytes
+
+REPLAY_KEY = struct.Struct("<QI")  # global_tx_seq, op_idx within the tx
+SHARD_BYTES = 16 << 20
+
+# the journal a pool worker opened read-only, with the decoder it was given
+worker_lfj = None
+worker_decode = None
+worker_record_struct = None
+
+
+def split_tx_strm(strm, shard_bytes: int):
+    """
+    Cuts the committed txs of a TX stream into runs of about shard_bytes, walking only
+    the tx headers.
+    :return: [(begin_off, end_off)]
+    """
+    shards = []
+    strm_off = get_tx_strm_begin_off(strm)
+    end_off = strm.get_committed_len()
+    shard_begin_off = strm_off
+    while strm_off + TX_HDR.size <= end_off:
+        tx_len = read_tx_hdr(read_strm_bytes(strm, strm_off, TX_HDR.size))[1]
+        if tx_len < TX_HDR.size or strm_off + tx_len > end_off:
+            raise Exception(f"tx is cut or corrupt; strm_num={strm.get_strm_num()}, strm_off={strm_off}, tx_len={tx_len}, end_off={end_off}")
+        strm_off += tx_len
+        if strm_off - shard_begin_off >= shard_bytes:
+            shards.append((shard_begin_off, strm_off))
+            shard_begin_off = strm_off
+    if strm_off > shard_begin_off:
+        shards.append((shard_begin_off, strm_off))
+    return shards
+
+
+def init_worker(lfj_name: str, decode, record_format: str):
+    global worker_lfj, worker_decode, worker_record_struct
+    worker_lfj = LockFreeJournal()
+    if worker_lfj.open(lfj_name, False, False, enable_metrics=False) is None:
+        raise Exception(f"journal does not exist; lfj_name={lfj_name}")
+    worker_decode = decode
+    worker_record_struct = struct.Struct(record_format)
+
+
+def replay_shard(strm_num: int, begin_off: int, end_off: int):
+    """
+    Decodes the txs of one shard in a pool worker. OP_SET_VEC_ITEM data is located
+    through the worker's own mappings of the data streams and handed to the decoder as
+    zero-copy views. The compact records go back through a shared memory block the
+    parent unlinks after merging.
+    :return: (shared memory name, number of records)
+    """
+    lfj = worker_lfj
+    decode = worker_decode
+    record_struct = worker_record_struct
+    record_size = REPLAY_KEY.size + record_struct.size
+    out = bytearray()
+    num_records = 0
+    for global_tx_seq, _, _, tx in iter_strm_txs(lfj.get_strm(strm_num), begin_off, end_off):
+        for op_idx, (op_code, fields) in enumerate(iter_tx_ops(tx)):
+            if op_code == Tx.OP_SET_VEC_ITEM:
+                pos = fields[2]
+                data_1, data_2 = lfj.get_strm((pos >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK).locate_data(
+                    pos & Pos.STRM_OFF_MASK, (pos >> Pos.LEN_SHIFT) & Pos.LEN_MASK, "replay_shard")
+                record = decode(op_code, fields, data_1, data_2)
+                del data_1, data_2
+            elif op_code == Tx.OP_STORE_MULTI_ORDER_DATA:
+                record = decode(op_code, fields, fields[1], None)
+            else:
+                record = decode(op_code, fields, None, None)
+            if record is None:
+                continue
+            out += REPLAY_KEY.pack(global_tx_seq, op_idx)
+            out += record_struct.pack(*record)
+            num_records += 1
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, num_records * record_size))
+    shm.buf[:len(out)] = out
+    # the parent owns the block from here and unlinks it once merged
+    resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+    return shm.name, num_records
+
+
+class ReplayResult:
+    """
+    Replayed records in tx order: by global_tx_seq, then op order within the tx.
+
+    records is a NumPy structured array (global_tx_seq, op_idx, record) whose record
+    field holds the raw record_struct bytes, or a list of (global_tx_seq, op_idx,
+    record bytes) tuples when NumPy is not installed. Iterating yields
+    (global_tx_seq, op_idx, record tuple).
+    """
+
+    def __init__(self, record_struct, records):
+        self.record_struct = record_struct
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        unpack = self.record_struct.unpack
+        if np is not None:
+            for global_tx_seq, op_idx, record in self.records:
+                yield int(global_tx_seq), int(op_idx), unpack(bytes(record))
+        else:
+            for global_tx_seq, op_idx, record in self.records:
+                yield global_tx_seq, op_idx, unpack(record)
+
+
+def replay_journal(lfj_name: str, decode, record_format: str, num_workers: int = None, shard_bytes: int = SHARD_BYTES,
+                   mp_context=None) -> ReplayResult:
+    """
+    Replays every committed tx of a journal on a multiprocessing pool.
+
+    The TX streams are cut into shards of about shard_bytes of whole txs. Each worker
+    opens the journal read-only once and decodes its shards with
+    decode(op_code, fields, data_1, data_2), where fields are those of
+    tx_builder.iter_tx_ops() and the data views are the message of an
+    OP_SET_VEC_ITEM or the payload of an OP_STORE_MULTI_ORDER_DATA (None otherwise).
+    decode returns a tuple packed with record_format, or None to skip the op; it must
+    be picklable (a module-level function). The records come back through shared
+    memory and are merged in tx order; a TX stream's txs are already in global_tx_seq
+    order, so the parent only sorts across shards.
+
+    :param num_workers: Pool size; defaults to the number of CPUs. 0 decodes in this process.
+    :param mp_context: multiprocessing context for the pool; the default start method when None.
+    """
+    lfj = LockFreeJournal()
+    if lfj.open(lfj_name, False, False, enable_metrics=False) is None:
+        raise Exception(f"journal does not exist; lfj_name={lfj_name}")
+    try:
+        shards = [(strm.get_strm_num(), begin_off, end_off)
+                  for strm in get_tx_strms(lfj) for begin_off, end_off in split_tx_strm(strm, shard_bytes)]
+    finally:
+        lfj.close()
+
+    num_workers = (os.cpu_count() or 1) if num_workers is None else num_workers
+    if num_workers == 0:
+        init_worker(lfj_name, decode, record_format)
+        try:
+            results = [replay_shard(*shard) for shard in shards]
+        finally:
+            worker_lfj.close()
+    else:
+        mp_context = multiprocessing.get_context() if mp_context is None else mp_context
+        with mp_context.Pool(min(num_workers, max(1, len(shards))), initializer=init_worker, initargs=(lfj_name, decode, record_format)) as pool:
+            async_results = [pool.apply_async(replay_shard, shard) for shard in shards]
+            results = []
+            error = None
+            for async_result in async_results:
+                try:
+                    results.append(async_result.get())
+                except Exception as ex:
+                    error = error or ex
+            if error is not None:
+                for shm_name, _ in results:
+                    unlink_shm(shm_name)
+                raise error
+
+    return merge_replay_results(results, struct.Struct(record_format))
+
+
+def get_replay_dtype(record_struct):
+    return np.dtype([("global_tx_seq", "<u8"), ("op_idx", "<u4"), ("record", f"V{record_struct.size}")])
+
+
+def unlink_shm(shm_name: str):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    shm.close()
+    shm.unlink()
+
+
+def read_replay_records(data, num_records: int, record_struct):
+    record_size = REPLAY_KEY.size + record_struct.size
+    if np is not None:
+        return np.frombuffer(data, dtype=get_replay_dtype(record_struct), count=num_records).copy()
+    records = []
+    for off in range(0, num_records * record_size, record_size):
+        global_tx_seq, op_idx = REPLAY_KEY.unpack_from(data, off)
+        records.append((global_tx_seq, op_idx, bytes(data[off + REPLAY_KEY.size:off + record_size])))
+    return records
+
+
+def merge_replay_results(results, record_struct) -> ReplayResult:
+    """
+    Collects the shared memory blocks of replay_shard() in tx order, unlinking each one
+    once copied out.
+    """
+    parts = []
+    for idx, (shm_name, num_records) in enumerate(results):
+        try:
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                parts.append(read_replay_records(shm.buf, num_records, record_struct))
+            finally:
+                shm.close()
+                shm.unlink()
+        except Exception:
+            for later_shm_name, _ in results[idx + 1:]:
+                unlink_shm(later_shm_name)
+            raise
+
+    if np is not None:
+        records = np.concatenate(parts) if parts else np.zeros(0, dtype=get_replay_dtype(record_struct))
+        records = records[np.lexsort((records["op_idx"], records["global_tx_seq"]))]
+    else:
+        records = list(heapq.merge(*parts, key=lambda record: (record[0], record[1])))
+    return ReplayResult(record_struct, records)
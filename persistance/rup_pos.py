@@ -1,19 +1,42 @@
+SEG_SIZE_SHIFT = 22
+SEG_SIZE_MASK = (1 << SEG_SIZE_SHIFT) - 1
+
+
 class Pos:
+    # strm_off is the low 36 bits: seg_off in bits 0-21, seg_num in bits 22-35
     SEG_OFF_SHIFT = 0
-    SEG_OFF_MASK = LockFreeJournal.SEG_SIZE_MASK
-    SEG_NUM_SHIFT = SEG_OFF_SHIFT + 14
-    SEG_NUM_MASK = LockFreeJournal.SEG_NUM_MASK
+    SEG_OFF_MASK = SEG_SIZE_MASK
+    SEG_NUM_SHIFT = SEG_OFF_SHIFT + SEG_SIZE_SHIFT
+    SEG_NUM_MASK = 0x00003fff
     STRM_OFF_SHIFT = 0
-    STRM_OFF_MASK = LockFreeJournal.STRM_OFF_MASK
+    STRM_OFF_MASK = (1 << 36) - 1
     STRM_NUM_SHIFT = STRM_OFF_SHIFT + 36
-    STRM_NUM_MASK = LockFreeJournal.STRM_NUM_MASK
+    STRM_NUM_MASK = 0x000003ff
     LEN_SHIFT = STRM_NUM_SHIFT + 10
     LEN_MASK = 0x0001ffff
     FLAG_SHIFT = 63
     FLAG_MASK = 0x01
 
-    def __init__(self):
-        self.strm_num_seg_num_seg_off = 0
+    # positions are normally kept as packed uint64 (see vec_columns.VecColumns and pos_array.decode_pos_columns); a Pos is only a view over one
+    __slots__ = ("strm_num_seg_num_seg_off",)
+
+    def __init__(self, strm_num: int = 0, strm_off: int = 0, length: int = 0, flag: int = 0):
+        self.strm_num_seg_num_seg_off = (((strm_off & self.STRM_OFF_MASK) << self.STRM_OFF_SHIFT)
+                                         | ((strm_num & self.STRM_NUM_MASK) << self.STRM_NUM_SHIFT)
+                                         | ((length & self.LEN_MASK) << self.LEN_SHIFT)
+                                         | ((flag & self.FLAG_MASK) << self.FLAG_SHIFT))
+
+    @staticmethod
+    def from_uint64(value: int) -> 'Pos':
+        pos = Pos.__new__(Pos)
+        pos.strm_num_seg_num_seg_off = value
+        return pos
+
+    def to_uint64(self) -> int:
+        return self.strm_num_seg_num_seg_off
+
+    def get_calibrated_pos(self, offset: int, length: int) -> 'Pos':
+        return Pos(self.get_strm_num(), self.get_strm_off() + offset, length, self.get_flag())
 
     def get_strm_num(self) -> int:
         return (self.strm_num_seg_num_seg_off >> self.STRM_NUM_SHIFT) & self.STRM_NUM_MASK
@@ -61,9 +84,12 @@ class Pos:
     def __ge__(self, other):
         return not self.__lt__(other)
 
+    def __hash__(self):
+        return hash(self.strm_num_seg_num_seg_off)
+
     def __repr__(self):
         return f"Pos({self.strm_num_seg_num_seg_off})"
 
     @staticmethod
     def get_max_len() -> int:
-        return LockFreeJournal.Pos.LEN_MASK
+        return Pos.LEN_MASK
@@ -10,6 +10,7 @@ class Tx:
     OP_SET_VEC_STRM_NUM = 8
     OP_SET_AUX_POS = 9
     OP_STORE_MULTI_ORDER_DATA = 10
+    OP_PATCH_MSG = 11
 
     def __init__(self, tx_strm):
         self.tx_strm = tx_strm
@@ -17,7 +18,12 @@ class Tx:
     def setup(self, caller):
         pass
 
-    def commit(self):
+    def commit(self, wait_durable=False):
+        """
+        Publishes the tx by raising the tx stream's committed_len.
+        :param wait_durable: Return only once the tx (and everything committed before it)
+                             has been msync'ed by the journal's durability policy.
+        """
         if self.tx_strm is None:
             raise Exception("tx_strm should not be None")
 
@@ -27,7 +33,13 @@ class Tx:
         tx_strm_num = tx_strm.get_strm_num()
         on_disk_tx_strm_info = on_disk_journal_hdr.strm_infos[tx_strm_num]
         tx_valid_len = on_disk_tx_strm_info.valid_len.get()
+        num_bytes = tx_valid_len - on_disk_tx_strm_info.committed_len.get()
         on_disk_tx_strm_info.committed_len.set(tx_valid_len)
+        lfj.durability.note_commit(tx_strm, num_bytes)
+        lfj.ring_doorbell()
+
+        if wait_durable:
+            lfj.wait_durable()
 
     class OpCreateStrm:
         @staticmethod
@@ -113,5 +125,7 @@ class Tx:
             return "OP_SET_AUX_POS"
         elif op_code == Tx.OP_STORE_MULTI_ORDER_DATA:
             return "OP_STORE_MULTI_ORDER_DATA"
+        elif op_code == Tx.OP_PATCH_MSG:
+            return "OP_PATCH_MSG"
         else:
             return f"<Unknown op code: {op_code}>"
@@ -1,36 +1,161 @@
+import struct
+from persistance.msg_patch import PatchOverlay
+from persistance.ondisk_journal_hdr import MAX_VEC_NAME_LEN
+from persistance.pos_array import decode_pos_columns, np
+from persistance.rup_pos import Pos
+from persistance.vec_columns import VecColumns, VecItem
+from utils.timestamp import Timestamp
+
+
+class AuxTagsStatus:
+    AuxTagsReady = 0
+    AuxTagsNotReady = 1
+    AuxTagsError = 2
+    AuxTagsNone = 3
+
+
 class Vec:
     def __init__(self):
         self.lock_free_journal = None
         self.on_disk_vec_info = None
-
-    def init(self, lock_free_journal, vec_num, vec_type, vec_name, caller, is_recovery):
+        self.columns = None
+        # items below it are known to have their stream data committed; only ever raised
+        self.committed_item_count = 0
+        self.patch_overlay = None
+
+    def init(self, lock_free_journal, vec_num, vec_type, vec_name, caller, is_recovery, **vec_attrs):
+        """
+        :param vec_attrs: Extra fields of a new vec's header record (see OnDiskVecInfo.init), and
+                          has_seq_num (default True): whether the vec keeps a seq_num column,
+                          which flag ops (TxBuilder.set_item_pos_flag()) look items up in.
+        """
         if vec_name is None or len(vec_name) > MAX_VEC_NAME_LEN:
             raise Exception(f"vec_name should not be null or longer than {MAX_VEC_NAME_LEN} characters; vec_name={vec_name}, caller={caller}")
 
         if self.lock_free_journal is not None or self.on_disk_vec_info is not None:
             raise Exception(f"Vec is already initialized; vec_name={vec_name}, caller={caller}")
 
+        # items live in mapped column files, so recovery just maps them instead of rebuilding a list;
+        # a new vec's columns are created before its record is published, so a reader finding the
+        # record always finds them
+        has_seq_num = None if is_recovery else vec_attrs.pop("has_seq_num", True)
+        self.columns = VecColumns(f"{lock_free_journal.lfj_name}/{vec_name}", lock_free_journal.is_writeable, has_seq_num,
+                                  prefault=lock_free_journal.prefault_segs)
         self.lock_free_journal = lock_free_journal
-        self.on_disk_vec_info = lock_free_journal.on_disk_journal_hdr.vec_infos[vec_num] if is_recovery else None
+        if not is_recovery and lock_free_journal.is_writeable:
+            with lock_free_journal.num_alloc_mutex:
+                lock_free_journal.on_disk_journal_hdr.init_vec_info(vec_num, vec_name, vec_type, **vec_attrs)
+        self.on_disk_vec_info = lock_free_journal.on_disk_journal_hdr.vec_infos[vec_num]
 
-    def get_vec_item(self, idx):
-        # Implementation of get_vec_item function
-        pass
+    def close(self):
+        self.patch_overlay = None
+        if self.columns is not None:
+            self.columns.close()
+            self.columns = None
+
+    def get_vec_num(self) -> int:
+        return self.on_disk_vec_info.vec_num_plus_1 - 1
+
+    def get_max_item_idx(self):
+        return self.columns.get_num_items()
 
-    def get_item_data_by_idx(self, idx, data_1, len_1, data_2, len_2):
-        # Implementation of get_item_data_by_idx function
-        pass
+    def append_item(self, pos, timestamp_ns, seq_num=0):
+        idx = self.columns.append(pos.to_uint64() if isinstance(pos, Pos) else pos, timestamp_ns, seq_num)
+        self.lock_free_journal.ring_doorbell()
+        return idx
+
+    def get_vec_item(self, idx):
+        if idx >= self.columns.get_num_items():
+            return None
+        item = self.columns.get_item(idx)
+        return VecItem(Pos.from_uint64(item.pos), item.timestamp_ns, item.seq_num)
+
+    def get_item_range(self, begin_idx, end_idx):
+        """
+        Returns (pos, timestamp_ns, seq_num) NumPy arrays for items [begin_idx, end_idx).
+        """
+        return self.columns.get_range(begin_idx, end_idx)
+
+    def get_item_data_by_idx(self, idx):
+        pos = self.get_vec_item_pos(idx)
+        if pos is None or pos.is_null():
+            return None, None
+        return self.lock_free_journal.locate_data_by_pos(pos)
 
     def get_vec_item_pos(self, idx):
-        # Implementation of get_vec_item_pos function
-        pass
+        if idx >= self.columns.get_num_items():
+            return None
+        return Pos.from_uint64(self.columns.pos.get(idx))
+
+    def decode_item_positions(self, begin_idx, end_idx):
+        """
+        Decodes the positions of items [begin_idx, end_idx) into PosColumns in one pass.
+        """
+        end_idx = min(end_idx, self.columns.get_num_items())
+        begin_idx = min(begin_idx, end_idx)
+        if np is not None:
+            return decode_pos_columns(self.columns.pos.view(begin_idx, end_idx))
+        return decode_pos_columns(memoryview(b"".join(self.columns.pos.chunks(begin_idx, end_idx))).cast('Q'))
+
+    def get_materialized(self, idx):
+        """
+        The message of item idx with every patch item of it applied (see msg_patch): a
+        zero-copy read-only view of the stream when it has none, else a read-only view of
+        a buffer kept in the vec's LRU of materialized items, so re-reading a hot item
+        does not reapply its patches. None if there is no item idx.
+        """
+        if self.patch_overlay is None:
+            self.patch_overlay = PatchOverlay(self)
+        return self.patch_overlay.get_materialized(idx)
 
     def get_vec_item_timestamp(self, idx):
-        # Implementation of get_vec_item_timestamp function
-        pass
+        if idx >= self.columns.get_num_items():
+            return None
+        ts_ns = self.columns.ts.get(idx)
+        return Timestamp(ts_ns // 1000000000, ts_ns % 1000000000)
+
+    def get_committed_item_count(self) -> int:
+        """
+        The number of leading items whose stream data is committed, found with the hop
+        slices (see VecColumns) from the previous answer, so a reader polling it as the
+        vec grows pays O(1) amortized per item. Items past the first one on another
+        stream than the hop stream are checked one by one.
+        """
+        columns = self.columns
+        idx = self.committed_item_count
+        hop_end_idx = columns.get_hop_end_idx()
+        hop_strm_num = columns.get_hop_strm_num()
+        if hop_strm_num >= 0 and idx < hop_end_idx:
+            hop_strm = self.lock_free_journal.get_strm(hop_strm_num)
+            if hop_strm is not None:
+                idx = columns.seek_hop_end_off(hop_strm.get_committed_len(), idx, hop_end_idx)
+        if hop_strm_num < 0 or idx >= hop_end_idx:
+            num_items = columns.get_num_items()
+            while idx < num_items and self.is_item_data_committed(idx):
+                idx += 1
+        self.committed_item_count = idx
+        return idx
+
+    def is_item_data_committed(self, idx) -> bool:
+        pos = self.columns.pos.get(idx)
+        if pos == 0:
+            return True
+        strm = self.lock_free_journal.get_strm((pos >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK)
+        return strm is not None and (pos & Pos.STRM_OFF_MASK) + ((pos >> Pos.LEN_SHIFT) & Pos.LEN_MASK) <= strm.get_committed_len()
+
+    def is_vec_item_strm_committed(self, idx) -> bool:
+        """
+        Whether item idx exists and its stream data is committed; O(1) for the items below
+        get_committed_item_count(), which loops asking this per item keep advancing.
+        """
+        if idx < self.committed_item_count:
+            return True
+        if idx >= self.columns.get_num_items():
+            return False
+        return idx < self.get_committed_item_count() or self.is_item_data_committed(idx)
 
     def is_aux_tags_committed(self, idx):
-        if not self.on_disk_vec_info.is_vec_item_strm_committed(self.lock_free_journal, idx):
+        if not self.is_vec_item_strm_committed(idx):
             return AuxTagsStatus.AuxTagsNotReady
 
         item = self.get_vec_item(idx)
@@ -42,28 +167,30 @@ class Vec:
         strm = self.lock_free_journal.get_strm(aux_len_pos.get_strm_num())
         committed_strm_len = strm.get_committed_len()
 
-        if aux_len_pos.get_strm_off() > committed_strm_len:
+        if aux_len_pos.get_strm_off() + 4 > committed_strm_len:
             return AuxTagsStatus.AuxTagsNotReady
 
-        data_1, data_2 = None, None
-        msg_len_1, msg_len_2 = 0, 0
-        self.lock_free_journal.locate_data_by_pos(aux_len_pos, data_1, msg_len_1, data_2, msg_len_2)
-        aux_len = self.get_uint32_from(data_1, msg_len_1, data_2, msg_len_2)
+        data_1, data_2 = self.lock_free_journal.locate_data_by_pos(aux_len_pos)
+        aux_len = self.get_uint32_from(data_1, data_2)
 
         if aux_len == 0:
             return AuxTagsStatus.AuxTagsNone
-        if aux_len > self.Pos.LEN_MASK:
+        if aux_len > Pos.LEN_MASK:
             return AuxTagsStatus.AuxTagsError
         if aux_len + aux_len_pos.get_strm_off() > committed_strm_len:
             return AuxTagsStatus.AuxTagsNotReady
 
         return AuxTagsStatus.AuxTagsReady
 
-    def get_uint32_from(self, data_1, msg_len_1, data_2, msg_len_2):
+    def get_uint32_from(self, data_1, data_2):
+        msg_len_1 = len(data_1)
+        msg_len_2 = len(data_2) if data_2 is not None else 0
         if msg_len_1 + msg_len_2 != 4:
             raise Exception("parse data length is greater than 4")
         if msg_len_2 == 0:
-            return struct.unpack('I', data_1)[0]
+            return struct.unpack_from('I', data_1)[0]
 
-        buf = data_1 + data_2
-        return struct.unpack('I', buf)[0]
+        buf = bytearray(4)
+        buf[:msg_len_1] = data_1
+        buf[msg_len_1:] = data_2
+        return struct.unpack_from('I', buf)[0]
@@ -0,0 +1,366 @@
+import os
+import mmap
+import time
+import threading
+from collections import OrderedDict, namedtuple
+
+SEG_SIZE_SHIFT = 22
+SEG_SIZE = 1 << SEG_SIZE_SHIFT
+
+SegLruStats = namedtuple("SegLruStats", ["hits", "misses", "evictions", "mapped_segs", "mapped_bytes"])
+
+
+class SegMapper:
+    """
+    Maps fixed-size segments of a stream file with one mmap per segment.
+
+    The file is grown with posix_fallocate (ftruncate where fallocate is not
+    available) before a segment is mapped. Pages can be pre-faulted with
+    MAP_POPULATE/MADV_WILLNEED, and in write mode a background thread keeps the
+    segment following the last one handed out grown, mapped and faulted in, so a
+    writer crossing a segment boundary picks up a warm mapping instead of waiting
+    on file growth and page faults.
+
+    With an overlap, every segment's mmap also covers the first overlap bytes of the
+    next segment, so a message starting near the end of a segment can be written and
+    read through one contiguous view instead of being split or copied via the heap.
+    Both mappings are MAP_SHARED views of the same file pages, so bytes written
+    through the overlap window are the next segment's bytes.
+    """
+
+    def __init__(self, fd: int, is_writeable: bool, prefault: bool = True, keep_spare: bool = True, seg_size: int = SEG_SIZE,
+                 overlap: int = 0):
+        """
+        :param fd: File descriptor of the stream file.
+        :param is_writeable: Map segments read-write and allow growing the file.
+        :param prefault: Pre-fault the pages of every newly mapped segment.
+        :param keep_spare: Keep the next segment pre-allocated and mapped ahead of the writer.
+        :param seg_size: Segment size in bytes; must be a multiple of mmap.ALLOCATIONGRANULARITY.
+        :param overlap: Bytes of the next segment mapped past the end of each segment; a
+                        multiple of mmap.PAGESIZE, at most seg_size.
+        """
+        if seg_size % mmap.ALLOCATIONGRANULARITY != 0:
+            raise Exception(f"seg_size should be a multiple of {mmap.ALLOCATIONGRANULARITY}; seg_size={seg_size}")
+        if overlap < 0 or overlap > seg_size or overlap % mmap.PAGESIZE != 0:
+            raise Exception(f"overlap should be a multiple of {mmap.PAGESIZE} no larger than seg_size; overlap={overlap}, seg_size={seg_size}")
+
+        self.fd = fd
+        self.is_writeable = is_writeable
+        self.prefault = prefault
+        self.keep_spare = keep_spare and is_writeable
+        self.seg_size = seg_size
+        self.overlap = overlap
+        self.file_size = os.fstat(fd).st_size
+        self.file_size_lock = threading.Lock()
+
+        self.spare_cond = threading.Condition()
+        self.spare_seg_num = -1
+        self.spare_seg_data = None
+        self.spare_requested_seg_num = -1
+        self.spare_in_progress = False
+        self.spare_error = None
+        self.spare_thread = None
+        self.is_closed = False
+
+    def get_file_size(self) -> int:
+        return self.file_size
+
+    def ensure_file_size(self, size: int):
+        """
+        Grows the stream file to at least size bytes. The file never shrinks.
+        """
+        if size <= self.file_size:
+            return
+
+        with self.file_size_lock:
+            if size <= self.file_size:
+                return
+            if not self.is_writeable:
+                raise Exception(f"Cannot grow a read-only stream file; file_size={self.file_size}, size={size}")
+            if hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(self.fd, self.file_size, size - self.file_size)
+                except OSError:
+                    os.ftruncate(self.fd, size)
+            else:
+                os.ftruncate(self.fd, size)
+            self.file_size = size
+
+    def map_seg(self, seg_num: int, create_if_needed: bool, caller: str) -> mmap.mmap:
+        """
+        Returns a new mapping of seg_num, taking over the spare segment when it matches.
+
+        :param seg_num: Segment number to map.
+        :param create_if_needed: Grow the file if the segment lies beyond its end.
+        :param caller: Name of the calling function, used in error messages.
+        :return: The mmap of the segment, or None if the segment does not exist and create_if_needed is False.
+        """
+        seg_data = self.take_spare(seg_num)
+        if seg_data is None:
+            seg_data = self.map_seg_(seg_num, create_if_needed, caller)
+            if seg_data is None:
+                return None
+
+        if self.keep_spare and create_if_needed:
+            self.request_spare(seg_num + 1)
+        return seg_data
+
+    def map_seg_(self, seg_num: int, create_if_needed: bool, caller: str) -> mmap.mmap:
+        seg_end = (seg_num + 1) * self.seg_size
+        if seg_end + self.overlap > self.file_size:
+            if not create_if_needed or not self.is_writeable:
+                self.file_size = max(self.file_size, os.fstat(self.fd).st_size)
+                if seg_end > self.file_size:
+                    return None
+            else:
+                # bytes written through the overlap window belong to the next segment, which a
+                # reader maps on its own, so it is allocated whole
+                self.ensure_file_size(seg_end + (self.seg_size if self.overlap else 0))
+        # the last segment of a file written without an overlap is mapped without one
+        map_len = min(self.seg_size + self.overlap, self.file_size - seg_num * self.seg_size)
+
+        flags = mmap.MAP_SHARED
+        if self.prefault and hasattr(mmap, "MAP_POPULATE"):
+            flags |= mmap.MAP_POPULATE
+        prot = mmap.PROT_READ | mmap.PROT_WRITE if self.is_writeable else mmap.PROT_READ
+
+        try:
+            seg_data = mmap.mmap(self.fd, map_len, flags=flags, prot=prot, offset=seg_num * self.seg_size)
+        except OSError as e:
+            raise Exception(f"mmap() failed; seg_num={seg_num}, errno={e.errno} {e.strerror}, caller={caller}")
+
+        if self.prefault and hasattr(mmap, "MADV_WILLNEED"):
+            seg_data.madvise(mmap.MADV_WILLNEED)
+        return seg_data
+
+    def request_spare(self, seg_num: int):
+        """
+        Asks the spare thread to have seg_num grown and mapped before the writer reaches it.
+        """
+        with self.spare_cond:
+            if self.is_closed or seg_num == self.spare_seg_num or seg_num == self.spare_requested_seg_num:
+                return
+            self.spare_requested_seg_num = seg_num
+            if self.spare_thread is None:
+                self.spare_thread = threading.Thread(target=self.run_spare_thread, name=f"SegMapper-spare-{self.fd}", daemon=True)
+                self.spare_thread.start()
+            self.spare_cond.notify_all()
+
+    def map_spare_now(self, seg_num: int, caller: str):
+        """
+        Grows and maps seg_num on the calling thread and keeps it as the spare, so the
+        first map_seg(seg_num) takes it over without waiting. The spare thread is started
+        here too, so that first map_seg() does not pay for a thread start either.
+        """
+        if not self.keep_spare:
+            self.ensure_file_size((seg_num + 1) * self.seg_size)
+            return
+        seg_data = self.map_seg_(seg_num, True, caller)
+        with self.spare_cond:
+            if self.spare_seg_data is not None:
+                self.spare_seg_data.close()
+            self.spare_seg_data = seg_data
+            self.spare_seg_num = seg_num
+            if self.spare_thread is None:
+                self.spare_thread = threading.Thread(target=self.run_spare_thread, name=f"SegMapper-spare-{self.fd}", daemon=True)
+                self.spare_thread.start()
+
+    def take_spare(self, seg_num: int) -> mmap.mmap:
+        """
+        Hands over the spare mapping if it is for seg_num; waits for it if it is still being prepared.
+        """
+        if not self.keep_spare:
+            return None
+
+        with self.spare_cond:
+            while self.spare_in_progress and self.spare_requested_seg_num == seg_num:
+                self.spare_cond.wait()
+
+            if self.spare_seg_num != seg_num:
+                return None
+
+            seg_data = self.spare_seg_data
+            self.spare_seg_data = None
+            self.spare_seg_num = -1
+            return seg_data
+
+    def run_spare_thread(self):
+        while True:
+            with self.spare_cond:
+                while not self.is_closed and (self.spare_requested_seg_num < 0 or self.spare_requested_seg_num == self.spare_seg_num):
+                    self.spare_cond.wait()
+                if self.is_closed:
+                    return
+                seg_num = self.spare_requested_seg_num
+                old_spare = self.spare_seg_data
+                self.spare_seg_data = None
+                self.spare_seg_num = -1
+                self.spare_in_progress = True
+
+            if old_spare is not None:
+                old_spare.close()
+
+            seg_data = None
+            try:
+                seg_data = self.map_seg_(seg_num, True, "SegMapper.run_spare_thread")
+            except Exception as ex:
+                self.spare_error = ex
+
+            with self.spare_cond:
+                self.spare_in_progress = False
+                if self.is_closed or seg_num != self.spare_requested_seg_num:
+                    if seg_data is not None:
+                        seg_data.close()
+                else:
+                    self.spare_seg_data = seg_data
+                    self.spare_seg_num = seg_num if seg_data is not None else -1
+                    self.spare_requested_seg_num = -1
+                self.spare_cond.notify_all()
+
+    def close(self):
+        with self.spare_cond:
+            self.is_closed = True
+            self.spare_cond.notify_all()
+            while self.spare_in_progress:
+                self.spare_cond.wait()
+            if self.spare_seg_data is not None:
+                self.spare_seg_data.close()
+            self.spare_seg_data = None
+            self.spare_seg_num = -1
+
+        if self.spare_thread is not None:
+            self.spare_thread.join()
+            self.spare_thread = None
+
+
+class SegLru:
+    """
+    Bounds the segments a journal keeps mapped, by count and/or bytes, evicting the
+    least recently used ones. A segment is only unmapped when its unmap() succeeds,
+    i.e. no memoryview handed out over it is still alive; a pinned segment stays
+    mapped (and over budget) until a later eviction finds it free.
+
+    Entries are objects with seg_data and unmap() (LockFreeJournal.Seg). Eviction
+    happens on a miss, from the thread that maps. The LRU itself is guarded by lock,
+    as recovery maps the streams from a thread pool, but each stream should still be
+    read from one thread at a time.
+    """
+
+    def __init__(self, max_segs: int = None, max_bytes: int = None):
+        """
+        :param max_segs: Most segments kept mapped; unbounded when None.
+        :param max_bytes: Most bytes kept mapped; unbounded when None.
+        """
+        self.max_segs = max_segs
+        self.max_bytes = max_bytes
+        self.segs = OrderedDict()
+        self.mapped_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def touch(self, seg):
+        with self.lock:
+            self.hits += 1
+            if seg in self.segs:
+                self.segs.move_to_end(seg)
+
+    def add(self, seg):
+        """
+        Records a newly mapped segment (a miss), then evicts cold segments over budget.
+        """
+        with self.lock:
+            self.misses += 1
+            self.segs[seg] = len(seg.seg_data)
+            self.mapped_bytes += self.segs[seg]
+            self.evict_(seg)
+
+    def is_over_budget(self) -> bool:
+        return ((self.max_segs is not None and len(self.segs) > self.max_segs)
+                or (self.max_bytes is not None and self.mapped_bytes > self.max_bytes))
+
+    def evict_(self, keep):
+        for seg in list(self.segs):
+            if not self.is_over_budget():
+                break
+            if seg is keep or not seg.unmap():
+                continue
+            self.mapped_bytes -= self.segs.pop(seg)
+            self.evictions += 1
+
+    def discard(self, seg):
+        with self.lock:
+            size = self.segs.pop(seg, None)
+            if size is not None:
+                self.mapped_bytes -= size
+
+    def get_stats(self) -> SegLruStats:
+        return SegLruStats(self.hits, self.misses, self.evictions, len(self.segs), self.mapped_bytes)
+
+
+def bench_append_latency(path: str, keep_spare: bool, prefault: bool = True, num_segs: int = 16, msg_len: int = 256):
+    """
+    Appends msg_len-byte messages across num_segs segment rollovers and returns
+    (p50, p99, p99 of rollover appends) append latency in microseconds.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    mapper = SegMapper(fd, True, prefault=prefault, keep_spare=keep_spare)
+    msg = b"x" * msg_len
+    segs = []
+    latencies = []
+    rollover_latencies = []
+
+    try:
+        seg_data = None
+        seg_num = -1
+        strm_off = 0
+        end_off = num_segs * SEG_SIZE
+        while strm_off + msg_len <= end_off:
+            begin = time.perf_counter_ns()
+            cur_seg_num = strm_off >> SEG_SIZE_SHIFT
+            is_rollover = cur_seg_num != seg_num and seg_num >= 0
+            if cur_seg_num != seg_num:
+                seg_num = cur_seg_num
+                seg_data = mapper.map_seg(seg_num, True, "bench_append_latency")
+                segs.append(seg_data)
+            seg_off = strm_off & (SEG_SIZE - 1)
+            n = min(msg_len, SEG_SIZE - seg_off)
+            seg_data[seg_off:seg_off + n] = msg[:n]
+            if n < msg_len:
+                is_rollover = True
+                seg_num += 1
+                seg_data = mapper.map_seg(seg_num, True, "bench_append_latency")
+                segs.append(seg_data)
+                seg_data[:msg_len - n] = msg[n:]
+            strm_off += msg_len
+            latency = time.perf_counter_ns() - begin
+            latencies.append(latency)
+            if is_rollover:
+                rollover_latencies.append(latency)
+            if len(latencies) % 64 == 0:
+                # let the spare thread run, as a writer waiting on the network would
+                time.sleep(0)
+    finally:
+        mapper.close()
+        for seg in segs:
+            seg.close()
+        os.close(fd)
+        os.unlink(path)
+
+    latencies.sort()
+    rollover_latencies.sort()
+    return (latencies[len(latencies) // 2] / 1000.0,
+            latencies[len(latencies) * 99 // 100] / 1000.0,
+            rollover_latencies[len(rollover_latencies) * 99 // 100] / 1000.0)
+
+
+# Example usage
+if __name__ == "__main__":
+    import tempfile
+
+    bench_dir = tempfile.mkdtemp()
+    for keep_spare in (False, True):
+        p50, p99, rollover_p99 = bench_append_latency(os.path.join(bench_dir, "bench_strm"), keep_spare)
+        print(f"keep_spare={keep_spare}: p50={p50:.2f}us p99={p99:.2f}us rollover_p99={rollover_p99:.2f}us")
+    os.rmdir(bench_dir)
@@ -0,0 +1,226 @@
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from crc32c import crc32c
+except ImportError:
+    crc32c = None
+
+CHECKSUM_SUFFIX = ".crc"
+CHECKSUM_MAGIC = b"RUPCRC01"
+CHECKSUM_HDR = struct.Struct("<8sIIQ")  # magic, algo, block_size, begin_off
+CHECKSUM_REC = struct.Struct("<QI4x")    # end_off, crc of [end_off of the previous record, end_off)
+VERIFY_TASK_BYTES = 64 << 20
+
+
+class ChecksumAlgo:
+    CRC32C = 1
+    CRC32 = 2  # zlib.crc32, used when the crc32c package is not installed
+
+
+def get_crc_func(algo: int):
+    if algo == ChecksumAlgo.CRC32C:
+        if crc32c is None:
+            raise Exception("the stream was checksummed with CRC32C; install the crc32c package to verify it")
+        return crc32c
+    if algo == ChecksumAlgo.CRC32:
+        return zlib.crc32
+    raise Exception(f"unknown checksum algo; algo={algo}")
+
+
+class StrmChecksum:
+    """
+    The checksum file of a stream (strm_path + CHECKSUM_SUFFIX).
+
+    After a header naming the algorithm (CRC32C, or zlib's CRC32 without the crc32c
+    package), the block size and the stream offset checksumming began at, it holds one
+    CHECKSUM_REC per block: the block's end offset and the CRC of the stream bytes since
+    the previous record. With block_size 0 every commit (one message, or one
+    commit_many() burst) is a block; otherwise a record is written once block_size bytes
+    have been committed since the last one, and on close.
+
+    Records are written before the commit raising committed_len; a record past
+    committed_len is ignored. Committed data after the last record (a block still
+    filling with block_size > 0) is not verified, and recovery keeps it: only a block
+    failing its CRC is treated as torn.
+    """
+
+    def __init__(self, path: str, fd: int, algo: int, block_size: int, block_begin_off: int, num_recs: int):
+        self.path = path
+        self.fd = fd
+        self.algo = algo
+        self.crc_func = get_crc_func(algo)
+        self.block_size = block_size
+        self.block_begin_off = block_begin_off
+        self.block_end_off = block_begin_off
+        self.crc = 0
+        self.num_recs = num_recs
+
+    @classmethod
+    def create(cls, path: str, block_size: int, begin_off: int) -> 'StrmChecksum':
+        algo = ChecksumAlgo.CRC32C if crc32c is not None else ChecksumAlgo.CRC32
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.write(fd, CHECKSUM_HDR.pack(CHECKSUM_MAGIC, algo, block_size, begin_off))
+        return cls(path, fd, algo, block_size, begin_off, 0)
+
+    @classmethod
+    def open_for_append(cls, path: str, strm_len: int) -> 'StrmChecksum':
+        """
+        Reopens a checksum file for a writer, dropping the records past strm_len. The
+        current block starts at the last record kept; the caller adds whatever the stream
+        holds between it and strm_len with on_commit() before writing on.
+        """
+        algo, block_size, begin_off, end_offs, _ = read_checksum_file(path)
+        num_recs = 0
+        while num_recs < len(end_offs) and end_offs[num_recs] <= strm_len:
+            num_recs += 1
+        fd = os.open(path, os.O_RDWR)
+        os.ftruncate(fd, CHECKSUM_HDR.size + num_recs * CHECKSUM_REC.size)
+        os.lseek(fd, 0, os.SEEK_END)
+        return cls(path, fd, algo, block_size, end_offs[num_recs - 1] if num_recs > 0 else begin_off, num_recs)
+
+    def on_commit(self, strm, begin_off: int, end_off: int, caller: str):
+        """
+        Adds [begin_off, end_off) of strm, already in its mapped segments, to the current
+        block; called by the writer before raising committed_len.
+        """
+        if begin_off != self.block_end_off:
+            raise Exception(f"commit is not contiguous with the checksummed data; path={self.path}, begin_off={begin_off}, block_end_off={self.block_end_off}, caller={caller}")
+        data_1, data_2 = strm.locate_data(begin_off, end_off - begin_off, caller)
+        crc = self.crc_func(data_1, self.crc)
+        if data_2 is not None:
+            crc = self.crc_func(data_2, crc)
+        del data_1, data_2
+        self.crc = crc
+        self.block_end_off = end_off
+        if end_off - self.block_begin_off >= self.block_size:
+            self.write_rec()
+
+    def write_rec(self):
+        if self.block_end_off == self.block_begin_off:
+            return
+        os.write(self.fd, CHECKSUM_REC.pack(self.block_end_off, self.crc))
+        self.num_recs += 1
+        self.block_begin_off = self.block_end_off
+        self.crc = 0
+
+    def sync(self):
+        os.fdatasync(self.fd)
+
+    def close(self):
+        if self.fd is None:
+            return
+        self.write_rec()
+        os.close(self.fd)
+        self.fd = None
+
+
+def read_checksum_file(path: str):
+    """
+    :return: (algo, block_size, begin_off, array('Q') of record end offsets, array('L') of CRCs)
+    """
+    with open(path, "rb") as checksum_file:
+        data = checksum_file.read()
+    if len(data) < CHECKSUM_HDR.size:
+        raise Exception(f"checksum file is too short; path={path}, size={len(data)}")
+    magic, algo, block_size, begin_off = CHECKSUM_HDR.unpack_from(data, 0)
+    if magic != CHECKSUM_MAGIC:
+        raise Exception(f"not a checksum file; path={path}, magic={magic}")
+
+    # a record cut by a crash is dropped
+    num_recs = (len(data) - CHECKSUM_HDR.size) // CHECKSUM_REC.size
+    end_offs = array('Q')
+    crcs = array('L')
+    for end_off, crc in CHECKSUM_REC.iter_unpack(data[CHECKSUM_HDR.size:CHECKSUM_HDR.size + num_recs * CHECKSUM_REC.size]):
+        end_offs.append(end_off)
+        crcs.append(crc)
+    return algo, block_size, begin_off, end_offs, crcs
+
+
+def verify_range(strm_path: str, crc_func, begin_off: int, end_offs, crcs) -> int:
+    """
+    Checks consecutive blocks, the first one starting at begin_off, against their CRCs
+    through one read-only mapping of the range.
+    :return: Index (within end_offs) of the first bad block, or len(end_offs) if all are good.
+    """
+    if not end_offs:
+        return 0
+    map_off = begin_off - begin_off % mmap.ALLOCATIONGRANULARITY
+    fd = os.open(strm_path, os.O_RDONLY)
+    try:
+        file_size = os.fstat(fd).st_size
+        map_end = min(end_offs[-1], file_size)
+        if map_end <= begin_off:
+            return 0
+        data = mmap.mmap(fd, map_end - map_off, access=mmap.ACCESS_READ, offset=map_off)
+    finally:
+        os.close(fd)
+
+    view = memoryview(data)
+    try:
+        block_begin = begin_off - map_off
+        for idx, end_off in enumerate(end_offs):
+            block_end = end_off - map_off
+            if end_off > map_end or crc_func(view[block_begin:block_end]) != crcs[idx]:
+                return idx
+            block_begin = block_end
+        return len(end_offs)
+    finally:
+        view.release()
+        data.close()
+
+
+def verify_strms(strms, num_threads: int = None):
+    """
+    Verifies streams against their checksum files on a thread pool. Each stream's
+    records up to its committed_len are cut into tasks of about VERIFY_TASK_BYTES, so
+    a few large streams are spread over the pool as well as many small ones; the CRC
+    functions release the GIL on large buffers.
+
+    :param strms: [(strm_num, strm_path, committed_len)] of streams with a checksum file.
+    :param num_threads: Pool size; defaults to the number of CPUs (at most 32).
+    :return: {strm_num: verified_len}, the end of the last good block before the first
+             bad one (committed data past it cannot be trusted), or committed_len when
+             every recorded block is good.
+    """
+    recs = {}
+    committed_lens = {}
+    tasks = []
+    for strm_num, strm_path, committed_len in strms:
+        committed_lens[strm_num] = committed_len
+        algo, block_size, begin_off, end_offs, crcs = read_checksum_file(strm_path + CHECKSUM_SUFFIX)
+        num_recs = 0
+        while num_recs < len(end_offs) and end_offs[num_recs] <= committed_len:
+            num_recs += 1
+        recs[strm_num] = (begin_off, end_offs, num_recs)
+        crc_func = get_crc_func(algo)
+        task_begin_idx = 0
+        task_begin_off = begin_off
+        for idx in range(num_recs):
+            if end_offs[idx] - task_begin_off >= VERIFY_TASK_BYTES or idx == num_recs - 1:
+                tasks.append((strm_num, strm_path, crc_func, task_begin_off, end_offs[task_begin_idx:idx + 1], crcs[task_begin_idx:idx + 1], task_begin_idx))
+                task_begin_idx = idx + 1
+                task_begin_off = end_offs[idx]
+
+    num_threads = num_threads if num_threads is not None else min(32, os.cpu_count() or 1)
+    first_bad_idxs = {strm_num: num_recs for strm_num, (_, _, num_recs) in recs.items()}
+    with ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="lfj_verify") as pool:
+        futures = [(strm_num, task_begin_idx, len(task_end_offs), pool.submit(verify_range, strm_path, crc_func, task_begin_off, task_end_offs, task_crcs))
+                   for strm_num, strm_path, crc_func, task_begin_off, task_end_offs, task_crcs, task_begin_idx in tasks]
+        for strm_num, task_begin_idx, task_num_recs, future in futures:
+            bad_idx = future.result()
+            if bad_idx < task_num_recs:
+                first_bad_idxs[strm_num] = min(first_bad_idxs[strm_num], task_begin_idx + bad_idx)
+
+    verified_lens = {}
+    for strm_num, (begin_off, end_offs, num_recs) in recs.items():
+        first_bad_idx = first_bad_idxs[strm_num]
+        if first_bad_idx == num_recs:
+            verified_lens[strm_num] = committed_lens[strm_num]
+        else:
+            verified_lens[strm_num] = end_offs[first_bad_idx - 1] if first_bad_idx > 0 else begin_off
+    return verified_lens
@@ -0,0 +1,118 @@
+import glob
+import os
+import threading
+from collections import deque
+from persistance.seg_mapper import SegMapper
+
+POOL_STRM_NAME_PREFIX = "LFJ_POOL_STRM_"
+
+
+class StrmPool:
+    """
+    Keeps pre-created stream files ready for LockFreeJournal.create_strm().
+
+    A background thread reserves strm numbers and, per entry, creates and
+    write-locks a file under a placeholder name (POOL_STRM_NAME_PREFIX + strm_num)
+    and has a SegMapper allocate, map and fault in its first segment, refilling the
+    pool as entries are taken. Handing one out is a rename plus adopting the mapper,
+    so a burst of session logons creating their vecs never waits on file creation,
+    allocation or page faults of the new streams. Nothing is written to the journal
+    header until a stream is handed out; placeholder files left by a crash are
+    removed by remove_leftovers() on the next open.
+    """
+
+    def __init__(self, lock_free_journal, size: int):
+        self.lock_free_journal = lock_free_journal
+        self.size = size
+        self.ready = deque()
+        self.cond = threading.Condition()
+        self.is_closed = False
+        self.thread = None
+
+    @staticmethod
+    def remove_leftovers(lfj_name: str):
+        for path in glob.glob(os.path.join(lfj_name, POOL_STRM_NAME_PREFIX + "*")):
+            os.remove(path)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="lfj_strm_pool", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.is_closed and len(self.ready) >= self.size:
+                    self.cond.wait()
+                if self.is_closed:
+                    return
+            entry = self.create_entry()
+            with self.cond:
+                self.ready.append(entry)
+                self.cond.notify_all()
+
+    def create_entry(self):
+        lfj = self.lock_free_journal
+        strm_num = lfj.alloc_next_strm_num("StrmPool.create_entry")
+        path = os.path.join(lfj.lfj_name, f"{POOL_STRM_NAME_PREFIX}{strm_num}")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        lfj.strms[strm_num].acquire_write_lock(fd, path)
+        seg_mapper = SegMapper(fd, True, lfj.prefault_segs, lfj.keep_spare_seg, overlap=lfj.seg_overlap)
+        seg_mapper.map_spare_now(0, "StrmPool.create_entry")
+        return strm_num, path, fd, seg_mapper
+
+    def take(self):
+        """
+        :return: (strm_num, placeholder path, fd, seg_mapper) of a ready stream, or None when the pool is empty.
+        """
+        with self.cond:
+            if not self.ready:
+                return None
+            entry = self.ready.popleft()
+            self.cond.notify_all()
+            return entry
+
+    def assign(self, entry, strm, strm_path: str):
+        """
+        Moves a taken entry's file to strm_path and hands its fd and mapper to strm,
+        which is then inited under that name. An existing file there is only replaced
+        once its write lock is taken, as create_strm_file() truncates a leftover, so a
+        live stream is never swapped out from under its writer; the entry is discarded
+        when the move fails.
+        """
+        strm_num, path, fd, seg_mapper = entry
+        try:
+            try:
+                # link() refuses an existing target, unlike rename()
+                os.link(path, strm_path)
+                os.unlink(path)
+            except FileExistsError:
+                self.replace_leftover(path, strm, strm_path)
+        except Exception:
+            seg_mapper.close()
+            os.close(fd)
+            os.remove(path)
+            raise
+        strm.fd_plus_1 = fd + 1
+        strm.seg_mapper = seg_mapper
+
+    @staticmethod
+    def replace_leftover(path: str, strm, strm_path: str):
+        leftover_fd = os.open(strm_path, os.O_RDWR)
+        try:
+            strm.acquire_write_lock(leftover_fd, strm_path)
+            os.rename(path, strm_path)
+        finally:
+            os.close(leftover_fd)
+
+    def close(self):
+        with self.cond:
+            self.is_closed = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        while self.ready:
+            strm_num, path, fd, seg_mapper = self.ready.popleft()
+            seg_mapper.close()
+            os.close(fd)
+            os.remove(path)
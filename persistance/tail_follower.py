@@ -0,0 +1,90 @@
+import os
+import threading
+from persistance.doorbell import FutexDoorbell
+from persistance.read_snapshot import ReadSnapshot
+
+
+class TailFollower:
+    """
+    Follows a journal written by another process and drives LFJObserver subscribers.
+
+    The follower sleeps on the journal's futex doorbell (LFJ_DOORBELL), which the
+    writer rings after every published commit. On each wakeup it refreshes its
+    ReadSnapshot, diffs every vec's committed item count against what it has already
+    dispatched and calls on_vector_update_batch once per vec with the new index range,
+    so a burst of commits costs one wakeup and one callback per vec. The doorbell seq
+    is read before the journal is scanned, so a commit landing during a scan makes
+    the next wait return at once instead of being missed.
+    """
+
+    def __init__(self, lock_free_journal, observers=None, timeout_secs: float = 0.05):
+        """
+        :param lock_free_journal: A journal opened (usually read-only) in this process.
+        :param timeout_secs: Longest sleep without a ring before the journal is rescanned anyway.
+        """
+        self.lock_free_journal = lock_free_journal
+        self.read_snapshot = ReadSnapshot(lock_free_journal)
+        self.observers = list(observers) if observers is not None else []
+        self.timeout_secs = timeout_secs
+        self.doorbell = FutexDoorbell(os.path.join(lock_free_journal.lfj_name, lock_free_journal.LFJ_DOORBELL_NAME))
+        self.created_vec_nums = set()
+        self.is_stopped = False
+        self.thread = None
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def poll(self) -> int:
+        """
+        Dispatches every item committed since the last poll.
+        :return: The number of items dispatched.
+        """
+        self.read_snapshot.do_snapshot()
+        num_dispatched = 0
+        for vec_num, read_vec_info in enumerate(self.read_snapshot.read_vec_infos):
+            if not read_vec_info.is_discovered:
+                continue
+
+            if vec_num not in self.created_vec_nums:
+                self.created_vec_nums.add(vec_num)
+                vec = self.lock_free_journal.get_vec(vec_num)
+                for observer in self.observers:
+                    observer.on_vector_created(vec)
+
+            begin_idx = read_vec_info.last_read_vec_idx + 1
+            end_idx = read_vec_info.last_known_vec_idx + 1
+            if end_idx <= begin_idx:
+                continue
+            for observer in self.observers:
+                observer.on_vector_update_batch(vec_num, begin_idx, end_idx)
+            read_vec_info.last_read_vec_idx = end_idx - 1
+            num_dispatched += end_idx - begin_idx
+        return num_dispatched
+
+    def run(self):
+        seen_seq = self.doorbell.get_seq()
+        while not self.is_stopped:
+            self.poll()
+            seen_seq = self.doorbell.wait(seen_seq, self.timeout_secs, self.is_done)
+
+    def is_done(self) -> bool:
+        return self.is_stopped
+
+    def start(self):
+        self.is_stopped = False
+        self.thread = threading.Thread(target=self.run, name="lfj_tail_follower", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.is_stopped = True
+        if self.thread is not None:
+            # the follower may sleep on the doorbell for up to timeout_secs, and a wake can
+            # land just before it blocks, so it is repeated
+            while self.thread.is_alive():
+                self.doorbell.wake()
+                self.thread.join(0.01)
+            self.thread = None
+
+    def close(self):
+        self.stop()
+        self.doorbell.close()
@@ -0,0 +1,429 @@
+import struct
+import time
+from persistance.msg_patch import PATCH_FLAG, encode_patch, read_base_idx
+from persistance.rup_pos import SEG_SIZE_MASK, SEG_SIZE_SHIFT, Pos
+from persistance.rup_tx import Tx
+
+# every record is 8-byte aligned; the tx header leads and counts the records after it
+TX_HDR = struct.Struct("<HHIQQ")                # op_code, num_ops, tx_len, global_tx_seq, timestamp_ns
+OP_SET_VEC_ITEM = struct.Struct("<HHIQQQ")      # op_code, 0, vec_num, seq_num, pos, timestamp_ns
+OP_SET_ITEM_POS_FLAG = struct.Struct("<HHIQQ")  # op_code, flag, vec_num, seq_num, item_idx
+OP_PATCH_MSG = struct.Struct("<HHIQQQ")         # op_code, 0, vec_num, seq_num, patch_len, timestamp_ns; then the patch
+OP_STORE_MULTI_ORDER_DATA = struct.Struct("<HHI")  # op_code, num_vecs, data_len; then vec_nums (uint32), data
+MAX_OPS = 0xffff
+# a tx's Pos carries its length, so a tx is at most Pos.LEN_MASK bytes (kept 8-byte aligned)
+MAX_TX_LEN = Pos.LEN_MASK & ~7
+
+
+class TxBuilder(Tx):
+    """
+    Encodes a transaction of any number of op records into one preallocated buffer
+    and publishes it on the tx stream with a single valid_len/committed_len update.
+
+    A tx is begin(), any number of set_vec_item()/set_item_pos_flag()/patch_msg()/
+    store_multi_order_data() calls, then commit(). Records are written with
+    Struct.pack_into at the buffer's tail, so a tx allocates no op objects and no
+    intermediate bytes; the buffer only grows when a tx outgrows it and is reused by
+    the next one. A tx is at most MAX_TX_LEN bytes, since its length goes into the
+    Pos commit() returns; a record past it is refused. commit() copies the tx into
+    the stream, raises valid_len, applies the records to their vecs, then raises
+    committed_len, so a tx cut by a crash in between is undone by recovery
+    (LockFreeJournal.rollback_txs()) in a writeable rollbackable open.
+
+    Several vecs filled by one event (e.g. the order, its execution and aux vecs)
+    go into one tx with fill(), behind a single tx header.
+
+    Each tx header carries the journal's next global_tx_seq, taken while the tx
+    stream is held, so txs committed on different per-thread TX streams can be put
+    back in commit order by tx_merge.merge_tx_strms().
+
+    The other records are applied by commit() in op order with the vec items:
+    OP_PATCH_MSG carries its patch inline and appends it to its vec as an item whose
+    Pos, flagged (Pos.is_patch()), points at the patch in the tx stream; and
+    OP_SET_ITEM_POS_FLAG sets or clears the flag of the last item of its vec with its
+    seq_num, whose idx commit() resolves and records in the op. A flag op that would
+    not change the flag is refused, so each applied one can be told apart and undone.
+    """
+
+    def __init__(self, tx_strm, capacity: int = 64 << 10):
+        super().__init__(tx_strm)
+        self.buf = bytearray(min(capacity, MAX_TX_LEN))
+        self.tx_len = 0
+        self.num_ops = 0
+        self.timestamp_ns = 0
+        self.begin_ns = 0
+        self.vec_items = []
+        # (len(vec_items) before the op, op_code, record off, vec_num, seq_num, flag or patch_len, timestamp_ns)
+        self.other_ops = []
+
+    def begin(self, timestamp_ns: int):
+        self.tx_len = TX_HDR.size
+        self.num_ops = 0
+        self.timestamp_ns = timestamp_ns
+        self.begin_ns = time.perf_counter_ns()
+        self.vec_items.clear()
+        self.other_ops.clear()
+        return self
+
+    def reserve_record(self, size: int) -> int:
+        """
+        Makes room for a size-byte record at the tail of the tx. A record that would take
+        the tx past MAX_TX_LEN is refused, leaving the tx as it was.
+        :return: The record's offset in buf.
+        """
+        if self.num_ops == MAX_OPS:
+            raise Exception(f"tx should not have more than {MAX_OPS} ops")
+        off = self.tx_len
+        if off + size > MAX_TX_LEN:
+            raise Exception(f"tx should not be longer than {MAX_TX_LEN} bytes; tx_len={off}, record_len={size}")
+        if off + size > len(self.buf):
+            self.buf.extend(bytes(min(max(len(self.buf), off + size - len(self.buf)), MAX_TX_LEN - len(self.buf))))
+        self.tx_len = off + ((size + 7) & ~7)
+        self.num_ops += 1
+        return off
+
+    def set_vec_item(self, vec_num: int, seq_num: int, pos, timestamp_ns: int):
+        if not isinstance(pos, int):
+            pos = pos.to_uint64()
+        off = self.tx_len
+        if off + OP_SET_VEC_ITEM.size > len(self.buf) or self.num_ops == MAX_OPS:
+            off = self.reserve_record(OP_SET_VEC_ITEM.size)
+        else:
+            self.tx_len = off + OP_SET_VEC_ITEM.size
+            self.num_ops += 1
+        OP_SET_VEC_ITEM.pack_into(self.buf, off, Tx.OP_SET_VEC_ITEM, 0, vec_num, seq_num, pos, timestamp_ns)
+        self.vec_items.append((vec_num, seq_num, pos, timestamp_ns))
+
+    def fill(self, vec_nums, seq_nums, positions, timestamp_ns: int):
+        """
+        Adds one OP_SET_VEC_ITEM per vec, e.g. an order, its execution and its aux vecs.
+        """
+        num_items = len(vec_nums)
+        if len(seq_nums) != num_items or len(positions) != num_items:
+            raise Exception(f"fill should get one seq_num and pos per vec; num_vecs={num_items}, "
+                            f"num_seq_nums={len(seq_nums)}, num_positions={len(positions)}")
+        off = self.tx_len
+        end_off = off + num_items * OP_SET_VEC_ITEM.size
+        if end_off > len(self.buf) or self.num_ops + num_items > MAX_OPS:
+            for vec_num, seq_num, pos in zip(vec_nums, seq_nums, positions):
+                self.set_vec_item(vec_num, seq_num, pos, timestamp_ns)
+            return
+        pack_into = OP_SET_VEC_ITEM.pack_into
+        buf = self.buf
+        append = self.vec_items.append
+        for vec_num, seq_num, pos in zip(vec_nums, seq_nums, positions):
+            if pos.__class__ is not int:
+                pos = pos.to_uint64()
+            pack_into(buf, off, Tx.OP_SET_VEC_ITEM, 0, vec_num, seq_num, pos, timestamp_ns)
+            append((vec_num, seq_num, pos, timestamp_ns))
+            off += OP_SET_VEC_ITEM.size
+        self.tx_len = end_off
+        self.num_ops += num_items
+
+    def set_item_pos_flag(self, flag: int, vec_num: int, seq_num: int):
+        """
+        Sets (1) or clears (0) the Pos flag of the last item of vec_num with seq_num,
+        including items set earlier in this tx.
+        """
+        if flag not in (0, 1):
+            raise Exception(f"flag should be 0 or 1; flag={flag}")
+        off = self.reserve_record(OP_SET_ITEM_POS_FLAG.size)
+        OP_SET_ITEM_POS_FLAG.pack_into(self.buf, off, Tx.OP_SET_ITEM_POS_FLAG, flag, vec_num, seq_num, 0)
+        self.other_ops.append((len(self.vec_items), Tx.OP_SET_ITEM_POS_FLAG, off, vec_num, seq_num, flag, 0))
+
+    def patch_msg(self, vec_num: int, seq_num: int, patch, timestamp_ns: int):
+        """
+        Adds a patch (a msg_patch.encode_patch() payload) of an item of vec_num, stored
+        inline in the tx and appended to vec_num as a patch item on commit.
+        """
+        patch = memoryview(patch).cast("B")
+        off = self.reserve_record(OP_PATCH_MSG.size + len(patch))
+        OP_PATCH_MSG.pack_into(self.buf, off, Tx.OP_PATCH_MSG, 0, vec_num, seq_num, len(patch), timestamp_ns)
+        self.buf[off + OP_PATCH_MSG.size:off + OP_PATCH_MSG.size + len(patch)] = patch
+        self.other_ops.append((len(self.vec_items), Tx.OP_PATCH_MSG, off, vec_num, seq_num, len(patch), timestamp_ns))
+
+    def patch_item(self, vec_num: int, seq_num: int, base_idx: int, edits, timestamp_ns: int):
+        """
+        Adds a patch of item base_idx of vec_num (see msg_patch.encode_patch()), read back
+        with Vec.get_materialized().
+        """
+        self.patch_msg(vec_num, seq_num, encode_patch(base_idx, edits), timestamp_ns)
+
+    def iter_ops_to_apply(self):
+        """
+        :return: Iterator of the tx's vec changes in op order, as (op_code, record off,
+                 vec_num, seq_num, pos or flag or patch_len, timestamp_ns); record off is
+                 None for the OP_SET_VEC_ITEM ops.
+        """
+        vec_items = self.vec_items
+        idx = 0
+        for num_before, op_code, off, vec_num, seq_num, value, timestamp_ns in self.other_ops:
+            while idx < num_before:
+                vec_num_, seq_num_, pos, timestamp_ns_ = vec_items[idx]
+                yield Tx.OP_SET_VEC_ITEM, None, vec_num_, seq_num_, pos, timestamp_ns_
+                idx += 1
+            yield op_code, off, vec_num, seq_num, value, timestamp_ns
+        for vec_num, seq_num, pos, timestamp_ns in vec_items[idx:]:
+            yield Tx.OP_SET_VEC_ITEM, None, vec_num, seq_num, pos, timestamp_ns
+
+    def resolve_ops(self, lfj, strm_off: int):
+        """
+        Works out what the tx's patch and flag ops change before anything is written: the
+        Pos of every patch item, and the item idx of every flag op (recorded in its op),
+        following the items and flags set earlier in the tx. Every item a patch or a raised
+        flag makes a patch is checked to hold a patch of an earlier item that is not one.
+        :return: List of (op_code, vec_num, idx or seq_num, pos or flag, timestamp_ns) to apply in order.
+        """
+        strm_bits = (self.tx_strm.get_strm_num() & Pos.STRM_NUM_MASK) << Pos.STRM_NUM_SHIFT
+        pending = {}  # vec_num -> [(seq_num, pos)] of the items this tx appends so far
+        flags = {}    # (vec_num, idx) -> flag set earlier in this tx
+        ops = []
+
+        def get_pos(vec_num, columns, idx):
+            num_items = columns.get_num_items()
+            pos = pending[vec_num][idx - num_items][1] if idx >= num_items else columns.pos.get(idx)
+            flag = flags.get((vec_num, idx))
+            return pos if flag is None else (pos & ~PATCH_FLAG) | (flag << Pos.FLAG_SHIFT)
+
+        def check_patch(vec_num, columns, patch, idx):
+            base_idx = read_base_idx(patch, idx)
+            if get_pos(vec_num, columns, base_idx) & PATCH_FLAG:
+                raise Exception(f"patch base is a patch itself; vec_num={vec_num}, base_idx={base_idx}, patch_idx={idx}")
+
+        for op_code, off, vec_num, seq_num, value, timestamp_ns in self.iter_ops_to_apply():
+            vec = lfj.get_vec(vec_num)
+            if vec is None:
+                raise Exception(f"vec does not exist; vec_num={vec_num}, op={Tx.op_code_to_name(op_code)}")
+            columns = vec.columns
+            items = pending.setdefault(vec_num, [])
+            if op_code == Tx.OP_SET_VEC_ITEM:
+                items.append((seq_num, value))
+                ops.append((op_code, vec_num, seq_num, value, timestamp_ns))
+            elif op_code == Tx.OP_PATCH_MSG:
+                patch_off = off + OP_PATCH_MSG.size
+                check_patch(vec_num, columns, memoryview(self.buf)[patch_off:patch_off + value], columns.get_num_items() + len(items))
+                pos = PATCH_FLAG | strm_bits | (value << Pos.LEN_SHIFT) | (strm_off + patch_off)
+                items.append((seq_num, pos))
+                ops.append((op_code, vec_num, seq_num, pos, timestamp_ns))
+            else:
+                num_items = columns.get_num_items()
+                for i in range(len(items) - 1, -1, -1):
+                    if items[i][0] == seq_num:
+                        idx = num_items + i
+                        break
+                else:
+                    idx = columns.find_seq_num(seq_num)
+                    if idx < 0:
+                        raise Exception(f"no item to flag; vec_num={vec_num}, seq_num={seq_num}")
+                pos = get_pos(vec_num, columns, idx)
+                if (pos >> Pos.FLAG_SHIFT) == value:
+                    raise Exception(f"item flag is already {value}; vec_num={vec_num}, seq_num={seq_num}, idx={idx}")
+                if value == 1:
+                    data_1, data_2 = lfj.get_strm((pos >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK).locate_data(
+                        pos & Pos.STRM_OFF_MASK, (pos >> Pos.LEN_SHIFT) & Pos.LEN_MASK, "TxBuilder.resolve_ops")
+                    check_patch(vec_num, columns, data_1 if data_2 is None else bytes(data_1) + bytes(data_2), idx)
+                    del data_1, data_2
+                flags[(vec_num, idx)] = value
+                struct.pack_into("<Q", self.buf, off + OP_SET_ITEM_POS_FLAG.size - 8, idx)
+                ops.append((op_code, vec_num, idx, value, timestamp_ns))
+        return ops
+
+    def store_multi_order_data(self, vec_nums, data):
+        """
+        Stores one order payload shared by several vecs inline in the tx.
+        """
+        data = memoryview(data).cast("B")
+        vec_nums_len = 4 * len(vec_nums)
+        off = self.reserve_record(OP_STORE_MULTI_ORDER_DATA.size + vec_nums_len + len(data))
+        OP_STORE_MULTI_ORDER_DATA.pack_into(self.buf, off, Tx.OP_STORE_MULTI_ORDER_DATA, len(vec_nums), len(data))
+        off += OP_STORE_MULTI_ORDER_DATA.size
+        struct.pack_into(f"<{len(vec_nums)}I", self.buf, off, *vec_nums)
+        off += vec_nums_len
+        self.buf[off:off + len(data)] = data
+
+    def commit(self, wait_durable=False) -> int:
+        """
+        Publishes the tx built since begin().
+        :return: The packed Pos of the tx in the tx stream.
+        """
+        tx_strm = self.tx_strm
+        if tx_strm is None:
+            raise Exception("tx_strm should not be None")
+
+        lfj = tx_strm.lock_free_journal
+        tx_len = self.tx_len
+        buf = self.buf
+        vec_items = self.vec_items
+        with tx_strm.strm_write_mutex:
+            on_disk_strm_info = tx_strm.on_disk_strm_info
+            strm_off = on_disk_strm_info.committed_len.get()
+            ops = self.resolve_ops(lfj, strm_off) if self.other_ops else None
+            TX_HDR.pack_into(buf, 0, Tx.OP_TX_HDR, self.num_ops, tx_len, lfj.next_global_tx_seq(), self.timestamp_ns)
+            end_off = strm_off + tx_len
+            on_disk_strm_info.alloc_len.set(end_off)
+            seg_num = strm_off >> SEG_SIZE_SHIFT
+            seg_off = strm_off & SEG_SIZE_MASK
+            segs = tx_strm.segs
+            seg = segs[seg_num] if seg_num < len(segs) else None
+            if seg is not None and seg_off + tx_len <= len(seg.seg_view):
+                # a small tx copies faster as a bytearray slice than through a new memoryview
+                seg.seg_view[seg_off:seg_off + tx_len] = buf[:tx_len]
+            else:
+                tx_strm.write_at(strm_off, memoryview(buf)[:tx_len], "TxBuilder.commit")
+
+            on_disk_strm_info.valid_len.set(end_off)
+            vecs = lfj.vecs
+            if ops is None:
+                for vec_num, seq_num, pos, timestamp_ns in vec_items:
+                    vecs[vec_num].columns.append(pos, timestamp_ns, seq_num)
+            else:
+                for op_code, vec_num, seq_num_or_idx, pos_or_flag, timestamp_ns in ops:
+                    if op_code == Tx.OP_SET_ITEM_POS_FLAG:
+                        vecs[vec_num].columns.set_pos_flag(seq_num_or_idx, pos_or_flag)
+                    else:
+                        vecs[vec_num].columns.append(pos_or_flag, timestamp_ns, seq_num_or_idx)
+            on_disk_strm_info.committed_len.set(end_off)
+            if lfj.order_index is not None:
+                lfj.order_index.add_tx(tx_strm.get_strm_num(), end_off, vec_items)
+            lfj.durability.note_commit(tx_strm, tx_len)
+            if tx_strm.strm_metrics is not None:
+                tx_strm.strm_metrics.on_tx_commit(tx_len, self.begin_ns)
+        lfj.ring_doorbell()
+
+        vec_items.clear()
+        self.other_ops.clear()
+        if wait_durable:
+            lfj.wait_durable()
+        return ((tx_strm.strm_num_plus_1 - 1) << Pos.STRM_NUM_SHIFT) | (tx_len << Pos.LEN_SHIFT) | strm_off
+
+
+def read_tx_hdr(data):
+    """
+    :return: (num_ops, tx_len, global_tx_seq, timestamp_ns) of the tx at the front of data.
+    """
+    op_code, num_ops, tx_len, global_tx_seq, timestamp_ns = TX_HDR.unpack_from(data, 0)
+    if op_code != Tx.OP_TX_HDR:
+        raise Exception(f"not a tx header; op_code={Tx.op_code_to_name(op_code)}")
+    return num_ops, tx_len, global_tx_seq, timestamp_ns
+
+
+def iter_tx_ops(data):
+    """
+    Decodes a tx written by TxBuilder.
+    :return: Iterator of (op_code, fields); fields are the record's values after the
+             op code (with the patch view last for OP_PATCH_MSG), and for
+             OP_STORE_MULTI_ORDER_DATA are (vec_nums, data view).
+    """
+    data = memoryview(data).cast("B")
+    num_ops = read_tx_hdr(data)[0]
+    off = TX_HDR.size
+    for _ in range(num_ops):
+        op_code = struct.unpack_from("<H", data, off)[0]
+        if op_code == Tx.OP_SET_VEC_ITEM:
+            fields = OP_SET_VEC_ITEM.unpack_from(data, off)
+            size = OP_SET_VEC_ITEM.size
+            fields = (fields[2],) + fields[3:]
+        elif op_code == Tx.OP_PATCH_MSG:
+            fields = OP_PATCH_MSG.unpack_from(data, off)
+            patch_off = off + OP_PATCH_MSG.size
+            size = OP_PATCH_MSG.size + fields[4]
+            fields = (fields[2],) + fields[3:] + (data[patch_off:patch_off + fields[4]],)
+        elif op_code == Tx.OP_SET_ITEM_POS_FLAG:
+            fields = OP_SET_ITEM_POS_FLAG.unpack_from(data, off)[1:]
+            size = OP_SET_ITEM_POS_FLAG.size
+        elif op_code == Tx.OP_STORE_MULTI_ORDER_DATA:
+            _, num_vecs, data_len = OP_STORE_MULTI_ORDER_DATA.unpack_from(data, off)
+            vec_nums_off = off + OP_STORE_MULTI_ORDER_DATA.size
+            data_off = vec_nums_off + 4 * num_vecs
+            fields = (struct.unpack_from(f"<{num_vecs}I", data, vec_nums_off), data[data_off:data_off + data_len])
+            size = data_off + data_len - off
+        else:
+            raise Exception(f"unexpected op in tx; op_code={Tx.op_code_to_name(op_code)}, off={off}")
+        yield op_code, fields
+        off += (size + 7) & ~7
+
+
+def bench_tx_builder(num_txs: int = 100000, num_vecs: int = 3, num_rounds: int = 5):
+    """
+    Compares committing a num_vecs-vec fill the way TxExecuteMsgs used to (one op
+    object and one packed record per op, setup, a valid_len update, then commit)
+    against TxBuilder. Vec columns are stubbed out so only the tx overhead is timed.
+    The two take turns for num_rounds rounds of num_txs txs and the best round of
+    each is kept, so a noisy host skews them alike.
+    :return: (ns per tx before, ns per tx with TxBuilder)
+    """
+    import os
+    import tempfile
+    from types import SimpleNamespace
+    from persistance.atomic_word import AtomicUint64
+    from persistance.lock_free_journal import LockFreeJournal
+    from persistance.ondisk_journal_hdr import OnDiskJournalHdr
+
+    bench_dir = tempfile.mkdtemp()
+    lfj = LockFreeJournal()
+    lfj.is_writeable = True
+    lfj.on_disk_journal_hdr = OnDiskJournalHdr()
+    vec = SimpleNamespace(columns=SimpleNamespace(append=lambda pos, timestamp_ns, seq_num: None))
+    lfj.vecs = [vec] * num_vecs
+    vec_nums = list(range(num_vecs))
+    positions = [Pos(1, 64 * i, 64).to_uint64() for i in range(num_vecs)]
+
+    strms = []
+    for strm_name in ("bench_before", "bench_builder"):
+        strm = LockFreeJournal.Strm()
+        strm.lock_free_journal = lfj
+        strm.strm_name = strm_name
+        strm.strm_num_plus_1 = 1
+        strm.on_disk_strm_info = SimpleNamespace(committed_len=AtomicUint64(), valid_len=AtomicUint64(), alloc_len=AtomicUint64())
+        strm.fd_plus_1 = os.open(os.path.join(bench_dir, strm_name), os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644) + 1
+        strms.append(strm)
+    strm, builder_strm = strms
+    builder = TxBuilder(builder_strm)
+
+    def commit_before(seq_num):
+        ops = [SimpleNamespace(vec_num=vec_num, seq_num=seq_num, pos=pos, timestamp_ns=seq_num) for vec_num, pos in zip(vec_nums, positions)]
+        with strm.strm_write_mutex:
+            tx_off = strm.get_committed_len()
+            strm.write_at(tx_off, struct.pack("<HHIQQ", Tx.OP_TX_HDR, len(ops), 0, 0, seq_num), "bench_tx_builder")
+            off = tx_off + TX_HDR.size
+            for op in ops:
+                strm.write_at(off, struct.pack("<HHIQQQ", Tx.OP_SET_VEC_ITEM, 0, op.vec_num, op.seq_num, op.pos, op.timestamp_ns), "bench_tx_builder")
+                off += OP_SET_VEC_ITEM.size
+            strm.write_at(tx_off + 4, struct.pack("<I", off - tx_off), "bench_tx_builder")
+            strm.on_disk_strm_info.alloc_len.set(off)
+            strm.on_disk_strm_info.valid_len.set(off)
+            for op in ops:
+                lfj.get_vec(op.vec_num).columns.append(op.pos, op.timestamp_ns, op.seq_num)
+            strm.on_disk_strm_info.committed_len.set(off)
+            lfj.durability.note_commit(strm, off - tx_off)
+        lfj.ring_doorbell()
+
+    def commit_with_builder(seq_num):
+        builder.begin(seq_num)
+        builder.fill(vec_nums, (seq_num,) * num_vecs, positions, seq_num)
+        builder.commit()
+
+    best_ns = [None, None]
+    for round_num in range(num_rounds):
+        for i, commit_tx in enumerate((commit_before, commit_with_builder)):
+            begin = time.perf_counter_ns()
+            for seq_num in range(round_num * num_txs, (round_num + 1) * num_txs):
+                commit_tx(seq_num)
+            ns_per_tx = (time.perf_counter_ns() - begin) / num_txs
+            if best_ns[i] is None or ns_per_tx < best_ns[i]:
+                best_ns[i] = ns_per_tx
+
+    for strm in strms:
+        strm.seg_mapper.close()
+        for seg in strm.segs:
+            seg.seg_view.release()
+            seg.seg_data.close()
+        os.close(strm.get_strm_fd())
+        os.unlink(os.path.join(bench_dir, strm.strm_name))
+    os.rmdir(bench_dir)
+    return best_ns[0], best_ns[1]
+
+
+if __name__ == "__main__":
+    before_ns, after_ns = bench_tx_builder()
+    print(f"per tx: {before_ns:.0f} ns before, {after_ns:.0f} ns with TxBuilder ({before_ns / after_ns:.1f}x)")
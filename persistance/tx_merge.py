@@ -0,0 +1,108 @@
+import heapq
+import time
+from operator import itemgetter
+from persistance.lock_free_journal import StrmType
+from persistance.ondisk_journal_hdr import OnDiskJournalHdr
+from persistance.tx_builder import TX_HDR, read_tx_hdr
+
+# strm0 holds TxBuilder txs only after the journal header mapped at its front
+STRM_0_DATA_OFF = (OnDiskJournalHdr.SIZE + 7) & ~7
+
+
+def get_tx_strms(lock_free_journal):
+    # a stream another thread is still creating has no on_disk_strm_info yet
+    return [strm for strm in list(lock_free_journal.strms)
+            if strm is not None and strm.on_disk_strm_info is not None and strm.get_strm_type() == StrmType.TX_STREAM]
+
+
+def get_tx_strm_begin_off(strm) -> int:
+    return STRM_0_DATA_OFF if strm.get_strm_num() == 0 else 0
+
+
+def read_strm_bytes(strm, strm_off: int, length: int) -> bytes:
+    data_1, data_2 = strm.locate_data(strm_off, length, "tx_merge.read_strm_bytes")
+    return bytes(data_1) if data_2 is None else bytes(data_1) + bytes(data_2)
+
+
+def iter_strm_txs(strm, begin_off: int = None, end_off: int = None):
+    """
+    Walks the committed txs of one TX stream.
+    :return: Iterator of (global_tx_seq, strm_num, strm_off, tx bytes).
+    """
+    strm_num = strm.get_strm_num()
+    strm_off = get_tx_strm_begin_off(strm) if begin_off is None else begin_off
+    end_off = strm.get_committed_len() if end_off is None else end_off
+    while strm_off + TX_HDR.size <= end_off:
+        tx_len = read_tx_hdr(read_strm_bytes(strm, strm_off, TX_HDR.size))[1]
+        if tx_len < TX_HDR.size or strm_off + tx_len > end_off:
+            raise Exception(f"tx is cut or corrupt; strm_num={strm_num}, strm_off={strm_off}, tx_len={tx_len}, end_off={end_off}")
+        tx = read_strm_bytes(strm, strm_off, tx_len)
+        yield read_tx_hdr(tx)[2], strm_num, strm_off, tx
+        strm_off += tx_len
+
+
+def merge_tx_strms(lock_free_journal, tx_strms=None):
+    """
+    k-way merges the committed txs of every TX stream by global_tx_seq, giving the
+    journal-wide commit order of txs written concurrently on per-thread TX streams.
+    Every stream's committed_len is read once up front.
+    :return: Iterator of (global_tx_seq, strm_num, strm_off, tx bytes).
+    """
+    tx_strms = get_tx_strms(lock_free_journal) if tx_strms is None else tx_strms
+    return heapq.merge(*[iter_strm_txs(strm, end_off=strm.get_committed_len()) for strm in tx_strms], key=itemgetter(0))
+
+
+class TxMerger:
+    """
+    Follows the TX streams of a live journal and hands out txs in global_tx_seq order.
+
+    Writers take a global_tx_seq and publish their tx under their own stream's mutex
+    only, so tx n + 1 may be visible on one stream before tx n is on another. poll()
+    therefore only hands out a contiguous run of seqs; txs past a hole stay buffered
+    until the hole fills. A hole that lasts gap_timeout_secs is a tx lost with its
+    writer (rolled back by recovery) and is skipped.
+    """
+
+    def __init__(self, lock_free_journal, gap_timeout_secs: float = 1.0):
+        self.lock_free_journal = lock_free_journal
+        self.gap_timeout_secs = gap_timeout_secs
+        self.next_offs = {}
+        self.pending = []
+        self.next_global_tx_seq = None
+        self.gap_since = None
+
+    def read_new_txs(self):
+        for strm in get_tx_strms(self.lock_free_journal):
+            strm_num = strm.get_strm_num()
+            begin_off = self.next_offs.get(strm_num, get_tx_strm_begin_off(strm))
+            for tx in iter_strm_txs(strm, begin_off):
+                heapq.heappush(self.pending, tx)
+                begin_off = tx[2] + len(tx[3])
+            self.next_offs[strm_num] = begin_off
+
+    def poll(self):
+        """
+        :return: List of (global_tx_seq, strm_num, strm_off, tx bytes) committed since the
+                 last poll and contiguous with what was handed out before.
+        """
+        self.read_new_txs()
+        pending = self.pending
+        if self.next_global_tx_seq is None:
+            if not pending:
+                return []
+            self.next_global_tx_seq = pending[0][0]
+
+        txs = []
+        while pending:
+            if pending[0][0] > self.next_global_tx_seq:
+                now = time.monotonic()
+                if self.gap_since is None:
+                    self.gap_since = now
+                if now - self.gap_since < self.gap_timeout_secs:
+                    break
+                self.next_global_tx_seq = pending[0][0]
+            tx = heapq.heappop(pending)
+            txs.append(tx)
+            self.next_global_tx_seq = tx[0] + 1
+            self.gap_since = None
+        return txs
@@ -1,6 +1,11 @@
+from persistance.rup_tx import Tx
+from persistance.tx_builder import TxBuilder
+
+
 class TxExecuteMsgs(Tx):
     def __init__(self, lfj):
         super().__init__(lfj.get_or_create_own_tx_strm())
+        self.tx_builder = TxBuilder(self.tx_strm)
 
     def set_vecs(self, *vecs):
         self.vecs = vecs
@@ -10,18 +15,11 @@ class TxExecuteMsgs(Tx):
         if not lfj:
             raise Exception(f"lfj is not set; caller={caller}")
 
-        self.setup(caller)
-
-        ops = []
+        # one OP_SET_VEC_ITEM per vec, published behind a single tx header
+        tx_builder = self.tx_builder.begin(timestamp)
         for i in range(0, len(args), 2):
             pos = args[i]
             seq_num = args[i + 1]
             vec = self.vecs[i // 2]
-            vec_num = vec.get_vec_num()
-            ops.append(LockFreeJournal.Tx.OpSetVecItem.init(self, vec_num, seq_num, pos, timestamp, __PRETTY_FUNCTION__))
-
-        self.set_tx_len_and_update_valid_len()
-        for op in ops:
-            op.execute(lfj, self.tx_hdr_pos, __PRETTY_FUNCTION__)
-
-        self.commit()
+            tx_builder.set_vec_item(vec.get_vec_num(), seq_num, pos, timestamp)
+        return tx_builder.commit()
@@ -1,17 +1,25 @@
+from persistance.rup_tx import Tx
+from persistance.tx_builder import TxBuilder
+
+
 class TxPatchMsg(Tx):
     def __init__(self, lfj):
         super().__init__(lfj.get_or_create_own_tx_strm())
+        self.tx_builder = TxBuilder(self.tx_strm)
 
     def set_vec(self, vec):
         self.vec = vec
 
-    def execute(self, seq_num, patch_len, timestamp, caller):
+    def execute(self, seq_num, base_idx, edits, timestamp, caller):
+        """
+        Commits a patch of item base_idx of the vec (see msg_patch.encode_patch()) as a
+        patch item of it.
+        :return: The packed Pos of the tx.
+        """
         lfj = self.tx_strm.get_lfj()
         if not lfj or not self.vec:
             raise Exception(f"vec is not set or lfj is not set; caller={caller}")
 
-        self.setup(caller)
-        op_patch_msg = LockFreeJournal.Tx.OpPatchMsg.init(self, self.vec.get_vec_num(), seq_num, patch_len, timestamp, __PRETTY_FUNCTION__)
-        self.set_tx_len_and_update_valid_len()
-        op_patch_msg.execute(lfj, self.tx_hdr_pos, __PRETTY_FUNCTION__)
-        self.commit()
+        tx_builder = self.tx_builder.begin(timestamp)
+        tx_builder.patch_item(self.vec.get_vec_num(), seq_num, base_idx, edits, timestamp)
+        return tx_builder.commit()
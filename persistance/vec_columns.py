@@ -0,0 +1,490 @@
+import os
+from collections import namedtuple
+from persistance.atomic_word import AtomicUint64
+from persistance.rup_pos import Pos
+from persistance.seg_mapper import SegMapper, SEG_SIZE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+COLUMN_HDR_SIZE = 4096
+ITEM_SIZE = 8
+ITEMS_PER_SEG = SEG_SIZE // ITEM_SIZE
+HDR_ITEMS = COLUMN_HDR_SIZE // ITEM_SIZE
+COLUMN_MAGIC = int.from_bytes(b"RUPVCOL1", "little")
+TIME_INDEX_STRIDE = 1024
+HOP_SLICE_ITEMS = 64
+HOP_FANOUT = 64
+
+VecItem = namedtuple("VecItem", ["pos", "timestamp_ns", "seq_num"])
+
+
+class VecColumn:
+    """
+    One fixed-width (8-byte) column file of a vec, grown and mapped in SEG_SIZE
+    segments like a stream. The first COLUMN_HDR_SIZE bytes are a header, so item
+    idx lives at byte COLUMN_HDR_SIZE + idx * 8 and never straddles a segment.
+    """
+
+    def __init__(self, path: str, typecode: str, is_writeable: bool, prefault: bool = True, keep_spare: bool = False):
+        """
+        :param path: Column file path.
+        :param typecode: 'Q' for unsigned or 'q' for signed items.
+        :param is_writeable: Open for appending; the file is created if missing.
+        """
+        flags = os.O_RDWR | os.O_CREAT if is_writeable else os.O_RDONLY
+        self.path = path
+        self.fd = os.open(path, flags, 0o644)
+        self.typecode = typecode
+        self.is_writeable = is_writeable
+        self.mapper = SegMapper(self.fd, is_writeable, prefault, keep_spare)
+        self.segs = []
+        self.seg_views = []
+
+    def get_seg_view(self, seg_num: int, create_if_needed: bool) -> memoryview:
+        if seg_num < len(self.seg_views):
+            view = self.seg_views[seg_num]
+            if view is not None:
+                return view
+
+        while len(self.seg_views) <= seg_num:
+            self.segs.append(None)
+            self.seg_views.append(None)
+
+        seg_data = self.mapper.map_seg(seg_num, create_if_needed and self.is_writeable, "VecColumn.get_seg_view")
+        if seg_data is None:
+            raise Exception(f"column segment is not in file; path={self.path}, seg_num={seg_num}")
+        self.segs[seg_num] = seg_data
+        self.seg_views[seg_num] = memoryview(seg_data).cast(self.typecode)
+        return self.seg_views[seg_num]
+
+    def get_hdr_buf(self):
+        self.get_seg_view(0, True)
+        return self.segs[0]
+
+    def get(self, idx: int) -> int:
+        slot = HDR_ITEMS + idx
+        return self.get_seg_view(slot // ITEMS_PER_SEG, False)[slot % ITEMS_PER_SEG]
+
+    def set(self, idx: int, value: int):
+        slot = HDR_ITEMS + idx
+        self.get_seg_view(slot // ITEMS_PER_SEG, True)[slot % ITEMS_PER_SEG] = value
+
+    def chunks(self, start: int, stop: int):
+        """
+        Yields zero-copy memoryviews covering items [start, stop), one per segment touched.
+        """
+        slot = HDR_ITEMS + start
+        end_slot = HDR_ITEMS + stop
+        while slot < end_slot:
+            seg_num = slot // ITEMS_PER_SEG
+            seg_first = seg_num * ITEMS_PER_SEG
+            n = min(end_slot, seg_first + ITEMS_PER_SEG) - slot
+            yield self.get_seg_view(seg_num, False)[slot - seg_first:slot - seg_first + n]
+            slot += n
+
+    def view(self, start: int, stop: int):
+        """
+        Returns items [start, stop) as a NumPy array: a view over the mapping when the
+        range lies in one segment, a concatenated copy when it spans segments. A view
+        keeps its segment mapped past close(); copy it to let the mapping go with close().
+        """
+        if np is None:
+            raise Exception("numpy is not installed")
+        dtype = np.uint64 if self.typecode == 'Q' else np.int64
+        parts = [np.frombuffer(chunk, dtype=dtype) for chunk in self.chunks(start, stop)]
+        if not parts:
+            return np.empty(0, dtype=dtype)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def close(self):
+        """
+        Unmaps the column. A segment a view() array still points into cannot be closed
+        (BufferError); its mapping is dropped here and goes when the last array does.
+        """
+        self.mapper.close()
+        for view in self.seg_views:
+            if view is not None:
+                try:
+                    view.release()
+                except BufferError:
+                    pass
+        for seg_data in self.segs:
+            if seg_data is not None:
+                try:
+                    seg_data.close()
+                except BufferError:
+                    pass
+        self.seg_views = []
+        self.segs = []
+        os.close(self.fd)
+
+
+class VecColumns:
+    """
+    The item index of a vec as memory-mapped columns: pos (uint64), timestamp (int64
+    ns since epoch) and, for a vec created with has_seq_num, seq_num (uint64).
+
+    The committed item count is a word in the pos column header. The writer fills
+    every column for an item before raising it, so readers in other processes see
+    only complete items. A column segment holds 512K items, so columns do not keep a
+    spare segment (and its thread) by default.
+
+    A sparse time index (<vec>.tsidx) holds one sample per TIME_INDEX_STRIDE items:
+    sample k is the latest non-zero timestamp among items [0, (k + 1) * stride).
+    Items with a zero timestamp carry the previous one forward, so the samples are
+    non-decreasing and can be binary searched.
+
+    Hop slices (<vec>.hop) answer how far the vec's items have their stream data
+    committed. The hop stream is the stream of the first non-null item; slice k is the
+    highest end offset (strm_off + len) on it among items [0, (k + 1) * HOP_SLICE_ITEMS).
+    The slices are non-decreasing, so given the stream's committed_len the first item
+    whose data is not committed yet is found by hopping 1, HOP_FANOUT, HOP_FANOUT**2 ...
+    slices forward from a starting point (one level of the skip structure per hop),
+    binary searching the last hop and scanning one slice of items: O(log n) from
+    scratch, and O(1) amortized for a reader moving forward from its previous answer.
+    The writer keeps the running end offset, so an append costs one compare and a
+    slice write every HOP_SLICE_ITEMS items. Items on another stream are not covered:
+    the first one is recorded (hop_foreign_idx) and seek_hop_end_off() stops there.
+
+    The flag generation word counts the in-place changes to items already published
+    (a Pos flag set or cleared, items dropped by a rollback).
+    """
+    POS_SUFFIX = ".pos"
+    TS_SUFFIX = ".ts"
+    SEQ_SUFFIX = ".seq"
+    TIME_INDEX_SUFFIX = ".tsidx"
+    HOP_SLICE_SUFFIX = ".hop"
+    MAGIC_WORD = 0
+    NUM_ITEMS_WORD = 1
+    TIME_INDEX_STRIDE_WORD = 2
+    HOP_STRM_NUM_PLUS_1_WORD = 3
+    HOP_FOREIGN_IDX_PLUS_1_WORD = 4
+    FLAG_GEN_WORD = 5
+
+    def __init__(self, vec_path: str, is_writeable: bool, has_seq_num: bool = None, prefault: bool = True, keep_spare: bool = False):
+        """
+        :param has_seq_num: Whether a new vec gets a seq_num column; None (an existing vec)
+                            opens it if its file exists. A read-only open never creates it.
+        """
+        if has_seq_num is None or not is_writeable:
+            has_seq_num = (has_seq_num is not False) and os.path.exists(vec_path + self.SEQ_SUFFIX)
+
+        self.vec_path = vec_path
+        self.pos = VecColumn(vec_path + self.POS_SUFFIX, 'Q', is_writeable, prefault, keep_spare)
+        self.ts = VecColumn(vec_path + self.TS_SUFFIX, 'q', is_writeable, prefault, keep_spare)
+        self.seq = VecColumn(vec_path + self.SEQ_SUFFIX, 'Q', is_writeable, prefault, keep_spare) if has_seq_num else None
+
+        hdr_buf = self.pos.get_hdr_buf()
+        self.magic = AtomicUint64(buf=hdr_buf, off=self.MAGIC_WORD * ITEM_SIZE)
+        self.num_items = AtomicUint64(buf=hdr_buf, off=self.NUM_ITEMS_WORD * ITEM_SIZE)
+        self.time_index_stride = AtomicUint64(buf=hdr_buf, off=self.TIME_INDEX_STRIDE_WORD * ITEM_SIZE)
+        self.hop_strm_num_plus_1 = AtomicUint64(buf=hdr_buf, off=self.HOP_STRM_NUM_PLUS_1_WORD * ITEM_SIZE)
+        self.hop_foreign_idx_plus_1 = AtomicUint64(buf=hdr_buf, off=self.HOP_FOREIGN_IDX_PLUS_1_WORD * ITEM_SIZE)
+        self.flag_gen = AtomicUint64(buf=hdr_buf, off=self.FLAG_GEN_WORD * ITEM_SIZE)
+        if self.magic.get() != COLUMN_MAGIC:
+            if not is_writeable:
+                raise Exception(f"vec columns are not initialized; vec_path={vec_path}")
+            self.time_index_stride.set(TIME_INDEX_STRIDE)
+            self.magic.set(COLUMN_MAGIC)
+
+        self.time_index = None
+        self.running_ts_ns = 0
+        if is_writeable or os.path.exists(vec_path + self.TIME_INDEX_SUFFIX):
+            self.time_index = VecColumn(vec_path + self.TIME_INDEX_SUFFIX, 'q', is_writeable, prefault, keep_spare)
+        self.hop_slices = None
+        self.running_end_off = 0
+        if is_writeable or os.path.exists(vec_path + self.HOP_SLICE_SUFFIX):
+            self.hop_slices = VecColumn(vec_path + self.HOP_SLICE_SUFFIX, 'Q', is_writeable, prefault, keep_spare)
+        if is_writeable:
+            self.recover_time_index()
+            self.recover_hop_slices()
+
+    def recover_time_index(self):
+        """
+        Restores the writer's running timestamp from the time index and the items of the
+        last incomplete block. Samples are written before the item count is raised, so
+        every complete block has one; they are only rebuilt if the index file is short
+        (e.g. a vec written before the index existed).
+        """
+        stride = self.time_index_stride.get()
+        num_items = self.num_items.get()
+        num_blocks = num_items // stride
+        index_file_size = os.fstat(self.time_index.fd).st_size
+        first_idx = 0
+        if num_blocks > 0 and index_file_size >= COLUMN_HDR_SIZE + num_blocks * ITEM_SIZE:
+            first_idx = num_blocks * stride
+            self.running_ts_ns = self.time_index.get(num_blocks - 1)
+
+        for idx in range(first_idx, num_items):
+            self.update_time_index(idx, self.ts.get(idx))
+
+    def update_time_index(self, idx, timestamp_ns):
+        if timestamp_ns > self.running_ts_ns:
+            self.running_ts_ns = timestamp_ns
+        stride = self.time_index_stride.get()
+        if (idx + 1) % stride == 0:
+            self.time_index.set(idx // stride, self.running_ts_ns)
+
+    def recover_hop_slices(self):
+        """
+        Restores the writer's running end offset like recover_time_index(), rebuilding
+        the slices from the items when the file is short (a vec written before them).
+        """
+        num_items = self.num_items.get()
+        num_slices = num_items // HOP_SLICE_ITEMS
+        slices_file_size = os.fstat(self.hop_slices.fd).st_size
+        first_idx = 0
+        if num_slices > 0 and slices_file_size >= COLUMN_HDR_SIZE + num_slices * ITEM_SIZE:
+            first_idx = num_slices * HOP_SLICE_ITEMS
+            self.running_end_off = self.hop_slices.get(num_slices - 1)
+        else:
+            self.hop_strm_num_plus_1.set(0)
+            self.hop_foreign_idx_plus_1.set(0)
+
+        for idx in range(first_idx, num_items):
+            self.update_hop_slices(idx, self.pos.get(idx))
+
+    def update_hop_slices(self, idx, pos):
+        if pos != 0:
+            strm_num_plus_1 = ((pos >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK) + 1
+            hop_strm_num_plus_1 = self.hop_strm_num_plus_1.get()
+            if hop_strm_num_plus_1 == 0:
+                self.hop_strm_num_plus_1.set(strm_num_plus_1)
+                hop_strm_num_plus_1 = strm_num_plus_1
+            if strm_num_plus_1 == hop_strm_num_plus_1:
+                end_off = (pos & Pos.STRM_OFF_MASK) + ((pos >> Pos.LEN_SHIFT) & Pos.LEN_MASK)
+                if end_off > self.running_end_off:
+                    self.running_end_off = end_off
+            elif self.hop_foreign_idx_plus_1.get() == 0:
+                self.hop_foreign_idx_plus_1.set(idx + 1)
+        if (idx + 1) % HOP_SLICE_ITEMS == 0:
+            self.hop_slices.set(idx // HOP_SLICE_ITEMS, self.running_end_off)
+
+    def get_hop_strm_num(self) -> int:
+        """
+        :return: The stream the hop slices cover, or -1 while the vec has no non-null item.
+        """
+        return self.hop_strm_num_plus_1.get() - 1
+
+    def get_hop_end_idx(self) -> int:
+        """
+        :return: The first item on another stream than the hop stream, or the item count.
+        """
+        foreign_idx_plus_1 = self.hop_foreign_idx_plus_1.get()
+        num_items = self.num_items.get()
+        return min(foreign_idx_plus_1 - 1, num_items) if foreign_idx_plus_1 != 0 else num_items
+
+    def get_num_items(self) -> int:
+        return self.num_items.get()
+
+    def append(self, pos: int, timestamp_ns: int, seq_num: int = 0) -> int:
+        """
+        Appends one item and publishes it.
+        :return: The index of the new item.
+        """
+        idx = self.num_items.get()
+        # the three columns share a layout, so the slot is worked out once for them
+        seg_num, seg_slot = divmod(HDR_ITEMS + idx, ITEMS_PER_SEG)
+        self.pos.get_seg_view(seg_num, True)[seg_slot] = pos
+        self.ts.get_seg_view(seg_num, True)[seg_slot] = timestamp_ns
+        if self.seq is not None:
+            self.seq.get_seg_view(seg_num, True)[seg_slot] = seq_num
+        self.update_time_index(idx, timestamp_ns)
+        self.update_hop_slices(idx, pos)
+        self.num_items.set(idx + 1)
+        return idx
+
+    def append_many(self, positions, timestamps_ns, seq_nums=None) -> int:
+        """
+        Appends a run of items and publishes them with a single count update.
+        :return: The index of the first new item.
+        """
+        first_idx = self.num_items.get()
+        idx = first_idx
+        for i in range(len(positions)):
+            self.pos.set(idx, positions[i])
+            self.ts.set(idx, timestamps_ns[i])
+            if self.seq is not None:
+                self.seq.set(idx, seq_nums[i] if seq_nums is not None else 0)
+            self.update_time_index(idx, timestamps_ns[i])
+            self.update_hop_slices(idx, positions[i])
+            idx += 1
+        self.num_items.set(idx)
+        return first_idx
+
+    def truncate(self, num_items: int):
+        """
+        Drops the items from num_items on (recovery rolling back a cut tx) and restores
+        the writer's running timestamp and end offset for the items left.
+        """
+        if num_items >= self.num_items.get():
+            return
+        self.num_items.set(num_items)
+        self.flag_gen.set(self.flag_gen.get() + 1)
+        if self.hop_foreign_idx_plus_1.get() > num_items:
+            self.hop_foreign_idx_plus_1.set(0)
+        self.running_ts_ns = 0
+        self.running_end_off = 0
+        self.recover_time_index()
+        self.recover_hop_slices()
+
+    def set_pos_flag(self, idx: int, flag: int):
+        """
+        Sets or clears the Pos flag bit of item idx in place (OP_SET_ITEM_POS_FLAG), then
+        bumps the flag generation so readers caching what the flags say (msg_patch.PatchOverlay)
+        know to look again.
+        """
+        pos = self.pos.get(idx)
+        self.pos.set(idx, (pos & ~(Pos.FLAG_MASK << Pos.FLAG_SHIFT)) | ((flag & Pos.FLAG_MASK) << Pos.FLAG_SHIFT))
+        self.flag_gen.set(self.flag_gen.get() + 1)
+
+    def get_flag_gen(self) -> int:
+        return self.flag_gen.get()
+
+    def find_seq_num(self, seq_num: int, end_idx: int = None) -> int:
+        """
+        Finds the last item before end_idx carrying seq_num, scanning backwards a segment
+        chunk at a time.
+        :return: The index found, or -1 if there is none.
+        """
+        if self.seq is None:
+            raise Exception(f"vec has no seq_num column; vec_path={self.vec_path}")
+        num_items = self.num_items.get()
+        end_idx = num_items if end_idx is None else min(end_idx, num_items)
+        chunks = list(self.seq.chunks(0, end_idx))
+        idx = end_idx
+        for chunk in reversed(chunks):
+            idx -= len(chunk)
+            if np is not None:
+                hits = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint64) == np.uint64(seq_num))
+                if len(hits) > 0:
+                    return idx + int(hits[-1])
+            else:
+                for i in range(len(chunk) - 1, -1, -1):
+                    if chunk[i] == seq_num:
+                        return idx + i
+        return -1
+
+    def get_item(self, idx: int) -> VecItem:
+        return VecItem(self.pos.get(idx), self.ts.get(idx), self.seq.get(idx) if self.seq is not None else 0)
+
+    def get_range(self, start: int, stop: int):
+        """
+        :return: (pos, timestamp_ns, seq_num or None) NumPy arrays for items [start, stop),
+                 clipped to the committed item count; see VecColumn.view() on close().
+        """
+        stop = min(stop, self.num_items.get())
+        start = min(start, stop)
+        return (self.pos.view(start, stop),
+                self.ts.view(start, stop),
+                self.seq.view(start, stop) if self.seq is not None else None)
+
+    def seek_timestamp(self, ts_ns: int, begin_idx: int = 0, end_idx: int = None) -> int:
+        """
+        Finds the first item in [begin_idx, end_idx) whose timestamp is >= ts_ns, treating
+        zero timestamps as carrying the previous one forward (so they never match).
+        Binary searches the sparse time index, then scans at most one block.
+        :return: The index found, or end_idx if every item is earlier.
+        """
+        num_items = self.num_items.get()
+        end_idx = num_items if end_idx is None else min(end_idx, num_items)
+        if begin_idx >= end_idx:
+            return end_idx
+
+        stride = self.time_index_stride.get()
+        start_idx = begin_idx
+        if self.time_index is not None:
+            lo = begin_idx // stride
+            hi = end_idx // stride
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.time_index.get(mid) < ts_ns:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            start_idx = max(begin_idx, lo * stride)
+        return self.scan_timestamp(ts_ns, start_idx, end_idx)
+
+    def scan_timestamp(self, ts_ns: int, begin_idx: int, end_idx: int) -> int:
+        idx = begin_idx
+        for chunk in self.ts.chunks(begin_idx, end_idx):
+            if np is not None:
+                chunk_ts = np.frombuffer(chunk, dtype=np.int64)
+                hits = (chunk_ts >= ts_ns) & (chunk_ts != 0)
+                if hits.any():
+                    return idx + int(hits.argmax())
+            else:
+                for i, item_ts_ns in enumerate(chunk):
+                    if item_ts_ns >= ts_ns and item_ts_ns != 0:
+                        return idx + i
+            idx += len(chunk)
+        return end_idx
+
+    def seek_hop_end_off(self, end_off: int, begin_idx: int, end_idx: int) -> int:
+        """
+        Finds the first item in [begin_idx, end_idx) whose data on the hop stream ends past
+        end_off (the stream's committed_len), given that the items before begin_idx are
+        within it. end_idx should be at most get_hop_end_idx().
+        :return: The index found, or end_idx if every item is within end_off.
+        """
+        if begin_idx >= end_idx:
+            return end_idx
+
+        start_idx = begin_idx
+        if self.hop_slices is not None:
+            # slices wholly below end_idx are written; hop over them a level further each time
+            lo = begin_idx // HOP_SLICE_ITEMS
+            num_slices = end_idx // HOP_SLICE_ITEMS
+            bound = lo
+            hop = 1
+            while bound < num_slices and self.hop_slices.get(bound) <= end_off:
+                lo = bound + 1
+                bound += hop
+                hop *= HOP_FANOUT
+            hi = min(bound, num_slices)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.hop_slices.get(mid) <= end_off:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            start_idx = max(begin_idx, lo * HOP_SLICE_ITEMS)
+        return self.scan_end_off(end_off, start_idx, end_idx)
+
+    def scan_end_off(self, end_off: int, begin_idx: int, end_idx: int) -> int:
+        hop_strm_num = self.hop_strm_num_plus_1.get() - 1
+        idx = begin_idx
+        for chunk in self.pos.chunks(begin_idx, end_idx):
+            if np is not None:
+                positions = np.frombuffer(chunk, dtype=np.uint64)
+                item_end_offs = (positions & np.uint64(Pos.STRM_OFF_MASK)) + ((positions >> np.uint64(Pos.LEN_SHIFT)) & np.uint64(Pos.LEN_MASK))
+                hits = (item_end_offs > end_off) & (((positions >> np.uint64(Pos.STRM_NUM_SHIFT)) & np.uint64(Pos.STRM_NUM_MASK)) == hop_strm_num)
+                if hits.any():
+                    return idx + int(hits.argmax())
+            else:
+                for i, pos in enumerate(chunk):
+                    if (((pos >> Pos.STRM_NUM_SHIFT) & Pos.STRM_NUM_MASK) == hop_strm_num
+                            and (pos & Pos.STRM_OFF_MASK) + ((pos >> Pos.LEN_SHIFT) & Pos.LEN_MASK) > end_off):
+                        return idx + i
+            idx += len(chunk)
+        return end_idx
+
+    def close(self):
+        self.magic.release()
+        self.num_items.release()
+        self.time_index_stride.release()
+        self.hop_strm_num_plus_1.release()
+        self.hop_foreign_idx_plus_1.release()
+        self.flag_gen.release()
+        for column in (self.pos, self.ts, self.seq, self.time_index, self.hop_slices):
+            if column is not None:
+                column.close()
+
+    @classmethod
+    def remove_files(cls, vec_path: str):
+        for suffix in (cls.POS_SUFFIX, cls.TS_SUFFIX, cls.SEQ_SUFFIX, cls.TIME_INDEX_SUFFIX, cls.HOP_SLICE_SUFFIX):
+            if os.path.exists(vec_path + suffix):
+                os.remove(vec_path + suffix)
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persistance.lock_free_journal import LockFreeJournal
+
+
+@pytest.fixture
+def lfj_name(tmp_path):
+    return str(tmp_path / "lfj")
+
+
+@pytest.fixture
+def open_journal():
+    """
+    Opens journals with LockFreeJournal.open() and closes whatever is still open at teardown.
+    """
+    journals = []
+
+    def open_(lfj_name, is_writeable=True, is_rollbackable=True, **kwargs):
+        lfj = LockFreeJournal()
+        journals.append(lfj)
+        return lfj.open(lfj_name, is_writeable, is_rollbackable, **kwargs)
+
+    yield open_
+    for lfj in reversed(journals):
+        lfj.close()
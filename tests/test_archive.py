@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from persistance.archive import ARCHIVE_SUFFIX, Codec, compact_journal
+from persistance.lock_free_journal import StrmType, VecType
+from persistance.rup_pos import Pos
+from persistance.tx_builder import TxBuilder
+
+
+def write_journal(open_journal, lfj_name, msgs):
+    lfj = open_journal(lfj_name)
+    _, strm = lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test", strm_type=StrmType.DATA_STREAM)
+    positions = strm.append_batch(msgs, "test")
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm())
+    tx_builder.begin(1)
+    tx_builder.fill([0] * len(msgs), list(range(len(msgs))), positions, 1)
+    tx_builder.commit()
+    return lfj
+
+
+def test_archive_round_trip(open_journal, lfj_name):
+    msgs = [bytes([i % 251]) * (100 + i * 37) for i in range(200)]
+    write_journal(open_journal, lfj_name, msgs).close()
+
+    results = compact_journal(lfj_name, remove_originals=True, codec=Codec.ZLIB, block_size=4096)
+    assert [strm_name for strm_name, _, _ in results] == ["V"]
+    assert not os.path.exists(os.path.join(lfj_name, "V"))
+    assert os.path.exists(os.path.join(lfj_name, "V" + ARCHIVE_SUFFIX))
+
+    lfj = open_journal(lfj_name, False, False)
+    vec = lfj.get_vec(0)
+    for idx, msg in enumerate(msgs):
+        data_1, data_2 = lfj.locate_data_by_pos(vec.get_vec_item_pos(idx))
+        assert data_2 is None and bytes(data_1) == msg
+    strm = lfj.get_strm(vec.get_vec_item_pos(0).get_strm_num())
+    with pytest.raises(Exception, match="archived"):
+        strm.map_seg(0, False, "test")
+    lfj.close()
+
+    with pytest.raises(Exception, match="archived strm cannot be opened for writing"):
+        open_journal(lfj_name)
+
+
+def test_compact_fails_while_writer_has_journal_open(open_journal, lfj_name):
+    write_journal(open_journal, lfj_name, [b"a", b"b"])
+    with pytest.raises(Exception, match="locked by a writer"):
+        compact_journal(lfj_name, remove_originals=True)
+    assert os.path.exists(os.path.join(lfj_name, "V"))
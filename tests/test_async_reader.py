@@ -0,0 +1,37 @@
+import asyncio
+
+from persistance.async_reader import AsyncJournalReader
+from persistance.lock_free_journal import VecType
+from persistance.tx_builder import TxBuilder
+
+
+def commit_msgs(lfj, strm, seq_num, msgs):
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm())
+    tx_builder.begin(seq_num)
+    tx_builder.fill([0] * len(msgs), [seq_num] * len(msgs), strm.append_batch(msgs, "test"), seq_num)
+    tx_builder.commit()
+
+
+def test_follow_wakes_on_commit_and_close_closes_eventfd(open_journal, lfj_name):
+    writer = open_journal(lfj_name)
+    _, strm = writer.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    commit_msgs(writer, strm, 1, [b"a", b"b"])
+    reader_lfj = open_journal(lfj_name, False, False)
+
+    async def follow():
+        reader = AsyncJournalReader(reader_lfj, batch_size=2, timeout_secs=5)
+        batches = []
+        async for batch in reader.follow(0):
+            batches.append([(idx, bytes(data)) for idx, _, _, data in batch])
+            if len(batches) == 1:
+                # the bridge thread blocks on the doorbell; only this ring wakes the loop
+                asyncio.get_running_loop().call_later(0.05, commit_msgs, writer, strm, 2, [b"c"])
+            else:
+                break
+        event_fd = reader.event_fd
+        reader.close()
+        return batches, event_fd
+
+    batches, event_fd = asyncio.run(asyncio.wait_for(follow(), 10))
+    assert batches == [[(0, b"a"), (1, b"b")], [(2, b"c")]]
+    assert event_fd.fd == -1
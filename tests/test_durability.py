@@ -0,0 +1,48 @@
+import threading
+
+from persistance.durability import DurabilityPolicy
+from persistance.lock_free_journal import SEG_SIZE, StrmType
+
+
+def test_group_commit_flushes_while_writers_roll_over(open_journal, lfj_name):
+    lfj = open_journal(lfj_name, durability_policy=DurabilityPolicy.group_commit(interval_secs=0.01))
+    strms = [lfj.create_strm(f"S{i}", StrmType.DATA_STREAM, "test") for i in range(2)]
+    msg = b"x" * 100000
+    errors = []
+
+    def write(strm):
+        try:
+            for _ in range(2 * SEG_SIZE // len(msg) + 1):
+                strm.append_batch([msg], "test")
+                lfj.durability.wait_durable(5)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(strm,)) for strm in strms]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert lfj.durability.wait_durable(5)
+    for strm in strms:
+        assert strm.get_committed_len() > 2 * SEG_SIZE
+        assert strm.on_disk_strm_info.durable_len.get() == strm.get_committed_len()
+
+
+def test_every_n_bytes_counts_commits_of_all_strms(open_journal, lfj_name):
+    lfj = open_journal(lfj_name, durability_policy=DurabilityPolicy.every_n_bytes(1 << 40))
+    strms = [lfj.create_strm(f"S{i}", StrmType.DATA_STREAM, "test") for i in range(4)]
+    base = lfj.durability.bytes_since_flush
+
+    def write(strm):
+        for _ in range(500):
+            strm.append_batch([b"abcd"], "test")
+
+    threads = [threading.Thread(target=write, args=(strm,)) for strm in strms]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert lfj.durability.bytes_since_flush - base == 4 * 500 * 4
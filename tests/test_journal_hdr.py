@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+
+import pytest
+
+from persistance.lock_free_journal import LockFreeJournal, SEG_SIZE, VecType
+
+
+def test_vec_is_published_after_its_columns(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    with pytest.raises(OSError):
+        lfj.create_vec_with_strm("missing_dir/V", VecType.MSG_VEC, "test", strm_name="S")
+    hdr = lfj.on_disk_journal_hdr
+    assert hdr.vec_infos[0].vec_num_plus_1 == 0
+    assert hdr.highest_committed_vec_num_plus_1_word.get() == 0
+
+    lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    for suffix in (".pos", ".ts"):
+        assert os.path.exists(f"{lfj_name}/V{suffix}")
+    assert hdr.get_highest_committed_vec_num() == 1
+    assert hdr.vec_infos[1].name == "V"
+
+
+@pytest.mark.parametrize("is_writeable", [False, True])
+def test_open_checks_header_magic(open_journal, lfj_name, is_writeable):
+    open_journal(lfj_name).close()
+    with open(os.path.join(lfj_name, LockFreeJournal.LFJ_STRM_0_NAME), "r+b") as f:
+        f.write(bytes(8))
+    with pytest.raises(Exception, match="magic"):
+        open_journal(lfj_name, is_writeable, is_writeable)
+
+
+def test_open_rejects_short_strm_0(open_journal, lfj_name):
+    os.makedirs(lfj_name)
+    with open(os.path.join(lfj_name, LockFreeJournal.LFJ_STRM_0_NAME), "wb") as f:
+        f.write(bytes(SEG_SIZE // 2))
+    with pytest.raises(Exception, match="shorter than one segment"):
+        open_journal(lfj_name, False, False)
+
+
+def test_concurrent_creates_keep_watermarks_at_max(open_journal, lfj_name, monkeypatch):
+    lfj = open_journal(lfj_name)
+    hdr = lfj.on_disk_journal_hdr
+    set_word = type(hdr.highest_committed_strm_num_word).set
+
+    def slow_set(word, value):
+        # widens the window between the compare and the store
+        time.sleep(0.001)
+        set_word(word, value)
+
+    monkeypatch.setattr(type(hdr.highest_committed_strm_num_word), "set", slow_set)
+    threads = [threading.Thread(target=lfj.create_vec_with_strm, args=(f"V{i}", VecType.MSG_VEC, "test")) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    monkeypatch.undo()
+
+    assert hdr.get_highest_committed_strm_num() == 16
+    assert hdr.get_highest_committed_vec_num() == 15 and hdr.highest_vec_num_plus_1 == 16
@@ -0,0 +1,110 @@
+import csv
+import io
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import pytest
+
+from persistance.lfj_dump import dump_journal
+from persistance.lock_free_journal import LockFreeJournal, StrmType, VecType
+from persistance.tx_builder import TxBuilder
+
+NUM_TXS = 40
+
+
+def write_journal(open_journal, lfj_name):
+    """
+    Commits NUM_TXS txs alternating between two TX streams, tx k carrying an item with
+    seq_num k and timestamp 1000 + k for each of V1 and V0, then a tx patching V0's first item.
+    """
+    lfj = open_journal(lfj_name)
+    _, strm = lfj.create_vec_with_strm("V0", VecType.MSG_VEC, "test")
+    lfj.create_vec_with_strm("V1", VecType.MSG_VEC, "test", strm_name="V1")
+    tx_builders = [TxBuilder(lfj.create_strm(f"TX_{i}", StrmType.TX_STREAM, "test")) for i in range(2)]
+    for k in range(NUM_TXS):
+        tx_builder = tx_builders[(k * 7 // 3) % 2]
+        tx_builder.begin(1000 + k)
+        tx_builder.fill([1, 0], [k, k], strm.append_batch([bytes([65 + k % 26]) * 10, bytes([97 + k % 26]) * 20], "test"), 1000 + k)
+        tx_builder.commit()
+    tx_builders[0].begin(2000)
+    tx_builders[0].patch_item(0, 100, 0, [(0, b"Z")], 2000)
+    tx_builders[0].commit()
+    lfj.close()
+
+
+def dump(lfj_name, kind, **kwargs):
+    out = io.StringIO()
+    kwargs.setdefault("num_workers", 0)
+    num_rows = dump_journal(lfj_name, kind, out, "csv", **kwargs)
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert len(rows) == num_rows
+    return rows
+
+
+def test_tx_rows_in_commit_order(open_journal, lfj_name):
+    write_journal(open_journal, lfj_name)
+    rows = dump(lfj_name, "tx", level=LockFreeJournal.PRINT_MORE)
+    assert len(rows) == 2 * NUM_TXS + 1
+    assert [int(row["global_tx_seq"]) for row in rows] == sorted(int(row["global_tx_seq"]) for row in rows)
+    assert [(row["vec_name"], int(row["seq_num"])) for row in rows[:4]] == [("V1", 0), ("V0", 0), ("V1", 1), ("V0", 1)]
+    assert rows[0]["op"] == "OP_SET_VEC_ITEM" and rows[0]["payload"] == "A" * 10 and rows[0]["len"] == "10"
+    assert rows[-1]["op"] == "OP_PATCH_MSG" and rows[-1]["timestamp_ns"] == "2000"
+    assert len({row["tx_strm_num"] for row in rows}) == 2
+
+
+def test_workers_keep_commit_order(open_journal, lfj_name):
+    write_journal(open_journal, lfj_name)
+    context = multiprocessing.get_context("fork")
+    for kind in ("tx", "items"):
+        expected = dump(lfj_name, kind, level=LockFreeJournal.PRINT_ALL)
+        assert dump(lfj_name, kind, level=LockFreeJournal.PRINT_ALL, num_workers=3, shard_bytes=200, task_items=7,
+                    mp_context=context) == expected
+
+
+def test_item_rows_and_filters(open_journal, lfj_name):
+    write_journal(open_journal, lfj_name)
+    rows = dump(lfj_name, "items")
+    assert len(rows) == 2 * NUM_TXS + 1
+    assert [(row["vec_name"], int(row["idx"])) for row in rows[:2]] == [("V0", 0), ("V0", 1)]
+    assert rows[NUM_TXS]["flag"] == "1" and "payload" in rows[0] and rows[0]["payload"] == ""
+
+    rows = dump(lfj_name, "items", vec_patterns=["V1"], seq_from=10, seq_to=20)
+    assert [(row["vec_name"], int(row["seq_num"])) for row in rows] == [("V1", k) for k in range(10, 20)]
+    rows = dump(lfj_name, "items", vec_patterns=["V*"], time_from_ns=1005, time_to_ns=1008)
+    assert sorted((row["vec_name"], int(row["timestamp_ns"])) for row in rows) == [(name, 1000 + k) for name in ("V0", "V1") for k in range(5, 8)]
+    assert dump(lfj_name, "items", vec_patterns=["X*"]) == []
+
+
+def test_tx_filters(open_journal, lfj_name):
+    write_journal(open_journal, lfj_name)
+    rows = dump(lfj_name, "tx", op_names=["OP_PATCH_MSG"])
+    assert [(row["op"], row["vec_name"], row["seq_num"]) for row in rows] == [("OP_PATCH_MSG", "V0", "100")]
+    rows = dump(lfj_name, "tx", vec_patterns=["V0"], seq_from=38, time_to_ns=2000)
+    assert [(row["vec_name"], int(row["seq_num"])) for row in rows] == [("V0", 38), ("V0", 39)]
+    with pytest.raises(Exception, match="unknown op names"):
+        dump(lfj_name, "tx", op_names=["OP_NOPE"])
+
+    rows = dump(lfj_name, "tx", level=LockFreeJournal.PRINT_NONE)
+    assert [(row["op"], row["num_rows"]) for row in rows] == [("OP_PATCH_MSG", "1"), ("OP_SET_VEC_ITEM", str(2 * NUM_TXS))]
+
+
+def test_strm_rows(open_journal, lfj_name):
+    write_journal(open_journal, lfj_name)
+    rows = dump(lfj_name, "strms")
+    by_name = {os.path.basename(row["strm_name"]): row for row in rows}
+    assert {"V0", "V1", "TX_0", "TX_1"} <= set(by_name)
+    assert by_name["V0"]["strm_type"] == "TX_DATA_STREAM" and int(by_name["V0"]["committed_len"]) == NUM_TXS * 30
+    assert by_name["TX_0"]["strm_type"] == "TX_STREAM" and int(by_name["TX_0"]["committed_len"]) > 0
+
+
+def test_command_line(open_journal, lfj_name):
+    write_journal(open_journal, lfj_name)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-m", "persistance.lfj_dump", lfj_name, "tx", "--format", "csv", "--workers", "2",
+                             "--vec", "V1", "--seq-from", "3", "--seq-to", "6", "--time-from", "1970-01-01T00:00:00.000001",
+                             "--op", "OP_SET_VEC_ITEM"],
+                            cwd=root, capture_output=True, text=True, check=True)
+    rows = list(csv.DictReader(io.StringIO(result.stdout)))
+    assert [(row["vec_name"], int(row["seq_num"])) for row in rows] == [("V1", 3), ("V1", 4), ("V1", 5)]
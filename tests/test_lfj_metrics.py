@@ -0,0 +1,45 @@
+from persistance.lock_free_journal import SEG_SIZE, StrmType, VecType
+from persistance.tx_builder import TxBuilder
+
+
+def test_commits_are_counted_and_exported(open_journal, lfj_name, tmp_path):
+    lfj = open_journal(lfj_name)
+    vec, strm = lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test", strm_type=StrmType.DATA_STREAM)
+    positions = strm.append_batch([b"a" * 10, b"b" * 20], "test")
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm())
+    tx_builder.begin(1)
+    tx_builder.fill([0, 0], [1, 2], positions, 1)
+    tx_builder.commit()
+
+    with strm.strm_write_mutex:
+        strm.reserve(5, "test")[:] = b"ccccc"
+        strm.commit_many([5], "test")
+    buf = strm.buf_malloc(8, "test")
+    buf[:8] = b"dddddddd"
+    strm.buf_commit(8, "test")
+    strm.buf_free(buf, "test")
+    strm.append_batch([bytes(100000)] * (SEG_SIZE // 100000), "test")
+    # a reservation crossing the segment end goes through a heap buffer
+    with strm.strm_write_mutex:
+        strm.reserve(200000, "test")
+        strm.commit_many([100000, 100000], "test")
+
+    strm_metrics = lfj.metrics.get_strm_metrics(strm.get_strm_num(), "V")
+    num_bursts = 5
+    assert strm_metrics.committed_msgs == 2 + 1 + 1 + SEG_SIZE // 100000 + 2
+    assert strm_metrics.committed_bytes == strm.get_committed_len()
+    assert strm_metrics.heap_buf_spills == 1
+    assert strm_metrics.commit_latency.get_count() == num_bursts
+
+    snapshot = lfj.metrics.snapshot()
+    assert snapshot["strms"]["V"]["heap_buf_spills"] == 1
+    assert snapshot["strms"]["V"]["commit_latency_p99_ns"] > 0 and snapshot["tx_latency_p99_ns"] > 0
+
+    text_path = str(tmp_path / "lfj.prom")
+    lfj.metrics.export(text_path)
+    with open(text_path) as f:
+        lines = f.read().splitlines()
+    assert f'lfj_strm_committed_bytes_total{{strm="V"}} {strm.get_committed_len()}' in lines
+    assert 'lfj_strm_heap_buf_spills_total{strm="V"} 1' in lines
+    assert f'lfj_strm_commit_latency_ns_count{{strm="V"}} {num_bursts}' in lines
+    assert "lfj_tx_latency_ns_count 1" in lines
@@ -0,0 +1,152 @@
+import pytest
+
+from persistance.lock_free_journal import SEG_SIZE, LockFreeJournal, StrmType, VecType
+from persistance.rup_pos import Pos
+
+MSGS = [b"first", b"second message", bytes(range(256))]
+
+
+def read_msg(lfj, pos):
+    data_1, data_2 = lfj.locate_data_by_pos(Pos.from_uint64(pos))
+    return bytes(data_1) if data_2 is None else bytes(data_1) + bytes(data_2)
+
+
+def create_journal(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    vec, strm = lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    positions = strm.append_batch(MSGS, "test")
+    for i, pos in enumerate(positions):
+        vec.append_item(pos, 1000 + i)
+    committed_len = strm.get_committed_len()
+    lfj.close()
+    return list(positions), committed_len
+
+
+@pytest.mark.parametrize("is_writeable", [False, True])
+def test_reopen(open_journal, lfj_name, is_writeable):
+    positions, committed_len = create_journal(open_journal, lfj_name)
+
+    lfj = open_journal(lfj_name, is_writeable, is_writeable)
+    assert lfj is not None and lfj.is_initialized
+    strm = lfj.get_strm(Pos.from_uint64(positions[0]).get_strm_num())
+    assert strm.get_committed_len() == committed_len
+    vec = lfj.get_vec(0)
+    assert vec.get_max_item_idx() == len(MSGS)
+    assert [read_msg(lfj, pos) for pos in positions] == MSGS
+    assert [vec.get_vec_item(idx).timestamp_ns for idx in range(len(MSGS))] == [1000, 1001, 1002]
+
+    if is_writeable:
+        pos = strm.append_batch([b"after reopen"], "test")[0]
+        vec.append_item(pos, 2000)
+        lfj.close()
+        lfj = open_journal(lfj_name, False, False)
+        assert read_msg(lfj, lfj.get_vec(0).get_vec_item_pos(3).to_uint64()) == b"after reopen"
+
+
+def test_open_missing_read_only(lfj_name):
+    assert LockFreeJournal().open(lfj_name, False, False) is None
+
+
+def test_second_writer_is_locked_out(open_journal, lfj_name):
+    open_journal(lfj_name)
+    with pytest.raises(Exception, match="write lock"):
+        open_journal(lfj_name)
+
+
+def test_create_strm_truncates_leftover(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    with open(f"{lfj_name}/S", "wb") as f:
+        f.write(b"leftover")
+    strm = lfj.create_strm("S", StrmType.DATA_STREAM, "test")
+    assert strm.get_committed_len() == 0
+    pos = strm.append_batch([b"new"], "test")[0]
+    assert read_msg(lfj, pos) == b"new"
+
+
+def test_old_module_paths_reexport_the_journal():
+    from persistance import lock_free_journal, rup_journal, rup_strm
+
+    assert rup_journal.LockFreeJournal is lock_free_journal.LockFreeJournal
+    assert rup_journal.StrmType is lock_free_journal.StrmType
+    assert rup_strm.Strm is lock_free_journal.LockFreeJournal.Strm
+
+
+def fill_strm_to(strm, strm_off):
+    lengths = [100000] * ((strm_off - strm.get_committed_len()) // 100000)
+    lengths.append(strm_off - strm.get_committed_len() - sum(lengths))
+    strm.append_batch([bytes(length) for length in lengths], "test")
+
+
+def test_buf_malloc_and_commit(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    strm = lfj.create_strm("S", StrmType.DATA_STREAM, "test")
+    buf = strm.buf_malloc(64, "test")
+    assert isinstance(buf, memoryview) and strm.alloc_heap_buf is None
+    buf[:5] = b"first"
+    strm.buf_commit(5, "test")
+
+    # the committed front is dropped; the rest of the buffer starts at committed_len
+    buf = strm.buf_compact_and_realloc(5, 64, "test")
+    buf[:6] = b"second"
+    pos = strm.buf_commit(6, "test")
+    assert (pos.get_strm_off(), strm.get_committed_len()) == (5, 11)
+    assert read_msg(lfj, pos.to_uint64()) == b"second"
+
+    # a buffer crossing into the next segment spills to the heap
+    fill_strm_to(strm, SEG_SIZE - 100)
+    buf = strm.buf_malloc(200, "test")
+    assert strm.alloc_heap_buf is not None
+    msg = bytes(range(150))
+    buf[:150] = msg
+    pos = strm.buf_commit(150, "test")
+    buf = strm.buf_compact_and_realloc(100, 200, "test")
+    assert bytes(buf[:50]) == msg[100:]
+    with pytest.raises(Exception, match="exceed alloc_buf"):
+        strm.buf_commit(151, "test")
+    strm.buf_free(buf, "test")
+    assert read_msg(lfj, pos.to_uint64()) == msg
+
+
+def test_get_data_by_iovec_returns_segment_views(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    strm = lfj.create_strm("S", StrmType.DATA_STREAM, "test")
+    fill_strm_to(strm, SEG_SIZE - 3)
+    strm.append_batch([b"abcdef"], "test")
+
+    iov = strm.get_data_by_iovec(SEG_SIZE - 4, SEG_SIZE + 3)
+    assert [bytes(data) for data in iov] == [b"\0abc", b"def"]
+    assert all(isinstance(data, memoryview) for data in iov)
+    assert [bytes(data) for data in strm.get_data_by_iovec(SEG_SIZE + 1, SEG_SIZE + 3)] == [b"ef"]
+    assert strm.get_data_by_iovec(5, 5) == []
+    # views, not copies: they see the mapped bytes
+    iov[1][0:1] = b"D"
+    assert bytes(strm.get_data_by_iovec(SEG_SIZE, SEG_SIZE + 1)[0]) == b"D"
+    del iov
+
+
+def test_buf_realloc_crosses_segment_in_overlap_window(open_journal, lfj_name):
+    lfj = open_journal(lfj_name, seg_overlap=4096)
+    strm = lfj.create_strm("S", StrmType.DATA_STREAM, "test")
+    fill_strm_to(strm, SEG_SIZE - 100)
+    # past the window it spills to the heap
+    buf = strm.buf_malloc(5000, "test")
+    assert strm.alloc_heap_buf is not None
+    buf[:50] = b"a" * 50
+    strm.buf_commit(50, "test")
+
+    # the realloc reaches past the segment end but stays within the window: no heap buffer
+    buf = strm.buf_compact_and_realloc(50, 3000, "test")
+    assert strm.alloc_heap_buf is None and len(buf) == 3000
+    msg = bytes(i % 251 for i in range(2000))
+    buf[:2000] = msg
+    pos = strm.buf_commit(2000, "test")
+    assert read_msg(lfj, pos.to_uint64()) == msg
+    data_1, data_2 = strm.locate_data(SEG_SIZE, 1950, "test")
+    assert bytes(data_1) == msg[50:] and data_2 is None
+
+    buf = strm.buf_compact_and_realloc(2000, 100, "test")
+    assert strm.alloc_heap_buf is None
+    buf[:10] = b"0123456789"
+    pos = strm.buf_commit(10, "test")
+    assert pos.get_strm_off() == SEG_SIZE + 1950 and read_msg(lfj, pos.to_uint64()) == b"0123456789"
+    strm.buf_free(buf, "test")
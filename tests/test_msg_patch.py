@@ -0,0 +1,76 @@
+import pytest
+
+from persistance.lock_free_journal import VecType
+from persistance.msg_patch import encode_patch
+from persistance.tx_builder import TxBuilder
+from persistance.txt_patch_msg import TxPatchMsg
+
+
+def write_base(lfj):
+    vec, strm = lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm())
+    tx_builder.begin(1)
+    tx_builder.fill([0, 0], [1, 2], strm.append_batch([b"hello world", b"other"], "test"), 1)
+    tx_builder.commit()
+    return vec, strm, tx_builder
+
+
+def test_patches_are_materialized(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    vec, _, _ = write_base(lfj)
+    tx_patch_msg = TxPatchMsg(lfj)
+    tx_patch_msg.set_vec(vec)
+    tx_patch_msg.execute(3, 0, [(0, b"J")], 2, "test")
+    tx_patch_msg.execute(4, 0, [(6, b"there!")], 3, "test")
+
+    assert bytes(vec.get_materialized(0)) == b"Jello there!"
+    assert bytes(vec.get_materialized(1)) == b"other"
+    assert bytes(vec.get_materialized(2)) == b"Jello world"
+    assert bytes(vec.get_materialized(3)) == b"Jello there!"
+    assert vec.get_materialized(4) is None
+    lfj.close()
+
+    lfj = open_journal(lfj_name, False, False)
+    vec = lfj.get_vec(0)
+    assert bytes(vec.get_materialized(0)) == b"Jello there!"
+    assert bytes(vec.get_materialized(2)) == b"Jello world"
+
+
+def test_flag_op_resets_overlay(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    vec, strm, tx_builder = write_base(lfj)
+    tx_builder.begin(2)
+    tx_builder.set_vec_item(0, 3, strm.append_batch([encode_patch(0, [(0, b"Y")])], "test")[0], 2)
+    tx_builder.commit()
+    assert bytes(vec.get_materialized(0)) == b"hello world"
+
+    tx_builder.begin(3)
+    tx_builder.set_item_pos_flag(1, 0, 3)
+    tx_builder.commit()
+    assert bytes(vec.get_materialized(0)) == b"Yello world"
+
+    tx_builder.begin(4)
+    tx_builder.set_item_pos_flag(0, 0, 3)
+    tx_builder.commit()
+    assert bytes(vec.get_materialized(0)) == b"hello world"
+
+
+def test_invalid_patch_base_is_refused(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    vec, strm, tx_builder = write_base(lfj)
+    tx_builder.begin(2)
+    tx_builder.patch_item(0, 3, 2, [(0, b"x")], 2)
+    with pytest.raises(Exception, match="earlier item"):
+        tx_builder.commit()
+
+    tx_builder.begin(2)
+    tx_builder.patch_item(0, 3, 0, [(0, b"x")], 2)
+    tx_builder.patch_item(0, 4, 2, [(0, b"y")], 2)
+    with pytest.raises(Exception, match="patch itself"):
+        tx_builder.commit()
+
+    tx_builder.begin(2)
+    tx_builder.set_item_pos_flag(1, 0, 2)
+    with pytest.raises(Exception, match="shorter than its header"):
+        tx_builder.commit()
+    assert vec.get_max_item_idx() == 2
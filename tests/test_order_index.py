@@ -0,0 +1,62 @@
+from persistance.lock_free_journal import VecType
+from persistance.order_index import INDEXED_LENS_WORD
+from persistance.tx_builder import TxBuilder
+
+
+def commit_orders(lfj, strm, orders):
+    """
+    Commits one tx per (vec_num, seq_num) in orders.
+    :return: The packed Pos of each item, in order.
+    """
+    positions = []
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm())
+    for vec_num, seq_num in orders:
+        pos = strm.append_batch([f"{vec_num}/{seq_num}/{len(positions)}".encode()], "test")[0]
+        tx_builder.begin(len(positions) + 1)
+        tx_builder.set_vec_item(vec_num, seq_num, pos, len(positions) + 1)
+        tx_builder.commit()
+        positions.append(pos)
+    return positions
+
+
+def get_expected(orders, positions, key):
+    return [pos for order, pos in zip(orders, positions) if order == key]
+
+
+def test_lookup_after_catch_up(open_journal, lfj_name):
+    lfj = open_journal(lfj_name, order_index=True)
+    lfj.create_vec_with_strm("O0", VecType.ORDER_VEC, "test")
+    _, strm = lfj.create_vec_with_strm("O1", VecType.ORDER_VEC, "test", strm_name="O1")
+    orders = [(0, 5), (1, 5), (0, 6), (0, 5)]
+    positions = commit_orders(lfj, strm, orders)
+    assert list(lfj.get_order_positions(0, 5)) == get_expected(orders, positions, (0, 5))
+    assert list(lfj.get_order_positions(1, 7)) == []
+    lfj.close()
+
+    # txs committed while the index is not kept are indexed by the next catch_up
+    lfj = open_journal(lfj_name)
+    more_orders = [(0, 5), (1, 5), (1, 8)]
+    positions += commit_orders(lfj, lfj.get_strm(strm.get_strm_num()), more_orders)
+    orders += more_orders
+    lfj.close()
+
+    lfj = open_journal(lfj_name, order_index=True)
+    for key in ((0, 5), (1, 5), (0, 6), (1, 8)):
+        assert list(lfj.get_order_positions(*key)) == get_expected(orders, positions, key)
+
+    # a crash between raising committed_len and indexing leaves the stream's indexed length behind
+    tx_strm_num = lfj.get_or_create_own_tx_strm().get_strm_num()
+    tx_strm = lfj.get_strm(tx_strm_num)
+    last_tx_off = tx_strm.get_committed_len()
+    last_orders = [(1, 8)]
+    positions += commit_orders(lfj, lfj.get_strm(strm.get_strm_num()), last_orders)
+    orders += last_orders
+    lfj.order_index.nodes[INDEXED_LENS_WORD + tx_strm_num] = last_tx_off
+    lfj.close()
+
+    lfj = open_journal(lfj_name, order_index=True)
+    assert list(lfj.get_order_positions(1, 8)) == get_expected(orders, positions, (1, 8))
+    lfj.close()
+
+    reader = open_journal(lfj_name, False, False)
+    assert list(reader.get_order_positions(0, 5)) == get_expected(orders, positions, (0, 5))
@@ -0,0 +1,15 @@
+from array import array
+
+from persistance.pos_array import decode_pos_columns
+from persistance.rup_pos import Pos
+
+
+def test_decode_pos_columns_matches_pos_getters():
+    positions = [Pos(i & 0x3ff, i * 4099, i % 500, i & 1) for i in range(1000)]
+    columns = decode_pos_columns(array('Q', (pos.to_uint64() for pos in positions)))
+    assert list(columns.strm_num) == [pos.get_strm_num() for pos in positions]
+    assert list(columns.strm_off) == [pos.get_strm_off() for pos in positions]
+    assert list(columns.len) == [pos.get_len() for pos in positions]
+    assert [bool(flag) for flag in columns.flag] == [bool(pos.get_flag()) for pos in positions]
+    assert [(int(seg_num) << Pos.SEG_NUM_SHIFT) | int(seg_off) for seg_num, seg_off in zip(columns.seg_num, columns.seg_off)] == \
+        [pos.get_strm_off() for pos in positions]
@@ -0,0 +1,130 @@
+import threading
+
+from persistance.lock_free_journal import VecType
+from persistance.msg_patch import encode_patch
+from persistance.rup_pos import Pos
+from persistance.tx_builder import TxBuilder
+
+
+def commit_cut_tx(lfj, num_items_applied=None):
+    """
+    Commits a tx adding an item to vecs 0 and 1, a patch item to vec 0 and a flag on
+    vec 1's second item (which holds a patch of its first), then winds committed_len back as if the writer died before
+    raising it, after applying num_items_applied of its appends (all when None).
+    :return: (tx stream, committed_len before the tx)
+    """
+    tx_strm = lfj.get_or_create_own_tx_strm()
+    strm = lfj.get_strm(lfj.get_vec(0).columns.pos.get(0) >> Pos.STRM_NUM_SHIFT & Pos.STRM_NUM_MASK)
+    positions = strm.append_batch([b"c0", b"c1"], "test")
+    committed_len = tx_strm.get_committed_len()
+    tx_builder = TxBuilder(tx_strm)
+    tx_builder.begin(20)
+    tx_builder.fill([0, 1], [2, 2], positions, 20)
+    tx_builder.patch_item(0, 1, 0, [(0, b"p")], 20)
+    tx_builder.set_item_pos_flag(1, 1, 1)
+    tx_builder.commit()
+
+    assert lfj.get_vec(1).get_vec_item_pos(1).get_flag()
+    if num_items_applied is not None:
+        lfj.get_vec(1).columns.set_pos_flag(1, 0)
+        lfj.get_vec(0).columns.truncate(1 + min(num_items_applied, 1))
+        if num_items_applied < 2:
+            lfj.get_vec(1).columns.truncate(2)
+    tx_strm.on_disk_strm_info.committed_len.set(committed_len)
+    return tx_strm, committed_len
+
+
+def create_journal(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    vec_0, strm = lfj.create_vec_with_strm("V0", VecType.MSG_VEC, "test")
+    lfj.create_vec_with_strm("V1", VecType.MSG_VEC, "test", strm_name="V1")
+    positions = strm.append_batch([b"a0", b"a1", encode_patch(0, [(0, b"b")])], "test")
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm())
+    tx_builder.begin(10)
+    tx_builder.fill([0, 1, 1], [1, 1, 1], positions, 10)
+    tx_builder.commit()
+    return lfj
+
+
+def assert_rolled_back(lfj, tx_strm_num, committed_len):
+    tx_strm = lfj.get_strm(tx_strm_num)
+    assert tx_strm.get_committed_len() == committed_len
+    assert tx_strm.get_valid_len() == committed_len
+    assert tx_strm.get_alloc_len() == committed_len
+    data_1, data_2 = tx_strm.locate_data(committed_len, 64, "test")
+    assert bytes(data_1) == bytes(64)
+    del data_1, data_2
+    assert [lfj.get_vec(vec_num).get_max_item_idx() for vec_num in (0, 1)] == [1, 2]
+    assert not lfj.get_vec(1).get_vec_item_pos(1).get_flag()
+    assert lfj.get_vec(0).get_vec_item(0).seq_num == 1
+
+
+def test_cut_tx_is_rolled_back(open_journal, lfj_name):
+    lfj = create_journal(open_journal, lfj_name)
+    tx_strm, committed_len = commit_cut_tx(lfj)
+    tx_strm_num = tx_strm.get_strm_num()
+    lfj.close()
+
+    lfj = open_journal(lfj_name)
+    assert_rolled_back(lfj, tx_strm_num, committed_len)
+
+    # the journal keeps going from the rolled back state
+    strm = lfj.get_strm(lfj.get_vec(0).get_vec_item_pos(0).get_strm_num())
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm())
+    tx_builder.begin(30)
+    tx_builder.set_vec_item(0, 3, strm.append_batch([b"d0"], "test")[0], 30)
+    tx_builder.commit()
+    assert lfj.get_vec(0).get_max_item_idx() == 2
+
+
+def test_partly_applied_tx_is_rolled_back(open_journal, lfj_name):
+    for num_items_applied in (0, 1):
+        lfj = create_journal(open_journal, f"{lfj_name}_{num_items_applied}")
+        tx_strm, committed_len = commit_cut_tx(lfj, num_items_applied)
+        tx_strm_num = tx_strm.get_strm_num()
+        lfj.close()
+
+        lfj = open_journal(f"{lfj_name}_{num_items_applied}")
+        assert_rolled_back(lfj, tx_strm_num, committed_len)
+
+
+def test_read_only_open_does_not_roll_back(open_journal, lfj_name):
+    lfj = create_journal(open_journal, lfj_name)
+    tx_strm, committed_len = commit_cut_tx(lfj)
+    tx_strm_num = tx_strm.get_strm_num()
+    lfj.close()
+
+    lfj = open_journal(lfj_name, False, False)
+    assert lfj.get_strm(tx_strm_num).get_valid_len() > committed_len
+    assert lfj.get_vec(0).get_max_item_idx() == 3
+
+
+def test_cut_txs_of_several_tx_strms_are_rolled_back_newest_first(open_journal, lfj_name):
+    lfj = create_journal(open_journal, lfj_name)
+    strm = lfj.get_strm(lfj.get_vec(0).get_vec_item_pos(0).get_strm_num())
+    cut = []
+
+    def commit_in_own_tx_strm(vec_num, seq_num):
+        tx_strm = lfj.get_or_create_own_tx_strm()
+        committed_len = tx_strm.get_committed_len()
+        tx_builder = TxBuilder(tx_strm)
+        tx_builder.begin(20)
+        tx_builder.set_vec_item(vec_num, seq_num, strm.append_batch([b"c"], "test")[0], 20)
+        tx_builder.commit()
+        cut.append((tx_strm, committed_len))
+
+    # the older tx of vec 0 is in the TX stream with the lower number
+    for vec_num, seq_num in ((0, 2), (0, 3), (1, 2)):
+        thread = threading.Thread(target=commit_in_own_tx_strm, args=(vec_num, seq_num))
+        thread.start()
+        thread.join()
+    assert [lfj.get_vec(vec_num).get_max_item_idx() for vec_num in (0, 1)] == [3, 3]
+    assert cut[0][0].get_strm_num() < cut[1][0].get_strm_num()
+    for tx_strm, committed_len in cut:
+        tx_strm.on_disk_strm_info.committed_len.set(committed_len)
+    lfj.close()
+
+    lfj = open_journal(lfj_name, recovery_threads=4)
+    assert [lfj.get_vec(vec_num).get_max_item_idx() for vec_num in (0, 1)] == [1, 2]
+    for tx_strm, committed_len in cut:
+        assert lfj.get_strm(tx_strm.get_strm_num()).get_valid_len() == committed_len
@@ -0,0 +1,46 @@
+import multiprocessing
+
+import pytest
+
+from persistance.lock_free_journal import StrmType, VecType
+from persistance.replay import replay_journal
+from persistance.rup_tx import Tx
+from persistance.tx_builder import TxBuilder
+
+RECORD_FORMAT = "<IQB"  # vec_num, seq_num, first message byte
+
+
+def decode(op_code, fields, data_1, data_2):
+    if op_code != Tx.OP_SET_VEC_ITEM:
+        return None
+    vec_num, seq_num = fields[0], fields[1]
+    return vec_num, seq_num, data_1[0]
+
+
+def write_journal(open_journal, lfj_name):
+    """
+    Commits 40 txs alternating between two TX streams, tx k carrying two items with
+    seq_num k whose messages start with byte k.
+    """
+    lfj = open_journal(lfj_name)
+    _, strm = lfj.create_vec_with_strm("V0", VecType.MSG_VEC, "test")
+    lfj.create_vec_with_strm("V1", VecType.MSG_VEC, "test", strm_name="V1")
+    tx_builders = [TxBuilder(lfj.create_strm(f"TX_{i}", StrmType.TX_STREAM, "test")) for i in range(2)]
+    for k in range(40):
+        tx_builder = tx_builders[(k * 7 // 3) % 2]
+        tx_builder.begin(k)
+        tx_builder.fill([1, 0], [k, k], strm.append_batch([bytes([k]) * 10, bytes([k]) * 20], "test"), k)
+        tx_builder.commit()
+    lfj.close()
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_replay_merges_tx_strms_in_commit_order(open_journal, lfj_name, num_workers):
+    write_journal(open_journal, lfj_name)
+    result = replay_journal(lfj_name, decode, RECORD_FORMAT, num_workers=num_workers, shard_bytes=200,
+                            mp_context=multiprocessing.get_context("fork"))
+    records = list(result)
+    assert len(records) == 80
+    assert [global_tx_seq for global_tx_seq, _, _ in records] == sorted(global_tx_seq for global_tx_seq, _, _ in records)
+    assert [(op_idx, record) for _, op_idx, record in records] == [
+        (op_idx, (vec_num, k, k)) for k in range(40) for op_idx, vec_num in enumerate((1, 0))]
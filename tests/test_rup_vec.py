@@ -0,0 +1,37 @@
+import struct
+
+import pytest
+
+from persistance.lock_free_journal import VecType
+from persistance.rup_pos import Pos
+from persistance.rup_vec import AuxTagsStatus
+
+
+@pytest.fixture
+def lfj(open_journal, lfj_name):
+    return open_journal(lfj_name)
+
+
+def append_msg(vec, strm, msg, aux):
+    pos = Pos.from_uint64(strm.append_batch([msg + aux], "test")[0])
+    vec.append_item(Pos(pos.get_strm_num(), pos.get_strm_off(), len(msg)), 1)
+    return vec.get_max_item_idx() - 1
+
+
+def test_aux_tags_status(lfj):
+    vec, strm = lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    ready = append_msg(vec, strm, b"msg", struct.pack("<I", 3) + b"tag")
+    none = append_msg(vec, strm, b"msg", struct.pack("<I", 0))
+    error = append_msg(vec, strm, b"msg", struct.pack("<I", Pos.LEN_MASK + 1))
+    short = append_msg(vec, strm, b"msg", struct.pack("<I", 100) + b"ta")
+    no_len = append_msg(vec, strm, b"msg", b"")
+    committed_len = strm.get_committed_len()
+    vec.append_item(Pos(strm.get_strm_num(), committed_len + 64, 8), 1)
+
+    assert vec.is_aux_tags_committed(ready) == AuxTagsStatus.AuxTagsReady
+    assert vec.is_aux_tags_committed(none) == AuxTagsStatus.AuxTagsNone
+    assert vec.is_aux_tags_committed(error) == AuxTagsStatus.AuxTagsError
+    assert vec.is_aux_tags_committed(short) == AuxTagsStatus.AuxTagsNotReady
+    assert vec.is_aux_tags_committed(no_len) == AuxTagsStatus.AuxTagsNotReady
+    assert vec.is_aux_tags_committed(no_len + 1) == AuxTagsStatus.AuxTagsNotReady
+    assert vec.is_aux_tags_committed(no_len + 2) == AuxTagsStatus.AuxTagsNotReady
@@ -0,0 +1,120 @@
+import os
+import time
+
+from persistance.lock_free_journal import SEG_SIZE, StrmType
+from persistance.rup_pos import Pos
+from persistance.seg_mapper import SegMapper
+
+SEG = 64 << 10
+
+
+def wait_for_spare(seg_mapper, seg_num, timeout_secs=5.0):
+    deadline = time.monotonic() + timeout_secs
+    while time.monotonic() < deadline:
+        with seg_mapper.spare_cond:
+            if seg_mapper.spare_seg_num == seg_num:
+                return True
+        time.sleep(0.001)
+    return False
+
+
+def test_spare_seg_is_handed_over_on_rollover(tmp_path):
+    fd = os.open(tmp_path / "strm", os.O_RDWR | os.O_CREAT, 0o644)
+    seg_mapper = SegMapper(fd, True, prefault=True, keep_spare=True, seg_size=SEG)
+    try:
+        seg_0 = seg_mapper.map_seg(0, True, "test")
+        assert wait_for_spare(seg_mapper, 1)
+        spare = seg_mapper.spare_seg_data
+        seg_1 = seg_mapper.map_seg(1, True, "test")
+        assert seg_1 is spare
+        assert wait_for_spare(seg_mapper, 2)
+        assert seg_mapper.get_file_size() >= 3 * SEG
+
+        seg_0[SEG - 3:] = b"abc"
+        seg_1[:3] = b"def"
+        assert os.pread(fd, 6, SEG - 3) == b"abcdef"
+        seg_0.close()
+        seg_1.close()
+    finally:
+        seg_mapper.close()
+        os.close(fd)
+
+
+def test_spare_seg_not_kept_read_only(tmp_path):
+    path = tmp_path / "strm"
+    path.write_bytes(bytes(2 * SEG))
+    fd = os.open(path, os.O_RDONLY)
+    seg_mapper = SegMapper(fd, False, keep_spare=True, seg_size=SEG)
+    try:
+        seg_data = seg_mapper.map_seg(0, True, "test")
+        assert seg_mapper.spare_thread is None
+        assert seg_mapper.map_seg(2, False, "test") is None
+        seg_data.close()
+    finally:
+        seg_mapper.close()
+        os.close(fd)
+
+
+def test_journal_appends_across_seg_boundary(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    strm = lfj.create_strm("S", StrmType.DATA_STREAM, "test")
+    msgs = [bytes([i]) * 100000 for i in range(SEG_SIZE // 100000 + 2)]
+    positions = strm.append_batch(msgs, "test")
+    assert strm.get_committed_len() > SEG_SIZE
+
+    is_split = []
+    for msg, pos in zip(msgs, positions):
+        data_1, data_2 = lfj.locate_data_by_pos(Pos.from_uint64(pos))
+        is_split.append(data_2 is not None)
+        assert (bytes(data_1) + (bytes(data_2) if data_2 is not None else b"")) == msg
+        del data_1, data_2
+    assert is_split.count(True) == 1
+    lfj.close()
+
+    lfj = open_journal(lfj_name, False, False)
+    data_1, data_2 = lfj.locate_data_by_pos(Pos.from_uint64(positions[-1]))
+    assert bytes(data_1) == msgs[-1] and data_2 is None
+
+
+def test_lru_keeps_segs_with_live_views(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    strm = lfj.create_strm("S", StrmType.DATA_STREAM, "test")
+    msgs = [bytes([i % 256]) * 100000 for i in range(4 * SEG_SIZE // 100000)]
+    positions = [Pos.from_uint64(pos) for pos in strm.append_batch(msgs, "test")]
+    lfj.close()
+
+    lfj = open_journal(lfj_name, False, False, max_mapped_segs=1)
+    seg_lru = lfj.seg_lru
+    held, _ = lfj.locate_data_by_pos(positions[0])
+    for msg, pos in zip(msgs, positions):
+        data_1, data_2 = lfj.locate_data_by_pos(pos)
+        assert (bytes(data_1) + (bytes(data_2) if data_2 is not None else b"")) == msg
+        del data_1, data_2
+    assert bytes(held) == msgs[0]
+    stats = seg_lru.get_stats()
+    assert stats.evictions > 0
+    assert lfj.get_strm(positions[0].get_strm_num()).segs[0].seg_data is not None
+
+    # closing while a view is alive leaves its mapping to the view
+    lfj.close()
+    assert bytes(held) == msgs[0]
+
+
+def test_data_in_overlap_window_is_readable_through_next_seg(tmp_path):
+    fd = os.open(tmp_path / "strm", os.O_RDWR | os.O_CREAT, 0o644)
+    seg_mapper = SegMapper(fd, True, prefault=False, keep_spare=False, seg_size=SEG, overlap=4096)
+    read_fd = os.open(tmp_path / "strm", os.O_RDONLY)
+    reader = SegMapper(read_fd, False, prefault=False, keep_spare=False, seg_size=SEG)
+    try:
+        seg_0 = seg_mapper.map_seg(0, True, "test")
+        assert len(seg_0) == SEG + 4096
+        seg_0[SEG - 3:SEG + 3] = b"abcdef"
+        seg_1 = reader.map_seg(1, False, "test")
+        assert seg_1 is not None and seg_1[:3] == b"def"
+        seg_0.close()
+        seg_1.close()
+    finally:
+        reader.close()
+        seg_mapper.close()
+        os.close(read_fd)
+        os.close(fd)
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+
+from persistance.lock_free_journal import LockFreeJournal, StrmType, VecType
+from persistance.strm_checksum import CHECKSUM_SUFFIX, read_checksum_file, verify_strms
+from persistance.tx_builder import TxBuilder
+from persistance.tx_merge import iter_strm_txs
+
+
+def write_strm(open_journal, lfj_name, checksum_block_size):
+    lfj = open_journal(lfj_name, checksum_block_size=checksum_block_size)
+    strm = lfj.create_strm("S", StrmType.DATA_STREAM, "test")
+    for i in range(5):
+        strm.append_batch([bytes([i]) * 100], "test")
+    strm_num, strm_path = strm.get_strm_num(), strm.strm_path
+    lfj.close()
+    return strm_num, strm_path
+
+
+def test_every_commit_is_checksummed(open_journal, lfj_name):
+    strm_num, strm_path = write_strm(open_journal, lfj_name, 0)
+    _, block_size, begin_off, end_offs, _ = read_checksum_file(strm_path + CHECKSUM_SUFFIX)
+    assert (block_size, begin_off, list(end_offs)) == (0, 0, [100, 200, 300, 400, 500])
+    assert verify_strms([(strm_num, strm_path, 500)], 2) == {strm_num: 500}
+
+
+def test_corrupt_block_is_detected_and_cut_by_recovery(open_journal, lfj_name):
+    strm_num, strm_path = write_strm(open_journal, lfj_name, 0)
+    fd = os.open(strm_path, os.O_RDWR)
+    try:
+        os.pwrite(fd, b"\xff", 250)
+    finally:
+        os.close(fd)
+    assert verify_strms([(strm_num, strm_path, 500)]) == {strm_num: 200}
+
+    lfj = open_journal(lfj_name, False, False, verify_checksums=True)
+    assert lfj.checksum_verified_lens == {strm_num: 200}
+    assert lfj.get_strm(strm_num).get_committed_len() == 500
+    lfj.close()
+
+    lfj = open_journal(lfj_name)
+    assert lfj.get_strm(strm_num).get_committed_len() == 200
+    lfj.get_strm(strm_num).append_batch([b"z" * 10], "test")
+    lfj.close()
+    assert verify_strms([(strm_num, strm_path, 210)]) == {strm_num: 210}
+
+
+def test_block_size_keeps_unrecorded_tail(open_journal, lfj_name):
+    strm_num, strm_path = write_strm(open_journal, lfj_name, 256)
+    _, _, _, end_offs, _ = read_checksum_file(strm_path + CHECKSUM_SUFFIX)
+    assert end_offs[0] == 300 and end_offs[-1] == 500
+    # the block [300, 400) has no record below committed_len 400, so it is not torn
+    assert verify_strms([(strm_num, strm_path, 400)]) == {strm_num: 400}
+
+
+def write_and_crash(lfj_name):
+    lfj = LockFreeJournal().open(lfj_name, True, True, checksum_block_size=1 << 20)
+    strm = lfj.create_strm("S", StrmType.DATA_STREAM, "test")
+    for i in range(30):
+        strm.append_batch([bytes([i]) * 100], "test")
+    os._exit(0)
+
+
+def test_crash_keeps_data_of_block_being_filled(open_journal, lfj_name):
+    process = multiprocessing.get_context("fork").Process(target=write_and_crash, args=(lfj_name,))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+    lfj = open_journal(lfj_name)
+    strm = lfj.get_strm(1)
+    assert strm.get_committed_len() == 3000
+    data_1, _ = strm.locate_data(2900, 100, "test")
+    assert bytes(data_1) == bytes([29]) * 100
+
+
+def test_cut_drops_vec_items_and_txs_past_it(open_journal, lfj_name):
+    lfj = open_journal(lfj_name, checksum_block_size=0)
+    vec, strm = lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test", strm_type=StrmType.DATA_STREAM)
+    tx_strm = lfj.get_or_create_own_tx_strm()
+    tx_builder = TxBuilder(tx_strm)
+    tx_lens = []
+    for i in range(5):
+        tx_lens.append(tx_strm.get_committed_len())
+        tx_builder.begin(i + 1)
+        tx_builder.set_vec_item(0, i, strm.append_batch([bytes([i]) * 100], "test")[0], i + 1)
+        tx_builder.commit()
+    strm_num, strm_path, tx_strm_num = strm.get_strm_num(), strm.strm_path, tx_strm.get_strm_num()
+    lfj.close()
+    fd = os.open(strm_path, os.O_RDWR)
+    try:
+        os.pwrite(fd, b"\xff", 250)
+    finally:
+        os.close(fd)
+
+    lfj = open_journal(lfj_name)
+    strm = lfj.get_strm(strm_num)
+    vec = lfj.get_vec(0)
+    assert strm.get_committed_len() == 200
+    assert vec.get_max_item_idx() == 2
+    assert lfj.get_strm(tx_strm_num).get_committed_len() == tx_lens[2]
+    assert [global_tx_seq for global_tx_seq, _, _, _ in iter_strm_txs(lfj.get_strm(tx_strm_num))] == [1, 2]
+
+    strm.append_batch([b"Z" * 300], "test")
+    for idx in range(2):
+        data_1, data_2 = lfj.locate_data_by_pos(vec.get_vec_item_pos(idx))
+        assert bytes(data_1) == bytes([idx]) * 100
+        del data_1, data_2
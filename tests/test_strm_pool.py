@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+from persistance.lock_free_journal import StrmType, VecType
+from persistance.rup_txcreatestrm import TxCreateStrm
+from persistance.strm_pool import POOL_STRM_NAME_PREFIX, StrmPool
+from persistance.txt_create_vec import TxCreateVec
+from persistance.vec_columns import VecColumns
+
+
+def open_with_pool(open_journal, lfj_name, num_ready=1):
+    """
+    Opens a journal with a pool that is filled here rather than by its thread, so a
+    test knows whether a create hits it.
+    """
+    lfj = open_journal(lfj_name)
+    lfj.strm_pool = StrmPool(lfj, num_ready)
+    for _ in range(num_ready):
+        lfj.strm_pool.ready.append(lfj.strm_pool.create_entry())
+    return lfj
+
+
+def pool_files(lfj_name):
+    return sorted(name for name in os.listdir(lfj_name) if name.startswith(POOL_STRM_NAME_PREFIX))
+
+
+def test_create_strm_takes_pooled_strm(open_journal, lfj_name):
+    lfj = open_with_pool(open_journal, lfj_name)
+    strm_num = lfj.strm_pool.ready[0][0]
+    strm = lfj.create_strm("S", StrmType.DATA_STREAM, "test")
+    assert strm.get_strm_num() == strm_num and not lfj.strm_pool.ready
+    assert pool_files(lfj_name) == []
+    pos = strm.append_batch([b"pooled"], "test")[0]
+    lfj.close()
+
+    lfj = open_journal(lfj_name, False, False)
+    data_1, _ = lfj.get_strm(strm_num).locate_data(pos & 0xfffffffff, 6, "test")
+    assert bytes(data_1) == b"pooled"
+
+
+def test_empty_pool_falls_back_to_new_strm(open_journal, lfj_name):
+    lfj = open_with_pool(open_journal, lfj_name, 0)
+    strm = lfj.create_strm("S", StrmType.DATA_STREAM, "test")
+    assert strm.get_strm_num() == 1 and os.path.exists(strm.strm_path)
+    assert strm.append_batch([b"new"], "test")[0] & 0xfffffffff == 0
+
+
+def test_leftover_placeholders_are_removed(open_journal, lfj_name):
+    open_with_pool(open_journal, lfj_name, 2).close()
+    assert pool_files(lfj_name) == []
+
+    # as left by a crash with entries ready
+    with open(os.path.join(lfj_name, f"{POOL_STRM_NAME_PREFIX}99"), "wb") as f:
+        f.write(b"x")
+    lfj = open_journal(lfj_name, False, False)
+    lfj.close()
+    assert pool_files(lfj_name) == [f"{POOL_STRM_NAME_PREFIX}99"]
+    open_journal(lfj_name)
+    assert pool_files(lfj_name) == []
+
+
+@pytest.mark.parametrize("num_ready", [0, 2])
+def test_duplicate_strm_name_is_refused(open_journal, lfj_name, num_ready):
+    lfj = open_with_pool(open_journal, lfj_name, num_ready)
+    strm = lfj.create_strm("DUP", StrmType.DATA_STREAM, "test")
+    strm.append_batch([b"kept"], "test")
+    committed_len = strm.get_committed_len()
+    with pytest.raises(Exception, match="locked by another writer"):
+        lfj.create_strm("DUP", StrmType.DATA_STREAM, "test")
+    assert strm.get_committed_len() == committed_len and os.path.getsize(strm.strm_path) > 0
+    # the pool entry taken by the failed create is dropped with its placeholder
+    assert len(pool_files(lfj_name)) == max(num_ready - 2, 0)
+    lfj.close()
+
+    lfj = open_journal(lfj_name, False, False)
+    assert [s.strm_name for s in lfj.strms if s is not None].count("DUP") == 1
+
+
+def test_pooled_strm_replaces_unlocked_leftover(open_journal, lfj_name):
+    lfj = open_with_pool(open_journal, lfj_name)
+    with open(os.path.join(lfj_name, "OLD"), "wb") as f:
+        f.write(b"left by a crash before its record was published")
+    strm = lfj.create_strm("OLD", StrmType.DATA_STREAM, "test")
+    assert strm.seg_mapper is not None and pool_files(lfj_name) == []
+    assert strm.get_committed_len() == 0
+
+
+def test_failed_create_vec_with_strm_is_rolled_back(open_journal, lfj_name):
+    lfj = open_with_pool(open_journal, lfj_name)
+    with pytest.raises(Exception, match="comp_id should not be longer"):
+        lfj.create_vec_with_strm("BAD", VecType.MSG_VEC, "test", comp_id="c" * 100)
+    assert lfj.vecs[0] is None and lfj.on_disk_journal_hdr.vec_infos[0].vec_num_plus_1 == 0
+    assert not any(name.startswith("BAD") for name in os.listdir(lfj_name))
+    assert all(strm is None or strm.strm_name != "BAD" for strm in lfj.strms)
+
+    vec, strm = lfj.create_vec_with_strm("GOOD", VecType.MSG_VEC, "test")
+    vec.append_item(strm.append_batch([b"a"], "test")[0], 1)
+    lfj.close()
+
+    lfj = open_journal(lfj_name, False, False)
+    assert [vec.on_disk_vec_info.name for vec in lfj.vecs if vec is not None] == ["GOOD"]
+    assert [strm.strm_name for strm in lfj.strms[1:] if strm is not None] == ["GOOD"]
+
+
+def test_failed_create_keeps_columns_of_same_named_vec(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    with pytest.raises(Exception, match="locked by another writer"):
+        lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    assert os.path.exists(os.path.join(lfj_name, "V" + VecColumns.POS_SUFFIX))
+    assert lfj.get_vec(0).get_max_item_idx() == 0
+
+
+def test_tx_create_vec_and_strm(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    vec = TxCreateVec(lfj).execute("COMP", "SESSION", "enc", 1, VecType.MSG_VEC, 7, "test", 0)
+    assert vec.on_disk_vec_info.name == "COMP_1_7" and vec.on_disk_vec_info.comp_id == "COMP"
+    assert lfj.get_strm(vec.on_disk_vec_info.strm_num_plus_1 - 1).strm_name == "COMP_1_7"
+    strm = TxCreateStrm(lfj).execute_with_suffix("in", "DIR", StrmType.DATA_STREAM, "test")
+    assert strm.strm_name == "DIR_in" and os.path.exists(os.path.join(lfj_name, "DIR_in"))
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+
+from persistance.doorbell import FutexDoorbell
+from persistance.lfj_observer import LFJObserver
+from persistance.lock_free_journal import VecType
+from persistance.tail_follower import TailFollower
+from persistance.tx_builder import TxBuilder
+
+
+class RecordingObserver(LFJObserver):
+    def __init__(self):
+        self.events = []
+        self.cond = threading.Condition()
+
+    def record(self, event):
+        with self.cond:
+            self.events.append(event)
+            self.cond.notify_all()
+
+    def wait_for(self, event, timeout_secs=2.0):
+        with self.cond:
+            return self.cond.wait_for(lambda: event in self.events, timeout_secs)
+
+    def on_orderbook_update(self, pos):
+        pass
+
+    def on_vector_update(self, vec_num, idx):
+        pass
+
+    def on_vector_update_batch(self, vec_num, begin_idx, end_idx):
+        self.record(("update", vec_num, begin_idx, end_idx))
+
+    def on_vector_created(self, vec):
+        self.record(("created", vec.get_vec_num()))
+
+    def on_stream_updated(self, size, char_ptr, another_size):
+        pass
+
+
+def commit_msgs(lfj, strm, vec_num, msgs):
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm())
+    tx_builder.begin(1)
+    tx_builder.fill([vec_num] * len(msgs), list(range(len(msgs))), strm.append_batch(msgs, "test"), 1)
+    tx_builder.commit()
+
+
+def test_follower_gets_created_vecs_and_update_ranges(open_journal, lfj_name):
+    writer = open_journal(lfj_name)
+    _, strm = writer.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    commit_msgs(writer, strm, 0, [b"a", b"b"])
+    observer = RecordingObserver()
+    # a timeout far longer than the waits below: only the doorbell wakes the follower
+    follower = TailFollower(open_journal(lfj_name, False, False), [observer], timeout_secs=30)
+    follower.start()
+    try:
+        assert observer.wait_for(("update", 0, 0, 2))
+        assert observer.events[0] == ("created", 0)
+
+        commit_msgs(writer, strm, 0, [b"c", b"d", b"e"])
+        assert observer.wait_for(("update", 0, 2, 5))
+
+        _, strm_1 = writer.create_vec_with_strm("W", VecType.MSG_VEC, "test")
+        commit_msgs(writer, strm_1, 1, [b"f"])
+        assert observer.wait_for(("update", 1, 0, 1))
+        assert observer.events.index(("created", 1)) < observer.events.index(("update", 1, 0, 1))
+    finally:
+        follower.close()
+
+
+def test_stop_wakes_a_sleeping_follower(open_journal, lfj_name):
+    open_journal(lfj_name)
+    follower = TailFollower(open_journal(lfj_name, False, False), timeout_secs=30)
+    follower.start()
+    time.sleep(0.05)
+    begin = time.monotonic()
+    follower.close()
+    assert time.monotonic() - begin < 1 and follower.thread is None
+
+
+def test_doorbell_wait_returns_on_ring_and_timeout(lfj_name):
+    os.makedirs(lfj_name)
+    path = os.path.join(lfj_name, "bell")
+    writer_bell, follower_bell = FutexDoorbell(path), FutexDoorbell(path)
+    try:
+        seen_seq = follower_bell.get_seq()
+        assert follower_bell.wait(seen_seq, 0.01) == seen_seq
+
+        threading.Timer(0.05, writer_bell.ring).start()
+        assert follower_bell.wait(seen_seq, 30) == (seen_seq + 1) & 0xffffffff
+    finally:
+        writer_bell.close()
+        follower_bell.close()
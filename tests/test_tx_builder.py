@@ -0,0 +1,122 @@
+import pytest
+
+from persistance.lock_free_journal import VecType
+from persistance.msg_patch import encode_patch
+from persistance.rup_pos import Pos
+from persistance.rup_tx import Tx
+from persistance.tx_builder import MAX_TX_LEN, TxBuilder, iter_tx_ops, read_tx_hdr
+from persistance.tx_exec_msg_pos_flag import TxExecuteMsgPosFlag
+
+
+@pytest.fixture
+def lfj(open_journal, lfj_name):
+    return open_journal(lfj_name)
+
+
+def test_oversize_tx_is_refused(lfj):
+    vec, strm = lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    pos = strm.append_batch([b"msg"], "test")[0]
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm(), capacity=1 << 20)
+    tx_builder.begin(1)
+    with pytest.raises(Exception, match="longer than"):
+        for seq_num in range(MAX_TX_LEN):
+            tx_builder.set_vec_item(0, seq_num, pos, 1)
+    assert tx_builder.tx_len <= MAX_TX_LEN
+
+    tx_pos = Pos.from_uint64(tx_builder.commit())
+    assert not tx_pos.get_flag()
+    assert tx_pos.get_len() == tx_builder.tx_len
+    assert vec.get_max_item_idx() == tx_builder.num_ops
+
+
+def read_tx(lfj, tx_pos):
+    tx_pos = Pos.from_uint64(tx_pos)
+    data_1, data_2 = lfj.locate_data_by_pos(tx_pos)
+    return bytes(data_1) if data_2 is None else bytes(data_1) + bytes(data_2)
+
+
+def test_commit_round_trip(lfj):
+    vec_0, strm = lfj.create_vec_with_strm("V0", VecType.MSG_VEC, "test")
+    vec_1, _ = lfj.create_vec_with_strm("V1", VecType.MSG_VEC, "test", strm_name="V1")
+    positions = strm.append_batch([b"order", b"exec"], "test")
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm())
+
+    tx_builder.begin(100)
+    tx_builder.fill([0, 1], [7, 7], positions, 100)
+    tx_builder.store_multi_order_data([0, 1], b"shared")
+    tx_pos = tx_builder.commit()
+
+    ops = list(iter_tx_ops(read_tx(lfj, tx_pos)))
+    assert [op_code for op_code, _ in ops] == [Tx.OP_SET_VEC_ITEM, Tx.OP_SET_VEC_ITEM, Tx.OP_STORE_MULTI_ORDER_DATA]
+    assert ops[0][1] == (0, 7, positions[0], 100)
+    assert ops[1][1] == (1, 7, positions[1], 100)
+    assert ops[2][1][0] == (0, 1) and bytes(ops[2][1][1]) == b"shared"
+    num_ops, tx_len, global_tx_seq, timestamp_ns = read_tx_hdr(read_tx(lfj, tx_pos))
+    assert (num_ops, tx_len, timestamp_ns) == (3, Pos.from_uint64(tx_pos).get_len(), 100)
+    assert global_tx_seq == lfj.on_disk_journal_hdr.global_tx_seq.get()
+    assert vec_0.get_vec_item(0) == (Pos.from_uint64(positions[0]), 100, 7)
+    assert vec_1.get_vec_item_pos(0).to_uint64() == positions[1]
+
+
+def test_flag_op_sets_flag_of_last_item_with_seq_num(lfj):
+    vec, strm = lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    positions = strm.append_batch([b"a", encode_patch(0, [(0, b"b")]), encode_patch(0, [(0, b"c")])], "test")
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm())
+    tx_builder.begin(1)
+    tx_builder.fill([0, 0], [5, 6], positions[:2], 1)
+    tx_builder.commit()
+
+    tx_builder.begin(2)
+    tx_builder.set_vec_item(0, 5, positions[2], 2)
+    tx_builder.set_item_pos_flag(1, 0, 5)
+    tx_pos = tx_builder.commit()
+    assert [vec.get_vec_item_pos(idx).get_flag() for idx in range(3)] == [0, 0, 1]
+    assert list(iter_tx_ops(read_tx(lfj, tx_pos)))[1] == (Tx.OP_SET_ITEM_POS_FLAG, (1, 0, 5, 2))
+
+    TxExecuteMsgPosFlag(lfj).execute(6, vec, "test")
+    assert vec.get_vec_item_pos(1).get_flag()
+
+    tx_builder.begin(3)
+    tx_builder.set_item_pos_flag(1, 0, 6)
+    with pytest.raises(Exception, match="already"):
+        tx_builder.commit()
+    tx_builder.begin(3)
+    tx_builder.set_item_pos_flag(1, 0, 99)
+    with pytest.raises(Exception, match="no item"):
+        tx_builder.commit()
+    assert vec.get_max_item_idx() == 3
+
+
+def test_patch_op_appends_patch_item(lfj):
+    vec, strm = lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm())
+    tx_builder.begin(1)
+    tx_builder.set_vec_item(0, 5, strm.append_batch([b"base"], "test")[0], 1)
+    patch = encode_patch(0, [(1, b"ee")])
+    tx_builder.patch_item(0, 5, 0, [(1, b"ee")], 2)
+    tx_pos = Pos.from_uint64(tx_builder.commit())
+
+    patch_pos = vec.get_vec_item_pos(1)
+    assert patch_pos.is_patch()
+    assert patch_pos.get_strm_num() == tx_pos.get_strm_num()
+    assert tx_pos.get_strm_off() < patch_pos.get_strm_off() < tx_pos.get_strm_off() + tx_pos.get_len()
+    assert read_tx(lfj, patch_pos.to_uint64()) == patch
+    assert vec.get_vec_item(1).timestamp_ns == 2
+    op_code, fields = list(iter_tx_ops(read_tx(lfj, tx_pos.to_uint64())))[1]
+    assert op_code == Tx.OP_PATCH_MSG and fields[:4] == (0, 5, len(patch), 2) and bytes(fields[4]) == patch
+
+
+def test_fill_converts_positions_and_grows_buffer(lfj):
+    vec, strm = lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    positions = strm.append_batch([b"a", b"b", b"c"], "test")
+    tx_builder = TxBuilder(lfj.get_or_create_own_tx_strm(), capacity=64)
+    tx_builder.begin(1)
+    # the second fill outgrows the buffer and goes record by record
+    tx_builder.fill([0], [1], [Pos.from_uint64(positions[0])], 1)
+    tx_builder.fill([0, 0], [2, 3], positions[1:], 1)
+    with pytest.raises(Exception, match="one seq_num and pos per vec"):
+        tx_builder.fill([0, 0], [4], positions[:2], 1)
+    tx_pos = tx_builder.commit()
+
+    assert [fields for _, fields in iter_tx_ops(read_tx(lfj, tx_pos))] == [(0, k + 1, positions[k], 1) for k in range(3)]
+    assert [vec.get_vec_item(idx).seq_num for idx in range(3)] == [1, 2, 3]
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pytest
+
+from persistance.lock_free_journal import VecType
+from persistance.rup_pos import Pos
+from persistance.vec_columns import ITEMS_PER_SEG, TIME_INDEX_STRIDE, VecColumns
+
+
+def make_pos(strm_num, strm_off, length):
+    return (strm_num << Pos.STRM_NUM_SHIFT) | (length << Pos.LEN_SHIFT) | strm_off
+
+
+def test_append_and_read_back(tmp_path):
+    vec_path = str(tmp_path / "V")
+    columns = VecColumns(vec_path, True, has_seq_num=True)
+    num_items = 3 * TIME_INDEX_STRIDE + 5
+    positions = [make_pos(1, idx * 10, 10) for idx in range(num_items)]
+    timestamps = [1000 + idx for idx in range(num_items)]
+    assert columns.append_many(positions, timestamps, list(range(num_items))) == 0
+    assert columns.append(make_pos(1, num_items * 10, 10), 0, 7) == num_items
+
+    pos, ts, seq = columns.get_range(10, 20)
+    assert pos.tolist() == positions[10:20]
+    assert ts.tolist() == timestamps[10:20]
+    assert seq.tolist() == list(range(10, 20))
+    assert columns.get_item(num_items) == (make_pos(1, num_items * 10, 10), 0, 7)
+    assert columns.seek_timestamp(1000 + 2500) == 2500
+    assert columns.seek_timestamp(10 ** 9) == num_items + 1
+    assert columns.find_seq_num(7) == num_items
+    assert columns.find_seq_num(7, num_items) == 7
+    assert columns.seek_hop_end_off(500, 0, columns.get_hop_end_idx()) == 50
+    del pos, ts, seq
+    columns.close()
+
+    columns = VecColumns(vec_path, False)
+    assert columns.get_num_items() == num_items + 1
+    assert columns.seq is not None and columns.seq.get(5) == 5
+    columns.close()
+
+
+def test_range_across_segments_is_copied(tmp_path):
+    columns = VecColumns(str(tmp_path / "V"), True, has_seq_num=False)
+    num_items = ITEMS_PER_SEG + 10
+    columns.append_many(list(range(1, num_items + 1)), [1] * num_items)
+    pos, _, seq = columns.get_range(ITEMS_PER_SEG - 600, ITEMS_PER_SEG)
+    assert seq is None
+    assert pos.tolist() == list(range(ITEMS_PER_SEG - 599, ITEMS_PER_SEG + 1))
+    assert columns.pos.view(0, num_items).tolist()[-1] == num_items
+    del pos
+    columns.close()
+
+
+def test_truncate_restores_running_values(tmp_path):
+    columns = VecColumns(str(tmp_path / "V"), True, has_seq_num=True)
+    columns.append_many([make_pos(1, 0, 10), make_pos(1, 10, 10)], [5, 9], [1, 2])
+    flag_gen = columns.get_flag_gen()
+    columns.truncate(1)
+    assert columns.get_num_items() == 1 and columns.get_flag_gen() > flag_gen
+    assert (columns.running_ts_ns, columns.running_end_off) == (5, 10)
+    columns.set_pos_flag(0, 1)
+    assert columns.pos.get(0) >> Pos.FLAG_SHIFT == 1
+    columns.close()
+
+
+def test_seq_column_only_for_vecs_with_seq_nums(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    lfj.create_vec_with_strm("WithSeq", VecType.MSG_VEC, "test")
+    vec, _ = lfj.create_vec_with_strm("NoSeq", VecType.AUX_VEC, "test", has_seq_num=False)
+    vec.append_item(make_pos(1, 0, 1), 1, 3)
+    assert os.path.exists(os.path.join(lfj_name, "WithSeq" + VecColumns.SEQ_SUFFIX))
+    assert not os.path.exists(os.path.join(lfj_name, "NoSeq" + VecColumns.SEQ_SUFFIX))
+    with pytest.raises(Exception, match="no seq_num column"):
+        vec.columns.find_seq_num(3)
+    lfj.close()
+
+    # a writeable reopen recovers the vec without creating the column
+    lfj = open_journal(lfj_name)
+    assert lfj.get_vec(1).columns.seq is None
+    assert lfj.get_vec(1).get_vec_item(0).seq_num == 0
+    assert not os.path.exists(os.path.join(lfj_name, "NoSeq" + VecColumns.SEQ_SUFFIX))
+
+
+def test_close_with_live_arrays(open_journal, lfj_name):
+    lfj = open_journal(lfj_name)
+    vec, _ = lfj.create_vec_with_strm("V", VecType.MSG_VEC, "test")
+    vec.append_item(make_pos(1, 0, 4), 11, 1)
+    pos, ts, _ = vec.get_item_range(0, 1)
+    seq_view = np.frombuffer(next(vec.columns.seq.chunks(0, 1)), dtype=np.uint64)
+
+    lfj.close()
+    assert pos.tolist() == [make_pos(1, 0, 4)] and ts.tolist() == [11] and seq_view.tolist() == [1]
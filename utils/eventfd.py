@@ -63,11 +63,19 @@ class EventFd:
         """
         return self.fd
     
+    def close(self):
+        """
+        Close the file descriptor; later calls do nothing.
+        """
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
     def __del__(self):
         """
         Destructor to close the file descriptor and release resources.
         """
-        os.close(self.fd)
+        self.close()
 
 # Example usage
 def main():